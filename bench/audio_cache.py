@@ -0,0 +1,50 @@
+"""
+语音缓存命中率: 模拟一段直播的播报, 统计需要联网合成的次数
+
+    python -m bench.audio_cache [播报条数]
+"""
+import random
+import sys
+import tempfile
+
+from utils.audio_cache import AudioCache, render_template
+
+WELCOME = ['欢迎${username}']
+GIFT = ['感谢${username}送出的${gift}']
+GIFTS = ['小心心', '玫瑰', '抖音', '人气票', '棒棒糖', '大啤酒', '为你闪耀', '鲜花', '加油鸭', '比心']
+VOICE = ('zh-CN-XiaoxiaoNeural', '+0%', '+0%', '+0Hz')
+
+
+def announcements(count: int, users: int = 300):
+    rng = random.Random(0)
+    names = ['观众{}'.format(i) for i in range(users)]
+    # 少数老观众反复进出、送礼
+    weights = [1 / (i + 1) for i in range(users)]
+    for _ in range(count):
+        username = rng.choices(names, weights)[0]
+        if rng.random() < 0.3:
+            yield render_template(rng.choice(GIFT), username=username, gift=rng.choice(GIFTS))
+        else:
+            yield render_template(rng.choice(WELCOME), username=username)
+
+
+def run(count: int, segmented: bool) -> dict:
+    cache = AudioCache(lambda text, *args: text.encode('utf-8'), tempfile.mkdtemp())
+    if segmented:
+        cache.warm(WELCOME + GIFT, *VOICE)
+    for text in announcements(count):
+        cache.render(text, *VOICE, segmented=segmented)
+    return cache.stats()
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    for segmented in (False, True):
+        stats = run(count, segmented)
+        print('{} {} 条播报: 联网合成 {} 次, 内存命中 {}, 磁盘命中 {}'.format(
+            '分段' if segmented else '整句', count, stats.get('misses', 0),
+            stats.get('memory_hits', 0), stats.get('disk_hits', 0)))
+
+
+if __name__ == '__main__':
+    main()
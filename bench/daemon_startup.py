@@ -0,0 +1,106 @@
+"""
+启动耗时与常驻内存: 无界面采集进程 (daemon.py) 与图形界面 (main.py) 对比
+
+    python -m bench.daemon_startup [重复次数]
+
+每种入口在新的解释器中导入并构造 (不连接直播间), 记录从启动解释器到构造完成的耗时、
+峰值 RSS, 以及是否加载了 Qt / 音频模块; 另外对比 300 个直播间时两种指标保留策略的内存。图形界面需要 PySide6、naive、pygame、edge_tts,
+缺少时只输出原因。RSS 通过 resource 模块读取, 仅支持 Linux / macOS。
+"""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+# 采集进程不应加载的模块
+GUI_MODULES = ('PySide6', 'naive', 'pygame', 'edge_tts')
+# 多直播间内存对比使用的直播间数
+ROOMS = 300
+
+_REPORT = """
+import json, resource, sys
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if sys.platform == 'darwin':
+    rss //= 1024
+print(json.dumps({'rss_kb': rss, 'modules': len(sys.modules),
+                  'gui_modules': [m for m in %r if m in sys.modules]}))
+""" % (GUI_MODULES,)
+
+TARGETS = {
+    '空解释器': 'pass',
+    '采集进程': (
+        'import daemon\n'
+        'd = daemon.IngestDaemon(daemon.load_config("config.toml"), ["1", "2", "3"], stats_interval=0)\n'
+    ),
+    # 多直播间时指标环形缓冲占主要内存, 对比采集进程的默认保留策略与界面使用的 DEFAULT_RESOLUTIONS
+    '采集进程 ({} 个直播间)'.format(ROOMS): (
+        'import daemon\n'
+        'd = daemon.IngestDaemon(daemon.load_config("config.toml"), [str(i) for i in range({})], '
+        'stats_interval=0)\n'.format(ROOMS)
+    ),
+    '采集进程 ({} 个直播间, 界面保留策略)'.format(ROOMS): (
+        'import daemon\n'
+        'from utils.live_metrics import DEFAULT_RESOLUTIONS\n'
+        'd = daemon.IngestDaemon(daemon.load_config("config.toml"), [str(i) for i in range({})], '
+        'stats_interval=0, metrics_resolutions=DEFAULT_RESOLUTIONS)\n'.format(ROOMS)
+    ),
+    '图形界面': (
+        'import os\n'
+        'os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")\n'
+        'from PySide6 import QtWidgets\n'
+        'app = QtWidgets.QApplication([])\n'
+        'import main\n'
+        'window = main.MainWindow()\n'
+    ),
+}
+
+
+def run_target(code: str, cwd: Path) -> dict:
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-c', code + _REPORT], cwd=cwd, env=env,
+                          capture_output=True, text=True, timeout=120)
+    elapsed = time.perf_counter() - start
+    if proc.returncode != 0:
+        error = proc.stderr.strip().splitlines()
+        return {'error': error[-1] if error else 'exit {}'.format(proc.returncode)}
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result['seconds'] = elapsed
+    return result
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    # 在临时目录中运行, 避免在仓库里生成数据和日志文件
+    cwd = Path(tempfile.mkdtemp())
+    try:
+        shutil.copy(ROOT / 'config.toml', cwd / 'config.toml')
+        (cwd / 'static').symlink_to(ROOT / 'static', target_is_directory=True)
+        results = {}
+        for name, code in TARGETS.items():
+            runs = [run_target(code, cwd) for _ in range(repeat)]
+            failed = [run for run in runs if 'error' in run]
+            if failed:
+                print('{}: 无法启动 ({})'.format(name, failed[0]['error']))
+                continue
+            seconds = sorted(run['seconds'] for run in runs)[len(runs) // 2]
+            results[name] = runs[-1] | {'seconds': seconds}
+            print('{}: 启动 {:.3f}s (中位数), 峰值 RSS {:.1f}MB, 模块 {} 个, Qt/音频模块 {}'.format(
+                name, seconds, runs[-1]['rss_kb'] / 1024, runs[-1]['modules'], runs[-1]['gui_modules'] or '无'))
+        daemon, gui = results.get('采集进程'), results.get('图形界面')
+        if daemon is not None:
+            assert not daemon['gui_modules'], '采集进程加载了 {}'.format(daemon['gui_modules'])
+        if daemon is not None and gui is not None:
+            print('采集进程相对图形界面: 启动 {:.1f}x, RSS 减少 {:.1f}MB'.format(
+                gui['seconds'] / daemon['seconds'], (gui['rss_kb'] - daemon['rss_kb']) / 1024))
+    finally:
+        shutil.rmtree(cwd, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+对比 MessageToDict 全量转换与按需读取字段的解码耗时
+
+    python -m bench.decode [录制文件]
+"""
+import gzip
+import logging
+import sys
+import time
+
+from google.protobuf import json_format
+
+from bench.frames import build_frames
+from utils.dispatch_queue import DispatchQueue
+from utils.dy_pb2 import PushFrame, Response
+from utils.live_ws import CallBackMap, DWS, LiveData
+from utils.replay import ReplaySocket, load_recording
+
+logging.disable(logging.CRITICAL)
+
+_MESSAGE_TYPES = {
+    'WebcastLikeMessage': 'LikeMessage',
+    'WebcastMemberMessage': 'MemberMessage',
+    'WebcastGiftMessage': 'GiftMessage',
+    'WebcastChatMessage': 'ChatMessage',
+    'WebcastSocialMessage': 'SocialMessage',
+    'WebcastRoomUserSeqMessage': 'RoomUserSeqMessage',
+    'WebcastUpdateFanTicketMessage': 'UpdateFanTicketMessage',
+}
+
+
+def _read_nickname(data):
+    data['user']['nickName']
+
+
+def legacy_dispatch(message: bytes):
+    # 旧实现: 每条消息都用 MessageToDict 完整转换
+    from utils import dy_pb2
+    ws_package = PushFrame()
+    ws_package.ParseFromString(message)
+    payload = Response()
+    payload.ParseFromString(gzip.decompress(ws_package.payload))
+    for msg in payload.messagesList:
+        name = _MESSAGE_TYPES.get(msg.method)
+        if name is None:
+            continue
+        obj = getattr(dy_pb2, name)()
+        obj.ParseFromString(msg.payload)
+        data = json_format.MessageToDict(obj, preserving_proto_field_name=True)
+        if 'user' in data:
+            _read_nickname(data)
+
+
+def main():
+    if len(sys.argv) > 1:
+        frames = [frame for _, frame in load_recording(sys.argv[1])]
+    else:
+        frames = build_frames(2000)
+    callback = CallBackMap(follow=_read_nickname, userMsg=_read_nickname,
+                           giftNews=_read_nickname, enterRoom=_read_nickname)
+    # 在当前线程中处理, 只比较解码耗时
+    dws = DWS('0', callback, LiveData(), dispatch_queue=DispatchQueue(workers=0))
+    ws = ReplaySocket()
+
+    start = time.perf_counter()
+    for frame in frames:
+        legacy_dispatch(frame)
+    legacy = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for frame in frames:
+        dws.message_dispatch(ws, frame)
+    lazy = time.perf_counter() - start
+
+    print('帧数: {}'.format(len(frames)))
+    print('MessageToDict: {:.3f}s ({:.0f} 帧/秒)'.format(legacy, len(frames) / legacy))
+    print('按需解码:      {:.3f}s ({:.0f} 帧/秒)'.format(lazy, len(frames) / lazy))
+    print('加速比: {:.2f}x'.format(legacy / lazy))
+
+
+if __name__ == '__main__':
+    main()
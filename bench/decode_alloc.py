@@ -0,0 +1,102 @@
+"""
+用 tracemalloc 统计每帧解码过程中的 Python 内存分配: 旧实现 (gzip.decompress, 字段重复读取,
+心跳回复也解压) 与当前 DWS.message_dispatch 对比
+
+    python -m bench.decode_alloc [录制文件]
+
+不指定录制文件时使用 2000 帧合成消息, 每 5 帧插入一个心跳回复帧。
+"""
+import gzip
+import logging
+import sys
+import time
+import tracemalloc
+
+from bench.frames import build_frames
+from utils.dispatch_queue import DispatchQueue
+from utils.dy_pb2 import PushFrame, Response
+from utils.live_ws import CallBackMap, DWS, LiveData
+from utils.replay import ReplaySocket, load_recording
+from utils.router import MethodRouter
+
+logging.disable(logging.CRITICAL)
+
+
+def heartbeat_reply(log_id: int) -> bytes:
+    frame = PushFrame()
+    frame.logId = log_id
+    frame.payloadType = 'hb'
+    frame.payloadEncoding = 'gzip'
+    frame.payload = gzip.compress(b'')
+    return frame.SerializeToString()
+
+
+def legacy_dispatch(dws: DWS, ws, message: bytes):
+    # 旧实现
+    ws_package = PushFrame()
+    ws_package.ParseFromString(message)
+    log_id = ws_package.logId
+    decompressed = gzip.decompress(ws_package.payload)
+    payload = Response()
+    payload.ParseFromString(decompressed)
+    if payload.needAck:
+        dws.send_ack(ws, log_id, payload.internalExt)
+    for msg in payload.messagesList:
+        handler = dws.router.route(msg.method)
+        if handler is None:
+            continue
+        dws.dispatch_queue.put(dws, msg.method, handler, msg.payload)
+
+
+def measure(frames: list[bytes], dispatch) -> tuple[float, float, float]:
+    # 每帧的峰值临时分配 (字节), 取平均和最大值; 时间单独测量, 不开 tracemalloc
+    tracemalloc.start()
+    total, worst = 0, 0
+    for frame in frames:
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        dispatch(frame)
+        peak = tracemalloc.get_traced_memory()[1] - current
+        total += peak
+        worst = max(worst, peak)
+    tracemalloc.stop()
+    start = time.perf_counter()
+    for _ in range(3):
+        for frame in frames:
+            dispatch(frame)
+    elapsed = (time.perf_counter() - start) / 3
+    return total / len(frames), worst, elapsed
+
+
+def main():
+    if len(sys.argv) > 1:
+        frames = [frame for _, frame in load_recording(sys.argv[1])]
+    else:
+        frames = []
+        for i, frame in enumerate(build_frames(2000)):
+            frames.append(frame)
+            if i % 5 == 0:
+                frames.append(heartbeat_reply(i))
+    dws = DWS('0', CallBackMap(), LiveData(), dispatch_queue=DispatchQueue(workers=0))
+    # 只比较解码部分, 各类消息解析后交给空处理函数
+    methods = list(dws.router._routes)
+    dws.router = MethodRouter()
+    for method in methods:
+        dws.router.subscribe(method, lambda message: None)
+    ws = ReplaySocket()
+
+    results = {
+        '旧实现': measure(frames, lambda frame: legacy_dispatch(dws, ws, frame)),
+        '当前': measure(frames, lambda frame: dws.message_dispatch(ws, frame)),
+    }
+    print('帧数: {}'.format(len(frames)))
+    for name, (avg, worst, elapsed) in results.items():
+        print('{}: 每帧峰值分配 平均 {:.0f}B 最大 {:.0f}B, 耗时 {:.3f}s ({:.0f} 帧/秒)'.format(
+            name, avg, worst, elapsed, len(frames) / elapsed))
+    # measure 中每种实现共回放 4 遍
+    skipped = {k: v // 4 for k, v in dws.counters.to_dict().items() if k.startswith('skipped')}
+    print('跳过解压的帧: {}'.format(skipped))
+
+
+if __name__ == '__main__':
+    main()
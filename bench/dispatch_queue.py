@@ -0,0 +1,62 @@
+"""
+接收与处理分离: 回调变慢时, 接收线程在原处理方式与 DispatchQueue 下各自落后多少
+
+    python -m bench.dispatch_queue [帧数] [每帧回调耗时 ms]
+
+按录制节奏 (100 帧/秒) 回放, 进入直播间回调人为变慢。最大落后时间近似于 ACK 和心跳
+被推迟的时间; 使用处理队列时积压的点赞、进场消息被丢弃, 礼物全部处理。
+"""
+import logging
+import random
+import sys
+import time
+
+from bench.frames import build_frame
+from utils.dispatch_queue import DispatchQueue
+from utils.live_ws import CallBackMap, DWS, LiveData
+from utils.replay import Replayer
+
+logging.disable(logging.CRITICAL)
+
+
+def recording(count: int, fps: float = 100) -> list[tuple[float, bytes]]:
+    rnd = random.Random(0)
+    return [(i / fps, build_frame(rnd, need_ack=i % 5 == 0, log_id=i)) for i in range(count)]
+
+
+def run(frames, slow_ms: float, dispatch_queue: DispatchQueue) -> tuple[dict, dict]:
+    received = {'gifts': 0}
+
+    def slow_enter(data):
+        time.sleep(slow_ms / 1000)
+
+    def on_gift(data):
+        received['gifts'] += 1
+
+    dws = DWS('0', CallBackMap(enterRoom=slow_enter, giftNews=on_gift), LiveData(), dispatch_queue=dispatch_queue)
+    stats = Replayer(frames, speed=1).run(dws)
+    stats['gifts'] = received['gifts']
+    dispatch_queue.close()
+    return stats, dispatch_queue.stats()
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    slow_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 4
+    frames = recording(count)
+    print('{} 帧, 进场回调 {}ms/条'.format(count, slow_ms))
+
+    inline, _ = run(frames, slow_ms, DispatchQueue(workers=0))
+    print('接收线程中处理: 最大落后 {:.0f}ms  全部处理完 {:.2f}s  礼物 {}'.format(
+        inline['max_lag'] * 1000, inline['drained'], inline['gifts']))
+
+    queued, queue_stats = run(frames, slow_ms, DispatchQueue(max_size=500, workers=2))
+    dropped = {key.split('.', 1)[1]: value for key, value in queue_stats.items() if key.startswith('dropped.')}
+    print('处理队列:       最大落后 {:.0f}ms  全部处理完 {:.2f}s  礼物 {}  丢弃 {}  平均排队 {:.0f}ms'.format(
+        queued['max_lag'] * 1000, queued['drained'], queued['gifts'], dropped, queue_stats['wait']['avg_ms']))
+    assert queued['gifts'] == inline['gifts'], '礼物不应被丢弃'
+    assert queued['max_lag'] < inline['max_lag']
+
+
+if __name__ == '__main__':
+    main()
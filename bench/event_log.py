@@ -0,0 +1,74 @@
+"""
+事件日志: 写入吞吐、压缩率, 以及按时间范围 / method 读取时只解压命中的块
+
+    python -m bench.event_log [事件数]
+"""
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from bench.frames import METHOD_WEIGHTS, build_payload
+from utils.event_log import EventLogReader, EventLogWriter, index_path
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    rnd = random.Random(0)
+    methods = rnd.choices(list(METHOD_WEIGHTS), weights=list(METHOD_WEIGHTS.values()), k=count)
+    payloads = [(method, build_payload(method, rnd)) for method in methods]
+    path = Path(tempfile.mkdtemp()) / 'session.dylog'
+    # 模拟一小时的直播, 事件均匀分布
+    base = 1700000000.0
+    step = 3600 / count
+
+    start = time.perf_counter()
+    # append 在接收线程中调用, 单次最长耗时决定对收包的影响
+    slowest = 0.0
+    # 写入速度远超实时直播, 放宽等待写入的块数上限, 保证不丢块
+    with EventLogWriter(path, max_pending=1024) as log:
+        for i, (method, payload) in enumerate(payloads):
+            begin = time.perf_counter()
+            log.append(method, payload, ts=base + i * step)
+            slowest = max(slowest, time.perf_counter() - begin)
+    elapsed = time.perf_counter() - start
+    raw = sum(len(payload) for _, payload in payloads)
+    size = path.stat().st_size
+    print('写入 {} 条: {:.0f} 条/s, 原始 {:.1f}MB -> {:.1f}MB (索引 {:.1f}KB)'.format(
+        count, count / elapsed, raw / 1e6, size / 1e6, index_path(path).stat().st_size / 1e3))
+    print('append 最长 {:.2f}ms, 写入线程: {}'.format(slowest * 1000, log.stats()))
+
+    reader = EventLogReader(path)
+    assert len(reader) == count
+
+    start = time.perf_counter()
+    full = sum(1 for _ in reader)
+    full_time = time.perf_counter() - start
+    print('全量读取 {} 条: {:.1f}ms, {} 个块'.format(full, full_time * 1000, len(reader.blocks)))
+
+    # 第 30 分钟开始的 1 分钟
+    window = (base + 1800, base + 1860)
+    start = time.perf_counter()
+    events = list(reader.read(*window))
+    window_time = time.perf_counter() - start
+    expected = sum(1 for i in range(count) if window[0] <= base + i * step <= window[1])
+    assert len(events) == expected, (len(events), expected)
+    print('时间范围 1 分钟: {} 条 {:.1f}ms, 解压 {} 个块'.format(
+        len(events), window_time * 1000, len(reader.select(*window))))
+
+    start = time.perf_counter()
+    gifts = list(reader.read(methods=['WebcastGiftMessage']))
+    assert len(gifts) == methods.count('WebcastGiftMessage')
+    print('只读礼物: {} 条 {:.1f}ms'.format(len(gifts), (time.perf_counter() - start) * 1000))
+
+    # 写入中断: 截掉最后一个块的一半, 再次打开时应自动截断
+    with open(path, 'r+b') as f:
+        f.truncate(size - reader.blocks[-1]['size'] // 2)
+    EventLogWriter(path).close()
+    assert len(EventLogReader(path)) == count - reader.blocks[-1]['count']
+    print('截断恢复: 丢弃最后一个不完整的块')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+ExpiredQueue 行为校验与微基准
+
+    python -m bench.expired_queue
+"""
+import copy
+import time
+from unittest import mock
+
+from utils import expired_queue
+from utils.expired_queue import ExpiredQueue, PRIORITY_HIGH, PRIORITY_LOW
+
+
+class LegacyExpiredQueue:
+    # 旧实现 (去掉了会崩溃的溢出分支), 仅用于对比
+    def __init__(self):
+        self.queue = []
+        self.cache = []
+
+    def add(self, data, timeout: int, exclude: bool = True):
+        self._clear_timeout_data()
+        for item in self.queue:
+            if data == item['data']:
+                return
+        for item in self.cache:
+            if data == item['data']:
+                return
+        self.queue.append({'data': data, 'crt_time': time.time(), 'exclude': exclude, 'timeout': timeout})
+
+    def _clear_timeout_data(self):
+        self.queue = [copy.deepcopy(i) for i in self.queue if time.time() - i['crt_time'] < i['timeout']]
+        self.cache = [copy.deepcopy(i) for i in self.cache if time.time() - i['crt_time'] < i['timeout']]
+
+    def put(self):
+        text = self.queue.pop(0)['data'] if len(self.queue) > 0 else None
+        self.cache.append({'data': text, 'crt_time': time.time(), 'timeout': 15})
+        return text
+
+
+def check():
+    now = [1000.0]
+    with mock.patch.object(expired_queue.time, 'time', lambda: now[0]):
+        q = ExpiredQueue(max_count=3)
+        # 去重
+        assert q.add('a', 10)
+        assert not q.add('a', 10)
+        # 优先级: 礼物先于欢迎
+        q.add('welcome', 10, priority=PRIORITY_LOW)
+        q.add('gift', 15, exclude=False, priority=PRIORITY_HIGH)
+        assert q.put() == 'gift'
+        assert q.put() == 'a'
+        # 播报过的内容在 played_timeout 内不能再次入队
+        assert not q.add('a', 10)
+        now[0] += 16
+        assert q.add('a', 10)
+        # 过期
+        now[0] += 11
+        assert len(q) == 0 and q.put() is None
+        # 容量: 丢弃最早的可丢弃内容, 不可丢弃的保留
+        q.add('g1', 60, exclude=False)
+        q.add('w1', 60)
+        q.add('w2', 60)
+        q.add('w3', 60)
+        assert len(q) == 3
+        assert [q.put() for _ in range(3)] == ['g1', 'w2', 'w3']
+        # 全部不可丢弃时允许超出容量
+        for i in range(5):
+            q.add('g{}'.format(i + 10), 60, exclude=False)
+        assert len(q) == 5
+    print('行为校验通过')
+
+
+def bench(queue, n: int, pending: int) -> float:
+    start = time.perf_counter()
+    for i in range(n):
+        queue.add('欢迎用户{}'.format(i), 10)
+        if i >= pending:
+            queue.put()
+    return time.perf_counter() - start
+
+
+def main():
+    check()
+    for pending in (20, 200, 2000):
+        n = 5000
+        new = bench(ExpiredQueue(max_count=pending), n, pending)
+        old = bench(LegacyExpiredQueue(), n, pending)
+        print('积压 {:>4}: 旧实现 {:.1f}µs/次  新实现 {:.1f}µs/次'.format(
+            pending, old / n * 1e6, new / n * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+合成的直播间推送帧, 供 bench 下的基准测试使用
+"""
+import gzip
+import random
+
+from utils.dy_pb2 import ChatMessage
+from utils.dy_pb2 import GiftMessage
+from utils.dy_pb2 import LikeMessage
+from utils.dy_pb2 import MemberMessage
+from utils.dy_pb2 import PushFrame
+from utils.dy_pb2 import Response
+from utils.dy_pb2 import RoomUserSeqMessage
+from utils.dy_pb2 import SocialMessage
+from utils.dy_pb2 import UpdateFanTicketMessage
+from utils.replay import FrameRecorder
+
+# 大直播间里点赞和进场远多于弹幕和礼物
+METHOD_WEIGHTS = {
+    'WebcastLikeMessage': 40,
+    'WebcastMemberMessage': 40,
+    'WebcastChatMessage': 10,
+    'WebcastGiftMessage': 4,
+    'WebcastSocialMessage': 3,
+    'WebcastRoomUserSeqMessage': 2,
+    'WebcastUpdateFanTicketMessage': 1,
+}
+
+
+def _fill_user(user, rnd: random.Random):
+    user.id = rnd.randint(10 ** 10, 10 ** 11)
+    user.nickName = '用户{}'.format(rnd.randint(1, 100000))
+    user.secUid = 'MS4wLjABAAAA{}'.format(rnd.randint(10 ** 20, 10 ** 21))
+    user.AvatarThumb.urlListList.append('https://p3.douyinpic.com/aweme/100x100/{}.jpeg'.format(user.id))
+    user.AvatarThumb.uri = '100x100/{}'.format(user.id)
+    user.FollowInfo.followerCount = rnd.randint(0, 100000)
+
+
+def build_payload(method: str, rnd: random.Random) -> bytes:
+    if method == 'WebcastLikeMessage':
+        msg = LikeMessage()
+        msg.count = rnd.randint(1, 20)
+        msg.total = rnd.randint(1, 10 ** 7)
+        _fill_user(msg.user, rnd)
+    elif method == 'WebcastMemberMessage':
+        msg = MemberMessage()
+        msg.memberCount = rnd.randint(1, 10 ** 5)
+        _fill_user(msg.user, rnd)
+    elif method == 'WebcastChatMessage':
+        msg = ChatMessage()
+        msg.content = '弹幕内容{}'.format(rnd.randint(1, 1000))
+        _fill_user(msg.user, rnd)
+    elif method == 'WebcastGiftMessage':
+        msg = GiftMessage()
+        msg.giftId = rnd.randint(1, 5000)
+        msg.repeatCount = rnd.randint(1, 10)
+        msg.gift.name = '小心心'
+        msg.gift.diamondCount = 1
+        _fill_user(msg.user, rnd)
+    elif method == 'WebcastSocialMessage':
+        msg = SocialMessage()
+        msg.action = 1
+        msg.followCount = rnd.randint(1, 10 ** 5)
+        _fill_user(msg.user, rnd)
+    elif method == 'WebcastRoomUserSeqMessage':
+        msg = RoomUserSeqMessage()
+        msg.common.createTime = 1700000000000
+        msg.totalUser = rnd.randint(1, 10 ** 6)
+        for rank in range(1, 4):
+            contributor = msg.ranksList.add()
+            contributor.rank = rank
+            contributor.score = rnd.randint(1, 10 ** 5)
+            _fill_user(contributor.user, rnd)
+    elif method == 'WebcastUpdateFanTicketMessage':
+        msg = UpdateFanTicketMessage()
+        msg.roomFanTicketCount = rnd.randint(1, 10 ** 6)
+    else:
+        raise ValueError(method)
+    msg.common.method = method
+    msg.common.msgId = rnd.randint(10 ** 18, 10 ** 19)
+    return msg.SerializeToString()
+
+
+def build_frame(rnd: random.Random, messages_per_frame: int = 10, need_ack: bool = False, log_id: int = 0) -> bytes:
+    methods = rnd.choices(list(METHOD_WEIGHTS), weights=list(METHOD_WEIGHTS.values()), k=messages_per_frame)
+    response = Response()
+    response.needAck = need_ack
+    response.internalExt = 'internal_src:dim|wss_push_room_id:1|first_req_ms:{}'.format(log_id)
+    for method in methods:
+        msg = response.messagesList.add()
+        msg.method = method
+        msg.payload = build_payload(method, rnd)
+    frame = PushFrame()
+    frame.logId = log_id
+    frame.payloadType = 'msg'
+    frame.payloadEncoding = 'gzip'
+    frame.payload = gzip.compress(response.SerializeToString())
+    return frame.SerializeToString()
+
+
+def build_frames(count: int, seed: int = 0, messages_per_frame: int = 10) -> list[bytes]:
+    rnd = random.Random(seed)
+    return [build_frame(rnd, messages_per_frame, log_id=i) for i in range(count)]
+
+
+def write_recording(path, count: int, fps: float = 20, seed: int = 0, messages_per_frame: int = 10,
+                    start: float = 1700000000.0):
+    """
+    生成一份合成的录制文件, 格式与 FrameRecorder 相同, 帧按 fps 均匀分布
+    :return:
+    """
+    rnd = random.Random(seed)
+    with FrameRecorder(path) as recorder:
+        for i in range(count):
+            recorder.record(build_frame(rnd, messages_per_frame, need_ack=i % 5 == 0, log_id=i), start + i / fps)
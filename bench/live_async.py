@@ -0,0 +1,127 @@
+"""
+多直播间压测: 本地 websocket 服务推送合成 PushFrame, LiveManager 在单个事件循环上接收
+
+    python -m bench.live_async [房间数] [每个房间每秒帧数] [秒数]
+"""
+import asyncio
+import logging
+import random
+import sys
+import threading
+import time
+
+from websockets.asyncio.server import serve
+
+from bench.frames import build_frame
+from utils.dy_pb2 import PushFrame
+from utils.live_async import LiveManager
+from utils.live_ws import CallBackMap
+
+logging.disable(logging.CRITICAL)
+
+
+class StandInServer:
+    """
+    模拟推送服务, 按固定速率推送帧并统计收到的 ACK 和心跳
+    """
+
+    def __init__(self, fps: int, frame_pool: int = 200):
+        rnd = random.Random(0)
+        # 每 5 帧要求一次 ACK
+        self.frames = [build_frame(rnd, need_ack=i % 5 == 0, log_id=i) for i in range(frame_pool)]
+        self.fps = fps
+        self.sent = 0
+        self.acks = 0
+        self.heartbeats = 0
+        self.port = 0
+        self._ready = threading.Event()
+        self._loop = None
+        self._stop = None
+
+    async def _handler(self, ws):
+        async def reader():
+            async for message in ws:
+                frame = PushFrame()
+                frame.ParseFromString(message)
+                if frame.payloadType == 'hb':
+                    self.heartbeats += 1
+                else:
+                    self.acks += 1
+
+        reader_task = asyncio.create_task(reader())
+        interval = 1 / self.fps
+        index = 0
+        try:
+            while True:
+                await ws.send(self.frames[index % len(self.frames)])
+                self.sent += 1
+                index += 1
+                await asyncio.sleep(interval)
+        except Exception:
+            pass
+        finally:
+            reader_task.cancel()
+
+    async def _main(self):
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        async with serve(self._handler, '127.0.0.1', 0, max_size=None) as server:
+            self.port = server.sockets[0].getsockname()[1]
+            self._ready.set()
+            await self._stop.wait()
+
+    def start(self):
+        threading.Thread(target=asyncio.run, args=(self._main(),), daemon=True).start()
+        self._ready.wait()
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._stop.set)
+
+
+async def run(rooms: int, fps: int, seconds: float):
+    server = StandInServer(fps)
+    server.start()
+    threads_before = threading.active_count()
+
+    received = {'count': 0}
+
+    def on_event(data):
+        received['count'] += 1
+        data['user']['nickName']
+
+    manager = LiveManager()
+    for i in range(rooms):
+        callback = CallBackMap(follow=on_event, userMsg=on_event, giftNews=on_event, enterRoom=on_event)
+        dws = manager.add_room(i, callback, wss_url='ws://127.0.0.1:{}/room/{}'.format(server.port, i))
+        dws.heartbeat_interval = 1
+
+    runner = asyncio.create_task(manager.run())
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    await asyncio.sleep(seconds)
+    threads_during = threading.active_count()
+    manager.stop()
+    await runner
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+    server.stop()
+
+    likes = sum(dws.live_data.snapshot().like_count > 0 for dws in manager.rooms.values())
+    print('房间数: {}  每房间 {} 帧/秒  时长 {:.1f}s'.format(rooms, fps, elapsed))
+    print('服务端发送帧: {}  ({:.0f} 帧/秒)'.format(server.sent, server.sent / elapsed))
+    print('回调次数: {}  ({:.0f} 次/秒)'.format(received['count'], received['count'] / elapsed))
+    print('收到 ACK: {}  心跳: {}'.format(server.acks, server.heartbeats))
+    print('有点赞数据的房间: {}/{}'.format(likes, rooms))
+    print('客户端线程数: 压测前 {} 压测中 {} (含服务端线程)'.format(threads_before, threads_during))
+    print('进程 CPU 时间: {:.2f}s'.format(cpu))
+
+
+def main():
+    rooms = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    fps = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 10
+    asyncio.run(run(rooms, fps, seconds))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+LiveMetrics 的写入与查询耗时, 以及与每 5 秒写一行完整 JSON 快照的存储体积对比
+
+    python -m bench.live_metrics [模拟小时数]
+"""
+import json
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from utils.live_metrics import FIELDS, LiveMetrics
+
+
+def samples(hours: float, start: float):
+    rng = random.Random(0)
+    values = dict.fromkeys(FIELDS, 0)
+    values['user_count'] = 500
+    for i in range(int(hours * 3600)):
+        values['user_count'] = max(0, values['user_count'] + rng.randint(-5, 5))
+        values['total_user_count'] += rng.randint(0, 3)
+        values['like_count'] += rng.randint(0, 40)
+        values['message_count'] += rng.randint(0, 4)
+        values['score'] += rng.choice((0, 0, 0, 1, 10, 99))
+        yield start + i, values
+
+
+def main():
+    hours = float(sys.argv[1]) if len(sys.argv) > 1 else 6
+    start = time.time() - hours * 3600
+    ranking = [{'rank': i, 'username': '观众{}'.format(i), 'avatar': 'https://p3.douyinpic.com/{}.jpeg'.format(i)}
+               for i in range(3)]
+    metrics = LiveMetrics()
+    snapshots = 0
+    legacy_size = 0
+    worst = 0.0
+    begin = time.perf_counter()
+    for ts, values in samples(hours, start):
+        t = time.perf_counter()
+        metrics.record(ts, values)
+        worst = max(worst, time.perf_counter() - t)
+        if int(ts - start) % 5 == 0:
+            # 旧实现: 每 5 秒写一行包含排行榜的完整快照
+            snapshots += 1
+            legacy_size += len(json.dumps({'live_title': '直播间标题', 'time': int(ts), 'create_time': int(start),
+                                           **values, 'ranking': ranking}, ensure_ascii=False).encode('utf-8')) + 1
+    elapsed = time.perf_counter() - begin
+    count = int(hours * 3600)
+
+    end = start + hours * 3600
+    queries = {'最近 10 分钟': 600, '最近 6 小时': 6 * 3600, '最近 1 天': 86400}
+    print('采样数: {}, 写入 {:.0f} 次/秒, 单次最长 {:.3f}ms'.format(count, count / elapsed, worst * 1000))
+    for name, span in queries.items():
+        t = time.perf_counter()
+        points = metrics.query('like_count', end - span, end)
+        cost = time.perf_counter() - t
+        resolution = points[1]['ts'] - points[0]['ts'] if len(points) > 1 else '-'
+        print('{}: {} 个点, 分辨率 {}s, 耗时 {:.2f}ms'.format(name, len(points), resolution, cost * 1000))
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / 'metrics.dylm'
+        t = time.perf_counter()
+        metrics.save(path)
+        save_cost = time.perf_counter() - t
+        restored = LiveMetrics()
+        restored.load(path)
+        assert restored.query('score', start, end) == metrics.query('score', start, end)
+        size = path.stat().st_size
+    print('保存耗时 {:.1f}ms, 文件 {:.1f}KB (含全部分辨率)'.format(save_cost * 1000, size / 1024))
+    print('完整快照 jsonl: {} 行, {:.1f}KB (仅 5 秒精度)'.format(snapshots, legacy_size / 1024))
+
+
+if __name__ == '__main__':
+    main()
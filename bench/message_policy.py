@@ -0,0 +1,51 @@
+"""
+按 method 的处理策略: 全部处理与 点赞合并 + 进场采样 的解析次数和耗时对比
+
+    python -m bench.message_policy [帧数] [倍速]
+"""
+import logging
+import os
+import sys
+import time
+
+from bench.frames import build_frames
+from utils.dispatch_queue import DispatchQueue
+from utils.live_ws import CallBackMap, DWS, LiveData
+from utils.message_policy import MessagePolicy
+from utils.replay import Replayer
+
+# 与程序一致按 INFO 级别格式化每条日志, 输出丢弃
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s',
+                    handlers=[logging.StreamHandler(open(os.devnull, 'w', encoding='utf-8'))])
+
+RULES = {
+    'WebcastLikeMessage': 'coalesce:1',
+    'WebcastMemberMessage': 'sample:10',
+}
+
+
+def run(frames, speed, policy) -> tuple[dict, DWS]:
+    dws = DWS('0', CallBackMap(), LiveData(), dispatch_queue=DispatchQueue(workers=0), message_policy=policy)
+    # 按录制时间 20 帧/秒生成时间线
+    cpu = time.process_time()
+    Replayer([(i / 20, frame) for i, frame in enumerate(frames)], speed).run(dws)
+    return time.process_time() - cpu, dws
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 4000
+    speed = float(sys.argv[2]) if len(sys.argv) > 2 else 50
+    frames = build_frames(count)
+
+    baseline_cpu, baseline_dws = run(frames, speed, None)
+    print('全部处理: 解析 {} 条, CPU {:.3f}s'.format(baseline_dws.dispatch_queue.counters.get('processed'), baseline_cpu))
+
+    policy = MessagePolicy(RULES)
+    cpu, dws = run(frames, speed, policy)
+    print('{}: 解析 {} 条, CPU {:.3f}s, 节省 {} 条 {}'.format(
+        RULES, dws.dispatch_queue.counters.get('processed'), cpu, policy.stats()['saved'],
+        {key: value for key, value in policy.stats().items() if '.' in key}))
+
+
+if __name__ == '__main__':
+    main()
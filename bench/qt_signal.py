@@ -0,0 +1,86 @@
+"""
+直播间回调经 Qt 信号回到界面线程: 处理线程中 DWS 解析礼物消息, 回调收到的 LazyMessage
+通过跨线程 (排队连接) 信号交给主线程, 检查槽函数拿到的内容完整
+
+    python -m bench.qt_signal
+
+同时演示信号声明为 Signal(dict) 时 LazyMessage 无法转换, 槽函数只收到空字典。
+"""
+import gzip
+import logging
+import os
+import sys
+import threading
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PySide6 import QtCore
+
+from utils.dispatch_queue import DispatchQueue
+from utils.dy_pb2 import GiftMessage, PushFrame, Response
+from utils.live_ws import CallBackMap, DWS, LiveData
+from utils.replay import ReplaySocket
+
+logging.disable(logging.CRITICAL)
+
+
+class Receiver(QtCore.QObject):
+    # 与 MainWindow 中的声明相同
+    gift_signal = QtCore.Signal(object)
+    # 旧的声明方式
+    gift_dict_signal = QtCore.Signal(dict)
+
+
+def gift_frame() -> bytes:
+    msg = GiftMessage()
+    msg.common.method = 'WebcastGiftMessage'
+    msg.gift.name = '小心心'
+    msg.user.nickName = '观众1'
+    response = Response()
+    item = response.messagesList.add()
+    item.method = 'WebcastGiftMessage'
+    item.payload = msg.SerializeToString()
+    frame = PushFrame()
+    frame.payloadType = 'msg'
+    frame.payloadEncoding = 'gzip'
+    frame.payload = gzip.compress(response.SerializeToString())
+    return frame.SerializeToString()
+
+
+def deliver(app: QtCore.QCoreApplication, signal_name: str) -> dict:
+    receiver = Receiver()
+    received = {}
+
+    def on_gift(data):
+        # 与界面中的槽函数相同的取值方式
+        try:
+            received['value'] = (data['user']['nickName'], data['gift']['name'])
+        except Exception as e:
+            received['value'] = e
+        received['thread'] = threading.current_thread() is threading.main_thread()
+        app.quit()
+
+    getattr(receiver, signal_name).connect(on_gift)
+    dispatch_queue = DispatchQueue(workers=1)
+    dws = DWS('0', CallBackMap(giftNews=getattr(receiver, signal_name).emit), LiveData(),
+              dispatch_queue=dispatch_queue)
+    # 在处理线程中触发回调
+    dws.message_dispatch(ReplaySocket(), gift_frame())
+    QtCore.QTimer.singleShot(5000, app.quit)
+    app.exec()
+    dispatch_queue.close()
+    return received
+
+
+def main():
+    app = QtCore.QCoreApplication(sys.argv)
+    result = deliver(app, 'gift_signal')
+    print('Signal(object): {} (主线程: {})'.format(result.get('value'), result.get('thread')))
+    legacy = deliver(app, 'gift_dict_signal')
+    print('Signal(dict):   {!r}'.format(legacy.get('value')))
+    assert result.get('value') == ('观众1', '小心心'), result
+    assert result.get('thread')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+上游故障时的重连压力: 多个 DWS 连接本地服务, 服务中断一段时间后恢复, 对比
+固定间隔重连 (旧实现) 与 退避 + 抖动 + 熔断 + 直播间缓存 的连接尝试次数、页面请求次数和恢复耗时
+
+    python -m bench.reconnect_storm [直播间数] [中断秒数]
+"""
+import logging
+import socket
+import sys
+import threading
+import time
+
+from bench.frames import build_frames
+from utils.dispatch_queue import DispatchQueue
+from utils.live_ws import CallBackMap, DWS, LiveData, room_cache
+from utils.metrics import Counters
+from utils.replay import ReplayServer
+from utils.retry import get_breaker
+
+logging.disable(logging.CRITICAL)
+
+
+class LocalDWS(DWS):
+    # 时间按比例缩小: 基数 0.05 秒, 上限 1 秒
+    heartbeat_interval = 0.5
+    reconnect_delay = 0.05
+    reconnect_max_delay = 1.0
+
+    def __init__(self, room_id, url: str, counters: Counters, legacy: bool, **kwargs):
+        super().__init__(room_id, CallBackMap(), LiveData(), **kwargs)
+        self.url = url
+        self.counters = counters
+        self.legacy = legacy
+        self.connected = threading.Event()
+
+    def parse_live_room(self):
+        # 模拟一次页面请求
+        self.counters.incr('page')
+        time.sleep(0.01)
+        return self.live_room_id
+
+    def connect_params(self) -> tuple[str, dict]:
+        if self.legacy:
+            self.parse_live_room()
+        else:
+            self.resolve_room()
+        return self.url, {}
+
+    def _connecting(self, wss_url: str):
+        if self.legacy:
+            self._opened = False
+        else:
+            super()._connecting(wss_url)
+        self.counters.incr('attempts')
+
+    def reconnect_wait(self, error=None) -> float:
+        if self.legacy:
+            self._opened = False
+            return self.reconnect_delay
+        return super().reconnect_wait(error)
+
+    def ws_open(self, ws):
+        super().ws_open(ws)
+        self.connected.set()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def run(rooms: int, outage: float, legacy: bool) -> dict:
+    room_cache.clear()
+    breaker = get_breaker('127.0.0.1')
+    breaker.reset_timeout = 0.5
+    breaker.record_success()
+    frames = [(i * 0.05, frame) for i, frame in enumerate(build_frames(20))]
+    port = free_port()
+    server = ReplayServer(frames, port=port, loop_forever=True).start()
+    counters = Counters()
+    queue = DispatchQueue(workers=2)
+    clients = [LocalDWS(str(i), server.url, counters, legacy, dispatch_queue=queue) for i in range(rooms)]
+    for dws in clients:
+        threading.Thread(target=dws.start, daemon=True).start()
+    for dws in clients:
+        dws.connected.wait(10)
+    before = counters.to_dict()
+
+    # 上游中断: 关闭服务, 所有连接断开并开始重连
+    server.stop()
+    for dws in clients:
+        dws.connected.clear()
+    time.sleep(outage)
+    during = counters.to_dict()
+    server = ReplayServer(frames, port=port, loop_forever=True).start()
+    restored = time.perf_counter()
+    recovered = all(dws.connected.wait(30) for dws in clients)
+    recovery = time.perf_counter() - restored
+
+    for dws in clients:
+        dws.close()
+    queue.close()
+    server.stop()
+    return {
+        'attempts': during.get('attempts', 0) - before.get('attempts', 0),
+        'page': during.get('page', 0) - before.get('page', 0),
+        'recovered': recovered,
+        'recovery': recovery,
+        'breaker': breaker.stats(),
+    }
+
+
+def main():
+    rooms = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    outage = float(sys.argv[2]) if len(sys.argv) > 2 else 3.0
+    print('直播间: {}, 中断: {:.1f}s'.format(rooms, outage))
+    for name, legacy in (('固定间隔', True), ('退避+熔断', False)):
+        result = run(rooms, outage, legacy)
+        print('{}: 中断期间连接尝试 {} 次, 页面请求 {} 次, 恢复后全部重连耗时 {:.2f}s{}'.format(
+            name, result['attempts'], result['page'], result['recovery'],
+            '' if result['recovered'] else ' (未全部恢复)'))
+        if not legacy:
+            print('  熔断器: {}'.format(result['breaker']))
+
+
+if __name__ == '__main__':
+    main()
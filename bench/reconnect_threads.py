@@ -0,0 +1,97 @@
+"""
+反复重连后的线程数检查: 多个 DWS 连接本地回放服务, 多轮强制重连和空闲超时重连后,
+线程数不应随重连次数增长, 全部关闭后应回到初始水平
+
+    python -m bench.reconnect_threads [直播间数] [重连轮数]
+"""
+import logging
+import sys
+import threading
+import time
+
+from bench.frames import build_frames
+from utils.dispatch_queue import DispatchQueue
+from utils.live_ws import CallBackMap, DWS, LiveData
+from utils.replay import ReplayServer
+from utils.scheduler import get_scheduler
+
+logging.disable(logging.CRITICAL)
+
+
+class LocalDWS(DWS):
+    heartbeat_interval = 0.2
+    idle_timeout = 0.6
+    reconnect_delay = 0.05
+
+    def __init__(self, room_id, url: str, **kwargs):
+        super().__init__(room_id, CallBackMap(), LiveData(), **kwargs)
+        self.url = url
+        self.connections = 0
+
+    def connect_params(self) -> tuple[str, dict]:
+        return self.url, {}
+
+    def ws_open(self, ws):
+        self.connections += 1
+        super().ws_open(ws)
+
+
+def wait_for(predicate, timeout: float = 10.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def main():
+    rooms = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    frames = build_frames(50)
+    baseline = threading.active_count()
+
+    # 持续推送的服务用于强制重连, 推送一帧后长时间不发的服务用于空闲超时重连
+    busy = ReplayServer([(i * 0.02, frame) for i, frame in enumerate(frames)], loop_forever=True).start()
+    idle = ReplayServer([(0, frames[0]), (3600, frames[1])]).start()
+    # 心跳、空闲检测和 LiveData 的延迟发布都使用共享的定时器
+    scheduler = get_scheduler()
+    queue = DispatchQueue(workers=2, name='check-dispatch')
+    clients = [LocalDWS(str(i), (busy if i % 2 else idle).url, dispatch_queue=queue) for i in range(rooms)]
+    runners = [threading.Thread(target=dws.start, daemon=True) for dws in clients]
+    for runner in runners:
+        runner.start()
+    assert wait_for(lambda: all(dws.connections for dws in clients)), '首次连接超时'
+    # 回放服务 2 + 定时器 1 + 定时器工作线程 + 处理队列 + 每个直播间一个接收线程
+    limit = baseline + 2 + 1 + scheduler.workers + queue.workers + rooms
+    print('初始线程: {}, 全部连接后: {}, 上限: {} ({} 个直播间)'.format(
+        baseline, threading.active_count(), limit, rooms))
+
+    counts = []
+    for n in range(rounds):
+        target = [dws.connections + 1 for dws in clients]
+        for dws in clients[1::2]:
+            dws.restart()
+        # 偶数号直播间由空闲检测触发重连
+        assert wait_for(lambda: all(dws.connections >= t for dws, t in zip(clients, target))), '重连超时'
+        counts.append(threading.active_count())
+        print('第 {} 轮重连后线程数: {}'.format(n + 1, counts[-1]))
+    assert max(counts) <= limit, '线程数超过上限 {}: {}'.format(limit, counts)
+
+    for dws in clients:
+        dws.close()
+    for runner in runners:
+        runner.join(timeout=5)
+    assert not any(runner.is_alive() for runner in runners), '接收线程没有退出'
+    queue.close()
+    busy.stop()
+    idle.stop()
+    # 共享定时器常驻, 其余线程都应退出
+    assert wait_for(lambda: threading.active_count() <= baseline + 1 + scheduler.workers, 5), \
+        '关闭后仍有线程: {}'.format([t.name for t in threading.enumerate()])
+    print('全部关闭后线程数: {} (含共享定时器 {} 个)'.format(threading.active_count(), 1 + scheduler.workers))
+    print('重连次数: {}, 调度器: {}'.format(sum(dws.connections for dws in clients) - rooms, scheduler.stats()))
+
+
+if __name__ == '__main__':
+    main()
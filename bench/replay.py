@@ -0,0 +1,81 @@
+"""
+离线回放: 把录制的帧送入 DWS.message_dispatch, 或经本地 websocket 服务走完整的接收链路
+
+    python -m bench.replay [录制文件] [倍速, max 表示不等待]
+
+不指定录制文件时生成 2000 帧 (20 帧/秒) 的合成录制。录制文件可在 config.toml 中
+设置 record_frames = true 后由程序写入 live_data/*.frames。
+"""
+import asyncio
+import logging
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from bench.frames import write_recording
+from utils.live_async import AsyncDWS
+from utils.live_ws import CallBackMap, DWS, LiveData
+from utils.replay import ReplayServer, Replayer, load_recording
+
+logging.disable(logging.CRITICAL)
+
+
+def counting_callbacks() -> tuple[CallBackMap, dict]:
+    received = {'count': 0}
+
+    def on_event(data):
+        received['count'] += 1
+        data['user']['nickName']
+
+    return CallBackMap(follow=on_event, userMsg=on_event, giftNews=on_event, enterRoom=on_event), received
+
+
+def direct(frames, speed) -> tuple[dict, int]:
+    callback, received = counting_callbacks()
+    dws = DWS('0', callback, LiveData())
+    return Replayer(frames, speed).run(dws), received['count']
+
+
+async def through_server(frames, speed) -> tuple[float, ReplayServer, int]:
+    server = ReplayServer(frames, speed).start()
+    callback, received = counting_callbacks()
+    dws = AsyncDWS('0', callback, LiveData(), wss_url=server.url)
+    start = time.perf_counter()
+    task = asyncio.create_task(dws.run())
+    while server.counters.get('frames') < len(frames):
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - start
+    # 等最后几帧收完并处理完
+    await asyncio.sleep(0.2)
+    await asyncio.get_running_loop().run_in_executor(None, dws.drain)
+    await dws.aclose()
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    server.stop()
+    return elapsed, server, received['count']
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] != '-':
+        path = Path(sys.argv[1])
+    else:
+        path = Path(tempfile.mkdtemp()) / 'synthetic.frames'
+        write_recording(path, 2000)
+    speed_arg = sys.argv[2] if len(sys.argv) > 2 else 'max'
+    speed = None if speed_arg == 'max' else float(speed_arg)
+    frames = load_recording(path)
+    duration = frames[-1][0] - frames[0][0] if frames else 0
+    print('录制: {} 帧, 时长 {:.1f}s, 回放速度 {}'.format(len(frames), duration, speed_arg))
+
+    stats, callbacks = direct(frames, speed)
+    print('直接回放:   {:.2f}s  {:.0f} 帧/秒  回调 {}  ACK {}  最大落后 {:.1f}ms'.format(
+        stats['elapsed'], stats['fps'], callbacks, stats['client_sent'], stats['max_lag'] * 1000))
+
+    elapsed, server, callbacks = asyncio.run(through_server(frames, speed))
+    print('经 websocket: {:.2f}s  {:.0f} 帧/秒  回调 {}  客户端发送 {}'.format(
+        elapsed, len(frames) / elapsed, callbacks, server.counters.get('client_sent')))
+
+
+if __name__ == '__main__':
+    main()
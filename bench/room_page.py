@@ -0,0 +1,145 @@
+"""
+直播间页面提取的基准与模糊测试
+
+    python -m bench.room_page [保存的页面.html ...]
+
+不传参数时使用合成页面; 传入保存的页面时逐个对比新旧实现的结果和耗时。
+"""
+import json
+import random
+import re
+import sys
+import time
+
+from utils.room_page import LayoutChangedError, RoomClosedError, extract_room_info
+
+
+def legacy_extract(res_text: str):
+    # 旧版 parse_live_room 中的正则
+    res_room_info = re.search(
+        r'room\\":{.*\\"id_str\\":\\"(\d+)\\".*,\\"status\\":(\d+).*"title\\":\\"([^"]*)\\"',
+        res_text,
+    )
+    res_room = re.search(r'roomId\\":\\"(\d+)\\"', res_text)
+    live_room_search = re.search(r'owner\\":(.*?),\\"room_auth', res_text)
+    res_stream = re.search(r'hls_pull_url_map\\":(\{.*?})', res_text)
+    res_flv_search = re.search(r'flv\\":\\"(.*?)\\"', res_text)
+    return res_room_info, res_room, live_room_search, res_stream, res_flv_search
+
+
+def _escape(obj) -> str:
+    # 与页面一致: JSON 再作为 JS 字符串转义一次
+    return json.dumps(json.dumps(obj, ensure_ascii=False, separators=(',', ':')), ensure_ascii=False)[1:-1]
+
+
+def build_page(status: int = 2, filler_kb: int = 2048, seed: int = 0) -> str:
+    rnd = random.Random(seed)
+    room = {
+        'room': {
+            'id_str': '7317569386624125734',
+            'status': status,
+            'title': '测试 "直播间" 标题',
+            'owner': {'id_str': '1', 'nickname': '主播', 'avatar_thumb': {'url_list': ['https://a/b.jpeg']}},
+            'room_auth': {'Chat': True},
+            'stream_url': {
+                'flv_pull_url': {'FULL_HD1': 'http://pull-flv.douyincdn.com/a.flv?x=1&y=2'},
+                'hls_pull_url_map': {'FULL_HD1': 'http://pull-hls.douyincdn.com/a.m3u8', 'HD1': 'http://h/b.m3u8'},
+            },
+        },
+        'roomId': '7317569386624125734',
+        'flv': 'http://pull-flv.douyincdn.com/a.flv?x=1&y=2',
+    }
+    # 房间数据之后还有大量其他数据, 其中也会出现 status、title 等同名字段
+    filler = _escape({'list': [
+        {'k{}'.format(i): 'v' * rnd.randint(1, 40), 'status': rnd.randint(0, 9), 'title': 't'}
+        for i in range(filler_kb * 10)
+    ]})
+    body = _escape(room)
+    return '<html><script>self.__pace_f.push([1,"{}"])</script><script>{}</script></html>'.format(body, filler)
+
+
+def mutate(text: str, rnd: random.Random) -> str:
+    kind = rnd.randrange(4)
+    # 大部分变异落在页面开头的房间数据附近
+    i = rnd.randrange(min(len(text), 4000) if rnd.random() < 0.7 else len(text))
+    if kind == 0:
+        return text[:i]
+    if kind == 1:
+        j = min(len(text), i + rnd.randint(1, 200))
+        return text[:i] + text[j:]
+    if kind == 2:
+        return text[:i] + rnd.choice(['{', '}', '\\"', '\\\\', '"', 'roomId\\":', '\\"status\\":']) + text[i:]
+    chars = list(text[max(0, i - 50):i + 50])
+    rnd.shuffle(chars)
+    return text[:max(0, i - 50)] + ''.join(chars) + text[i + 50:]
+
+
+def fuzz(page: str, rounds: int = 300, seed: int = 0):
+    rnd = random.Random(seed)
+    outcome = {'ok': 0, 'closed': 0, 'layout': 0}
+    slowest = 0.0
+    for _ in range(rounds):
+        text = mutate(page, rnd)
+        start = time.perf_counter()
+        try:
+            extract_room_info(text)
+            outcome['ok'] += 1
+        except RoomClosedError:
+            outcome['closed'] += 1
+        except LayoutChangedError:
+            outcome['layout'] += 1
+        slowest = max(slowest, time.perf_counter() - start)
+    print('模糊测试 {} 轮: {}  最慢 {:.1f}ms'.format(rounds, outcome, slowest * 1000))
+
+
+def compare(name: str, page: str):
+    start = time.perf_counter()
+    legacy_extract(page)
+    legacy = time.perf_counter() - start
+    start = time.perf_counter()
+    try:
+        info = extract_room_info(page)
+        result = 'room={} status={} title={}'.format(info.live_room_id, info.status, info.title)
+    except (RoomClosedError, LayoutChangedError) as e:
+        result = '{}: {}'.format(type(e).__name__, e)
+    single = time.perf_counter() - start
+    print('{} ({:.1f}MB): 正则 {:.1f}ms  单次扫描 {:.1f}ms  {}'.format(
+        name, len(page) / 1024 / 1024, legacy * 1000, single * 1000, result))
+
+
+def main():
+    if len(sys.argv) > 1:
+        for path in sys.argv[1:]:
+            with open(path, encoding='utf-8') as f:
+                page = f.read()
+            compare(path, page)
+            fuzz(page, rounds=50)
+        return
+
+    live = build_page(status=2)
+    closed = build_page(status=4)
+    info = extract_room_info(live)
+    assert info.live_room_id == '7317569386624125734', info
+    assert info.title == '测试 "直播间" 标题', info.title
+    assert info.hls_url == 'https://pull-hls.douyincdn.com/a.m3u8', info.hls_url
+    assert info.flv_url == 'https://pull-flv.douyincdn.com/a.flv?x=1&y=2', info.flv_url
+    try:
+        extract_room_info(closed)
+        raise AssertionError('closed room not detected')
+    except RoomClosedError:
+        pass
+    try:
+        extract_room_info(live.replace('roomId', 'roomKey'))
+        raise AssertionError('layout change not detected')
+    except LayoutChangedError:
+        pass
+
+    compare('直播中', live)
+    compare('已关闭', closed)
+    # 缺少 title 时旧正则会大量回溯
+    compare('缺少标题', build_page(filler_kb=16).replace('title', 'name'))
+    fuzz(build_page(filler_kb=64))
+
+
+if __name__ == '__main__':
+    main()
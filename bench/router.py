@@ -0,0 +1,72 @@
+"""
+MethodRouter 按订阅解析: 只订阅礼物和弹幕 (礼物只要 giftId 不超过 1000 的) 时, 与每条已知消息都解析的耗时对比,
+并统计混入的未知 method
+
+    python -m bench.router [消息数]
+"""
+import random
+import sys
+import time
+
+from bench.frames import METHOD_WEIGHTS, build_payload
+from utils.router import DEFAULT_TYPES, MethodRouter
+
+
+def build_messages(count: int, seed: int = 0) -> list[tuple[str, bytes]]:
+    rnd = random.Random(seed)
+    weights = dict(METHOD_WEIGHTS)
+    # 新版本客户端推送的、尚未注册的消息类型
+    weights['WebcastInRoomBannerMessage'] = 3
+    weights['WebcastRoomRankMessage'] = 2
+    methods = rnd.choices(list(weights), weights=list(weights.values()), k=count)
+    messages = []
+    for method in methods:
+        payload = build_payload(method, rnd) if method in METHOD_WEIGHTS else rnd.randbytes(64)
+        messages.append((method, payload))
+    return messages
+
+
+def parse_all(messages: list[tuple[str, bytes]]) -> int:
+    # 旧方式: 已知 method 全部解析
+    parsed = 0
+    for method, payload in messages:
+        message_type = DEFAULT_TYPES.get(method)
+        if message_type is None:
+            continue
+        message_type().ParseFromString(payload)
+        parsed += 1
+    return parsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    messages = build_messages(count)
+
+    start = time.perf_counter()
+    parsed_all = parse_all(messages)
+    all_cost = time.perf_counter() - start
+
+    received = {'gift': 0, 'chat': 0}
+    router = MethodRouter()
+    router.subscribe('WebcastGiftMessage', lambda message: received.__setitem__('gift', received['gift'] + 1),
+                     predicate=lambda message: message.giftId <= 1000)
+    router.subscribe('WebcastChatMessage', lambda message: received.__setitem__('chat', received['chat'] + 1))
+    start = time.perf_counter()
+    for method, payload in messages:
+        route = router.route(method)
+        if route is not None:
+            route(payload)
+    routed_cost = time.perf_counter() - start
+
+    stats = router.stats()
+    routed = sum(stats['skipped'].values())
+    print('消息数: {}'.format(count))
+    print('全部解析: 解析 {} 条, {:.3f}s'.format(parsed_all, all_cost))
+    print('按订阅:   解析 {} 条, 跳过 {} 条, {:.3f}s ({:.1f}x)'.format(
+        parsed_all - routed, routed, routed_cost, all_cost / routed_cost))
+    print('订阅者收到: {}, 被条件过滤: {}'.format(received, stats.get('filtered', 0)))
+    print('未知 method: {}'.format(router.unknown()))
+
+
+if __name__ == '__main__':
+    main()
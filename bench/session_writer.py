@@ -0,0 +1,61 @@
+"""
+SessionWriter 持续写入吞吐, 以及调用线程 (界面线程) 单次 write 的最长阻塞时间
+
+    python -m bench.session_writer [事件数]
+"""
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from utils.session_writer import FSYNC_ALWAYS, FSYNC_INTERVAL, FSYNC_NEVER, SessionWriter
+
+
+def event(i: int) -> dict:
+    return {'time': int(time.time()), 'type': '用户消息回调', 'user': '观众{}'.format(i % 300), 'content': '弹幕内容 {}'.format(i)}
+
+
+def writer(count: int, directory: Path, fsync: str, producers: int = 4,
+           put_timeout: float = 1.0) -> tuple[float, float, dict]:
+    session_writer = SessionWriter(directory, fsync=fsync, fsync_interval=0.5, put_timeout=put_timeout)
+    session_writer.start()
+    per_thread = count // producers
+    blocked = []
+
+    def produce(offset: int):
+        worst = 0.0
+        for i in range(offset, offset + per_thread):
+            start = time.perf_counter()
+            session_writer.write('msg', event(i))
+            worst = max(worst, time.perf_counter() - start)
+        blocked.append(worst)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=produce, args=(n * per_thread,)) for n in range(producers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    session_writer.close()
+    elapsed = time.perf_counter() - start
+    lines = sum(1 for path in directory.glob('*_msg.jsonl') for _ in path.open('rb'))
+    assert lines == per_thread * producers - session_writer.counters.get('dropped'), '写入条数不一致'
+    return elapsed, max(blocked), session_writer.stats()
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    for fsync in (FSYNC_NEVER, FSYNC_INTERVAL, FSYNC_ALWAYS):
+        elapsed, blocked, stats = writer(count, Path(tempfile.mkdtemp()), fsync)
+        print('fsync={:<8} {:.0f} 条/s  write 最长阻塞 {:.2f}ms  批次 {}  丢弃 {}  每批 {:.2f}ms'.format(
+            fsync, stats['events'] / elapsed, blocked * 1000, stats['batches'],
+            stats.get('dropped', 0), stats['batch']['avg_ms']))
+    # 界面中 put_timeout=0: 队列满时直接丢弃, 不阻塞界面线程
+    elapsed, blocked, stats = writer(count, Path(tempfile.mkdtemp()), FSYNC_INTERVAL, put_timeout=0)
+    print('不等待 (界面) {:.0f} 条/s  write 最长阻塞 {:.2f}ms  批次 {}  丢弃 {}'.format(
+        stats['events'] / elapsed, blocked * 1000, stats['batches'], stats.get('dropped', 0)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""
+从礼物消息到第一块音频的端到端延迟: 各语音后端分别在整段模式和流式模式下测量
+
+    python -m bench.tts_backend [礼物条数]
+
+礼物帧经 DWS.message_dispatch 解析, 回调中按模板生成播报文本并入队, TTSPipeline 合成后交给播放端;
+播放端不发声, 只记录拿到第一块音频和完整音频的时间。每条礼物等上一条播完再发送, 只测单条延迟,
+不含排队。不经过语音缓存。edge 需要联网和 edge_tts, local 需要 pyttsx3, 不可用时跳过。
+"""
+import gzip
+import logging
+import statistics
+import sys
+import threading
+import time
+
+from utils.audio_cache import render_template
+from utils.dispatch_queue import DispatchQueue
+from utils.dy_pb2 import GiftMessage, PushFrame, Response
+from utils.expired_queue import ExpiredQueue, PRIORITY_HIGH
+from utils.live_ws import CallBackMap, DWS, LiveData
+from utils.replay import ReplaySocket
+from utils.tts_backend import EdgeBackend, LocalBackend, NullBackend, TTSBackend
+from utils.tts_pipeline import AudioStream, TTSPipeline
+
+logging.disable(logging.CRITICAL)
+
+TEMPLATE = '感谢${username}送出的${gift}'
+VOICE = ('zh-CN-XiaoxiaoNeural', '+0%', '+0%', '+0Hz')
+
+
+def gift_frame(index: int) -> bytes:
+    msg = GiftMessage()
+    msg.common.method = 'WebcastGiftMessage'
+    msg.giftId = 1
+    msg.repeatCount = 1
+    msg.gift.name = '小心心'
+    # 每条昵称不同, 避免被播报队列去重
+    msg.user.nickName = '观众{}'.format(index)
+    response = Response()
+    item = response.messagesList.add()
+    item.method = 'WebcastGiftMessage'
+    item.payload = msg.SerializeToString()
+    frame = PushFrame()
+    frame.payloadType = 'msg'
+    frame.payloadEncoding = 'gzip'
+    frame.payload = gzip.compress(response.SerializeToString())
+    return frame.SerializeToString()
+
+
+def measure(backend: TTSBackend, count: int, stream: bool) -> dict:
+    queue = ExpiredQueue()
+    state = {'first': None, 'done': None}
+    played = threading.Event()
+
+    def play(audio):
+        if isinstance(audio, AudioStream):
+            for _ in audio:
+                if state['first'] is None:
+                    state['first'] = time.perf_counter()
+        else:
+            state['first'] = time.perf_counter()
+        state['done'] = time.perf_counter()
+        played.set()
+
+    if stream:
+        def synthesize(text):
+            return backend.stream(str(text), *VOICE)
+    else:
+        def synthesize(text):
+            return backend.synthesize(str(text), *VOICE)
+
+    pipeline = TTSPipeline(queue, synthesize, play, stream=stream)
+    on_gift = lambda data: queue.add(render_template(TEMPLATE, username=data['user']['nickName'],
+                                                     gift=data['gift']['name']),
+                                     15, exclude=False, priority=PRIORITY_HIGH)
+    dispatch_queue = DispatchQueue(workers=1)
+    dws = DWS('0', CallBackMap(giftNews=on_gift), LiveData(), dispatch_queue=dispatch_queue)
+    ws = ReplaySocket()
+    first, done = [], []
+    pipeline.start()
+    try:
+        for index in range(count):
+            state['first'] = state['done'] = None
+            played.clear()
+            start = time.perf_counter()
+            dws.message_dispatch(ws, gift_frame(index))
+            if not played.wait(30):
+                raise TimeoutError('第 {} 条礼物 30 秒内没有播放'.format(index))
+            first.append(state['first'] - start)
+            done.append(state['done'] - start)
+    finally:
+        pipeline.stop()
+        dispatch_queue.close()
+    return {'first': first, 'done': done, 'stats': pipeline.stats()}
+
+
+def summary(values: list) -> str:
+    values = sorted(values)
+    p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+    return 'p50 {:7.1f}ms  p95 {:7.1f}ms'.format(statistics.median(values) * 1000, p95 * 1000)
+
+
+def backends() -> list[tuple[str, object]]:
+    return [
+        ('null', NullBackend),
+        # 模拟远程合成: 首块 300ms 网络往返, 之后每 100ms 音频需要 40ms 合成
+        ('null (模拟远程)', lambda: NullBackend(first_chunk_delay=0.3, chunk_delay=0.04)),
+        ('local', LocalBackend),
+        ('edge', EdgeBackend),
+    ]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    print('礼物条数: {}'.format(count))
+    for name, factory in backends():
+        try:
+            backend = factory()
+            if isinstance(backend, EdgeBackend):
+                # 先合成一次, 确认依赖和网络可用
+                backend.synthesize('测试', *VOICE)
+        except Exception as e:
+            print('{}: 不可用 ({}: {})'.format(name, type(e).__name__, e))
+            continue
+        try:
+            whole = measure(backend, count, stream=False)
+            streamed = measure(backend, count, stream=True)
+        finally:
+            backend.close()
+        print('{}:'.format(name))
+        print('  整段: 第一块音频 {}'.format(summary(whole['first'])))
+        print('  流式: 第一块音频 {}  完整音频 {}'.format(summary(streamed['first']), summary(streamed['done'])))
+        assert whole['stats'].get('played') == count and streamed['stats'].get('played') == count
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+空闲播报线程的 CPU 占用: 旧的忙等循环与 ExpiredQueue.get 阻塞等待对比
+
+    python -m bench.tts_idle [秒数]
+"""
+import sys
+import threading
+import time
+
+from utils.expired_queue import ExpiredQueue
+
+
+def busy_consumer(queue: ExpiredQueue, running: threading.Event, result: dict):
+    # 旧实现: while tts_run: if len(queue) > 0: ...
+    start = time.thread_time()
+    while running.is_set():
+        if len(queue) > 0:
+            queue.put()
+    result['cpu'] = time.thread_time() - start
+
+
+def blocking_consumer(queue: ExpiredQueue, running: threading.Event, result: dict):
+    start = time.thread_time()
+    received = 0
+    while running.is_set():
+        if queue.get(timeout=1) is not None:
+            received += 1
+    result['cpu'] = time.thread_time() - start
+    result['received'] = received
+
+
+def measure(target, seconds: float) -> dict:
+    queue = ExpiredQueue()
+    running = threading.Event()
+    running.set()
+    result = {}
+    thread = threading.Thread(target=target, args=(queue, running, result))
+    thread.start()
+    time.sleep(seconds / 2)
+    # 中途投递一条, 确认消费者能被及时唤醒
+    sent = time.perf_counter()
+    queue.add('欢迎', 10)
+    while len(queue) > 0:
+        time.sleep(0.001)
+    result['wake_ms'] = (time.perf_counter() - sent) * 1000
+    time.sleep(seconds / 2)
+    running.clear()
+    queue.interrupt()
+    thread.join()
+    return result
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 2
+    busy = measure(busy_consumer, seconds)
+    blocking = measure(blocking_consumer, seconds)
+    print('空闲 {:.1f}s 内消费线程 CPU 时间: 忙等 {:.3f}s  阻塞等待 {:.4f}s'.format(
+        seconds, busy['cpu'], blocking['cpu']))
+    print('投递后唤醒延迟: 阻塞等待 {:.2f}ms'.format(blocking['wake_ms']))
+    assert blocking['received'] == 1
+    assert blocking['cpu'] < 0.05 * seconds, '空闲消费者 CPU 占用过高'
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+播报流水线: 串行合成+播放 与 TTSPipeline 边播放边合成 的总耗时对比
+
+    python -m bench.tts_pipeline [条数]
+"""
+import sys
+import threading
+import time
+
+from utils.expired_queue import ExpiredQueue
+from utils.tts_pipeline import TTSPipeline
+
+# 模拟 edge-tts 合成与播放耗时
+SYNTH_SECONDS = 0.08
+PLAY_SECONDS = 0.1
+
+
+def synthesize(text: str) -> bytes:
+    time.sleep(SYNTH_SECONDS)
+    return text.encode('utf-8')
+
+
+def serial(count: int) -> float:
+    queue = ExpiredQueue(max_count=count)
+    for i in range(count):
+        queue.add('消息{}'.format(i), 60)
+    start = time.perf_counter()
+    while (text := queue.put()) is not None:
+        synthesize(text)
+        time.sleep(PLAY_SECONDS)
+    return time.perf_counter() - start
+
+
+def pipelined(count: int) -> tuple[float, list, dict]:
+    queue = ExpiredQueue(max_count=count + 1)
+    played = []
+    done = threading.Event()
+
+    def play(audio: bytes):
+        time.sleep(PLAY_SECONDS)
+        played.append(audio.decode('utf-8'))
+        if len(played) == count:
+            done.set()
+
+    pipeline = TTSPipeline(queue, synthesize, play, workers=2, buffer_size=4)
+    for i in range(count):
+        queue.add('消息{}'.format(i), 60)
+    # 播放前已过期的内容应被丢弃
+    queue.add('过期', 0.05)
+    start = time.perf_counter()
+    pipeline.start()
+    done.wait(count * (SYNTH_SECONDS + PLAY_SECONDS) + 5)
+    elapsed = time.perf_counter() - start
+    pipeline.stop()
+    return elapsed, played, pipeline.stats()
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    serial_time = serial(count)
+    pipelined_time, played, stats = pipelined(count)
+    print('{} 条: 串行 {:.2f}s  流水线 {:.2f}s'.format(count, serial_time, pipelined_time))
+    print('流水线统计: {}'.format(stats))
+    assert played == ['消息{}'.format(i) for i in range(count)], '播放顺序错误'
+    assert '过期' not in played
+    assert pipelined_time < serial_time
+
+
+if __name__ == '__main__':
+    main()
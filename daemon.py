@@ -0,0 +1,292 @@
+"""
+无界面采集进程: 只加载直播连接、落盘和指标, 不导入 Qt 和音频相关模块, 用于服务器上长期运行
+
+    python daemon.py [--config config.toml] [--rooms 房间号 ...] [--stats-interval 秒数] [--log-file 文件]
+                     [--metrics-resolutions 1:300,60:1440]
+
+直播间列表取命令行 --rooms, 其次是配置中的 rooms, 都没有时使用 live_id。
+收到 SIGINT / SIGTERM 后断开所有连接, 写完剩余数据再退出。
+"""
+import argparse
+import logging
+import signal
+import sys
+import time
+from pathlib import Path
+from typing import Union
+
+import toml
+
+from utils.event_log import EventLogWriter
+from utils.live_async import LiveManager
+from utils.live_metrics import LiveMetrics
+from utils.live_ws import CallBackMap, LiveData
+from utils.message_policy import MessagePolicy
+from utils.replay import FrameRecorder
+from utils.scheduler import TimerHandle, get_scheduler
+from utils.session_writer import FSYNC_INTERVAL, SessionWriter
+
+logger = logging.getLogger(__name__)
+
+# 采集进程同时采集很多直播间, 指标默认只保留 1 秒 × 5 分钟和 1 分钟 × 1 天, 每个直播间约 0.3MB
+# (界面使用的 DEFAULT_RESOLUTIONS 每个直播间约 3.7MB)
+DAEMON_METRICS_RESOLUTIONS = ((1, 300), (60, 1440))
+
+
+def load_config(path: Union[Path, str]) -> dict:
+    path = Path(path)
+    if not path.exists():
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return toml.load(f)
+
+
+def config_rooms(config: dict) -> list[str]:
+    """
+    配置中的直播间列表
+    :param config:
+    :return:
+    """
+    rooms = config.get('rooms')
+    if not rooms and config.get('live_id'):
+        rooms = [config['live_id']]
+    return [str(room_id) for room_id in rooms or []]
+
+
+def parse_resolutions(value) -> tuple[tuple[int, int], ...]:
+    """
+    解析指标保留策略
+    :param value: 命令行的 '1:300,60:1440' 或配置中的 [[1, 300], [60, 1440]], 每项为 (分辨率秒数, 保留的桶数)
+    :return:
+    """
+    if isinstance(value, str):
+        value = [item.split(':') for item in value.split(',') if item.strip()]
+    resolutions = tuple((int(resolution), int(capacity)) for resolution, capacity in value)
+    if not resolutions or any(resolution <= 0 or capacity <= 0 for resolution, capacity in resolutions):
+        raise ValueError('无效的指标保留策略: {}'.format(value))
+    return resolutions
+
+
+class RoomIngest:
+    """
+    单个直播间的落盘: 用户事件和直播数据交给共用的 SessionWriter, 指标写入该直播间自己的时间序列,
+    按配置记录原始消息和原始帧
+    """
+
+    def __init__(self, room_id, session_writer: SessionWriter, directory: Path, config: dict,
+                 metrics_resolutions: tuple = DAEMON_METRICS_RESOLUTIONS):
+        self.room_id = str(room_id)
+        self.session_writer = session_writer
+        self.directory = directory
+        self.live_data = LiveData()
+        self.callback_map = CallBackMap(
+            follow=lambda data: self.record_event('关注回调', data['user']['nickName']),
+            userMsg=lambda data: self.record_event('用户消息回调', data['user']['nickName'], data['content']),
+            giftNews=lambda data: self.record_event('礼物回调', data['user']['nickName'], data['gift']['name']),
+            enterRoom=lambda data: self.record_event('进入直播间回调', data['user']['nickName']),
+        )
+        self.last_written_version = None
+        self.last_written_ranking = None
+        self.metrics = LiveMetrics(metrics_resolutions)
+        metrics_path = self.metrics_path()
+        if metrics_path.exists():
+            try:
+                self.metrics.load(metrics_path)
+            except Exception as e:
+                logger.error('[{}] 读取指标文件失败 {}'.format(self.room_id, e))
+        date = time.strftime('%Y-%m-%d')
+        self.event_log = None
+        if config.get('event_log', False):
+            self.event_log = EventLogWriter(directory / '{}_{}.dylog'.format(date, self.room_id))
+        self.frame_recorder = None
+        if config.get('record_frames', False):
+            self.frame_recorder = FrameRecorder(directory / '{}_{}.frames'.format(date, self.room_id))
+        self.message_policy = MessagePolicy.from_config(config)
+
+    def metrics_path(self) -> Path:
+        # 跨天后保存到新日期的文件
+        return self.directory / '{}_{}_metrics.dylm'.format(time.strftime('%Y-%m-%d'), self.room_id)
+
+    def record_event(self, kind: str, username: str, content: Union[str, None] = None):
+        # 在处理队列的工作线程中调用
+        record = {'time': int(time.time()), 'type': kind, 'user': username}
+        if content is not None:
+            record['content'] = content
+        self.session_writer.write('{}_msg'.format(self.room_id), record)
+
+    def write_live_data(self):
+        snapshot = self.live_data.snapshot()
+        if snapshot.version == self.last_written_version:
+            return
+        self.last_written_version = snapshot.version
+        ranking_changed = snapshot.ranking != self.last_written_ranking
+        self.last_written_ranking = snapshot.ranking
+        self.session_writer.write('{}_live'.format(self.room_id), snapshot.to_json(ranking=ranking_changed))
+
+    def record_metrics(self):
+        self.metrics.record(time.time(), self.live_data.snapshot())
+
+    def save_metrics(self):
+        try:
+            self.metrics.save(self.metrics_path())
+        except Exception as e:
+            logger.error('[{}] 保存指标文件失败 {}'.format(self.room_id, e))
+
+    def close(self):
+        self.write_live_data()
+        self.save_metrics()
+        if self.event_log is not None:
+            self.event_log.close()
+        if self.frame_recorder is not None:
+            self.frame_recorder.close()
+
+
+class IngestDaemon:
+    """
+    多直播间采集: 所有连接在 LiveManager 的一个事件循环上收发, 快照写入、指标采样和保存、
+    统计日志都由共享时间轮定时触发
+    """
+    # 直播数据快照写入间隔
+    live_data_interval = 5.0
+    # 指标采样间隔
+    metrics_interval = 1.0
+    # 指标保存间隔
+    metrics_save_interval = 60.0
+
+    def __init__(self, config: dict, rooms: list, directory: Union[Path, str] = Path('./') / 'live_data',
+                 stats_interval: float = 60.0, wss_url: Union[str, None] = None,
+                 metrics_resolutions: Union[tuple, None] = None):
+        """
+        :param config: config.toml 的内容
+        :param rooms: 直播间号
+        :param directory: 数据目录
+        :param stats_interval: 输出统计日志的间隔, 0 为不输出
+        :param wss_url: 指定时直接连接该地址, 跳过直播间解析, 用于本地回放
+        :param metrics_resolutions: 指标保留策略, 为 None 时读取配置中的 metrics_resolutions,
+            都没有时使用 DAEMON_METRICS_RESOLUTIONS
+        """
+        self.config = config
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.stats_interval = stats_interval
+        self.session_writer = SessionWriter(
+            self.directory,
+            fsync=config.get('fsync', FSYNC_INTERVAL),
+            flush_interval=config.get('flush_interval', 1.0)
+        )
+        self.manager = LiveManager(
+            workers=config.get('dispatch_workers', 4),
+            queue_size=config.get('dispatch_queue_size', 20000)
+        )
+        if metrics_resolutions is None:
+            metrics_resolutions = parse_resolutions(config.get('metrics_resolutions', DAEMON_METRICS_RESOLUTIONS))
+        self.rooms: dict[str, RoomIngest] = {}
+        for room_id in rooms:
+            room = RoomIngest(room_id, self.session_writer, self.directory, config, metrics_resolutions)
+            self.rooms[room.room_id] = room
+            self.manager.add_room(
+                room.room_id,
+                room.callback_map,
+                room.live_data,
+                wss_url=wss_url,
+                event_log=room.event_log,
+                frame_recorder=room.frame_recorder,
+                message_policy=room.message_policy
+            )
+        self._timers: list[TimerHandle] = []
+        self._closed = False
+
+    def _each_room(self, name: str):
+        for room in list(self.rooms.values()):
+            try:
+                getattr(room, name)()
+            except Exception as e:
+                logger.error('[{}] {} 失败 {}'.format(room.room_id, name, e), exc_info=True)
+
+    def log_stats(self):
+        signer = None
+        for room_id, dws in self.manager.rooms.items():
+            stats = dws.stats()
+            # 签名服务所有直播间共用, 只输出一次
+            signer = stats.pop('signer', None)
+            logger.info('[{}] {}'.format(room_id, stats))
+        if signer is not None:
+            logger.info('[signer] {}'.format(signer))
+        logger.info('[session_writer] {}'.format(self.session_writer.stats()))
+
+    def run(self):
+        """
+        阻塞运行, 直到 stop 被调用
+        :return:
+        """
+        self.session_writer.start()
+        scheduler = get_scheduler()
+        self._timers = [
+            scheduler.call_every(self.live_data_interval, self._each_room, 'write_live_data'),
+            scheduler.call_every(self.metrics_interval, self._each_room, 'record_metrics'),
+            scheduler.call_every(self.metrics_save_interval, self._each_room, 'save_metrics'),
+        ]
+        if self.stats_interval:
+            self._timers.append(scheduler.call_every(self.stats_interval, self.log_stats))
+        logger.info('开始采集 {} 个直播间: {}'.format(len(self.rooms), ', '.join(self.rooms)))
+        try:
+            self.manager.run_forever()
+        finally:
+            self.close()
+
+    def stop(self):
+        # 可以从信号处理函数和其他线程调用
+        self.manager.stop()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        for timer in self._timers:
+            timer.cancel()
+        self._timers = []
+        self.log_stats()
+        self._each_room('close')
+        self.session_writer.close()
+        logger.info('采集结束')
+
+
+def parse_args(argv: Union[list, None] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='无界面直播数据采集')
+    parser.add_argument('--config', default='config.toml', help='配置文件')
+    parser.add_argument('--rooms', nargs='+', help='直播间号, 不指定时读取配置中的 rooms / live_id')
+    parser.add_argument('--data-dir', default=str(Path('./') / 'live_data'), help='数据目录')
+    parser.add_argument('--stats-interval', type=float, default=60.0, help='统计日志间隔 (秒), 0 为不输出')
+    parser.add_argument('--log-file', default='dy-daemon.log', help='日志文件, 为空时只输出到终端')
+    parser.add_argument('--wss-url', help='直接连接该地址, 跳过直播间解析 (本地回放)')
+    parser.add_argument('--metrics-resolutions', type=parse_resolutions,
+                        help='指标保留策略, 如 1:300,60:1440 (分辨率秒数:保留的桶数), 默认读取配置中的 metrics_resolutions')
+    return parser.parse_args(argv)
+
+
+def main(argv: Union[list, None] = None) -> int:
+    args = parse_args(argv)
+    handlers = [logging.StreamHandler()]
+    if args.log_file:
+        handlers.append(logging.FileHandler(args.log_file, encoding='utf-8'))
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s %(levelname)s %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S',
+        handlers=handlers
+    )
+    config = load_config(args.config)
+    rooms = args.rooms or config_rooms(config)
+    if not rooms:
+        logger.error('没有要采集的直播间, 请在配置中设置 rooms 或使用 --rooms')
+        return 1
+    daemon = IngestDaemon(config, rooms, directory=args.data_dir, stats_interval=args.stats_interval,
+                          wss_url=args.wss_url, metrics_resolutions=args.metrics_resolutions)
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: daemon.stop())
+    daemon.run()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
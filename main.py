@@ -1,22 +1,36 @@
-import copy
-import datetime
+import sys
+
+from utils.startup_profile import NullProfile, StartupProfile
+
+# --profile-startup: 统计之后每个模块的导入耗时和各初始化阶段耗时, 窗口显示后输出并退出
+PROFILE_STARTUP = '--profile-startup' in sys.argv
+profile = StartupProfile().install() if PROFILE_STARTUP else NullProfile()
+
+import io
 import json
 import logging
 import random
-import sys
 import threading
+import time
 from pathlib import Path
-from string import Template
 
-import edge_tts
-import requests
 import toml
 from PySide6 import QtCore, QtGui, QtWidgets
-from naive import NCore, NUtils, NView
-from pygame import mixer
-
-from utils import live_ws
-from utils.expired_queue import ExpiredQueue
+from naive import NCore, NView
+
+# edge_tts、pygame 和直播连接 (websocket、protobuf、httpx、签名 JS 引擎) 都在第一次使用时才导入
+from utils.audio_cache import AudioCache, render_template
+from utils.avatar_cache import AvatarCache
+from utils.dispatch_queue import DispatchQueue
+from utils.event_log import EventLogWriter
+from utils.expired_queue import ExpiredQueue, PRIORITY_HIGH, PRIORITY_LOW
+from utils.live_data import CallBackMap, LiveData
+from utils.live_metrics import LiveMetrics
+from utils.message_policy import MessagePolicy
+from utils.replay import FrameRecorder
+from utils.session_writer import FSYNC_INTERVAL, SessionWriter
+from utils.tts_backend import EdgeBackend, TTSBackend, create_backend
+from utils.tts_pipeline import TTSPipeline
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(
@@ -50,6 +64,8 @@ class HomePage(QtWidgets.QWidget):
         client_widget.layout().addWidget(self.close_btn)
         self.layout().addWidget(client_widget)
         self.dws = None
+        self.event_log = None
+        self.frame_recorder = None
 
     def start(self):
         if not self.room_input.text():
@@ -70,11 +86,29 @@ class HomePage(QtWidgets.QWidget):
         self.client_btn.setEnabled(False)
         self.main.config['live_id'] = int(self.room_input.text())
         print('开始')
-
+        from utils import live_ws
+
+        self.event_log = None
+        if self.main.config.get('event_log', False):
+            # 原始消息按块压缩保存, 供离线分析和回放
+            self.event_log = EventLogWriter(Path('./') / 'live_data' / '{}_{}.dylog'.format(
+                time.strftime('%Y-%m-%d'), self.room_input.text()))
+        self.frame_recorder = None
+        if self.main.config.get('record_frames', False):
+            # 原始帧录制, 可用 bench/replay.py 离线回放
+            self.frame_recorder = FrameRecorder(Path('./') / 'live_data' / '{}_{}.frames'.format(
+                time.strftime('%Y-%m-%d'), self.room_input.text()))
         self.dws = live_ws.DWS(
             room_id=self.room_input.text(),
             callback_map=self.main.data_callback,
-            live_data=self.main.live_data
+            live_data=self.main.live_data,
+            event_log=self.event_log,
+            frame_recorder=self.frame_recorder,
+            dispatch_queue=DispatchQueue(
+                max_size=self.main.config.get('dispatch_queue_size', 5000),
+                workers=self.main.config.get('dispatch_workers', 2)
+            ),
+            message_policy=MessagePolicy.from_config(self.main.config)
         )
         self.main.save_config()
         threading.Thread(target=self.dws.start, daemon=True).start()
@@ -85,20 +119,59 @@ class HomePage(QtWidgets.QWidget):
         self.client_btn.setEnabled(True)
         print('结束')
         self.dws.close()
+        self.dws.dispatch_queue.close()
+        logger.info('[dispatch] {}'.format(self.dws.stats()))
+        if self.event_log is not None:
+            self.event_log.close()
+        if self.frame_recorder is not None:
+            self.frame_recorder.close()
         NView.SystemToast().send('提示', '结束成功')
         pass
 
 
+class LazyPage(QtWidgets.QWidget):
+    """
+    菜单页面占位, 第一次显示时才构造真正的页面
+    """
+
+    def __init__(self, name: str, factory):
+        super().__init__()
+        self.name = name
+        self.factory = factory
+        self.page = None
+        self.setLayout(NView.BaseVBoxLayout())
+
+    def ensure(self) -> QtWidgets.QWidget:
+        if self.page is None:
+            with profile.stage('page:{}'.format(self.name)):
+                self.page = self.factory()
+            self.layout().addWidget(self.page)
+        return self.page
+
+    def showEvent(self, event):
+        self.ensure()
+        super().showEvent(event)
+
+
 class RealTimeDataPage(QtWidgets.QWidget):
-    render_rankings_signal = QtCore.Signal(list)
+    avatar_ready_signal = QtCore.Signal(str, object)
 
     def __init__(self, parent: 'MainWindow'):
         super().__init__()
-        self.ranking_widget_list = []
+        # [(ranking_key, widget, avatar)]
+        self.ranking_rows = []
+        self.last_ranking_key = None
+        self.avatar_cache = AvatarCache(
+            decode=QtGui.QImage.fromData,
+            size_of=lambda image: image.sizeInBytes()
+        )
         self.main = parent
+        # 上次渲染的快照版本, 没有变化时跳过刷新
+        self.last_version = None
+        snapshot = parent.live_data.snapshot()
         self.setLayout(NView.BaseVBoxLayout())
         self.layout().setAlignment(QtCore.Qt.AlignmentFlag.AlignTop)
-        self.title = NView.Typography.H1(parent.live_data.live_title)
+        self.title = NView.Typography.H1(snapshot.live_title)
         self.layout().addWidget(self.title)
 
         data_widget = QtWidgets.QWidget()
@@ -109,7 +182,7 @@ class RealTimeDataPage(QtWidgets.QWidget):
         user_count_title = NView.Typography.H3('在线人数')
         user_count_title.setAlignment(QtCore.Qt.AlignmentFlag.AlignCenter)
         user_count_widget.layout().addWidget(user_count_title)
-        self.user_count = NView.Typography.Text(str(parent.live_data.user_count))
+        self.user_count = NView.Typography.Text(str(snapshot.user_count))
         self.user_count.setAlignment(QtCore.Qt.AlignmentFlag.AlignCenter)
         user_count_widget.layout().addWidget(self.user_count)
         # noinspection PyArgumentList
@@ -120,7 +193,7 @@ class RealTimeDataPage(QtWidgets.QWidget):
         like_count_title = NView.Typography.H3('点赞数量')
         like_count_title.setAlignment(QtCore.Qt.AlignmentFlag.AlignCenter)
         like_count_widget.layout().addWidget(like_count_title)
-        self.like_count = NView.Typography.Text(str(parent.live_data.like_count))
+        self.like_count = NView.Typography.Text(str(snapshot.like_count))
         self.like_count.setAlignment(QtCore.Qt.AlignmentFlag.AlignCenter)
         like_count_widget.layout().addWidget(self.like_count)
         # noinspection PyArgumentList
@@ -131,7 +204,7 @@ class RealTimeDataPage(QtWidgets.QWidget):
         message_count_title = NView.Typography.H3('弹幕数量')
         message_count_title.setAlignment(QtCore.Qt.AlignmentFlag.AlignCenter)
         message_count_widget.layout().addWidget(message_count_title)
-        self.message_count = NView.Typography.Text(str(parent.live_data.message_count))
+        self.message_count = NView.Typography.Text(str(snapshot.message_count))
         self.message_count.setAlignment(QtCore.Qt.AlignmentFlag.AlignCenter)
         message_count_widget.layout().addWidget(self.message_count)
         # noinspection PyArgumentList
@@ -142,7 +215,7 @@ class RealTimeDataPage(QtWidgets.QWidget):
         score_title = NView.Typography.H3('本场总榜')
         score_title.setAlignment(QtCore.Qt.AlignmentFlag.AlignCenter)
         score_widget.layout().addWidget(score_title)
-        self.score = NView.Typography.Text(str(parent.live_data.score))
+        self.score = NView.Typography.Text(str(snapshot.score))
         self.score.setAlignment(QtCore.Qt.AlignmentFlag.AlignCenter)
         score_widget.layout().addWidget(self.score)
         # noinspection PyArgumentList
@@ -153,7 +226,7 @@ class RealTimeDataPage(QtWidgets.QWidget):
         total_user_count_title = NView.Typography.H3('场观人数')
         total_user_count_title.setAlignment(QtCore.Qt.AlignmentFlag.AlignCenter)
         total_user_count_widget.layout().addWidget(total_user_count_title)
-        self.total_user_count = NView.Typography.Text(str(parent.live_data.total_user_count))
+        self.total_user_count = NView.Typography.Text(str(snapshot.total_user_count))
         self.total_user_count.setAlignment(QtCore.Qt.AlignmentFlag.AlignCenter)
         total_user_count_widget.layout().addWidget(self.total_user_count)
         # noinspection PyArgumentList
@@ -168,77 +241,140 @@ class RealTimeDataPage(QtWidgets.QWidget):
         ranking_title = NView.Typography.H3('榜单')
         self.ranking_widget.layout().addWidget(ranking_title)
 
-        self.render_rankings_signal.connect(self.render_rankings)
-        self.get_rankings()
+        self.avatar_ready_signal.connect(self.render_avatar)
+        self.get_rankings(snapshot.ranking)
         self.timer = QtCore.QTimer()
         self.timer.timeout.connect(self.update_data)
         self.timer.start(5000)
 
+    @staticmethod
+    def ranking_key(user_info) -> tuple:
+        return user_info['id'], user_info['rank'], user_info['username'], user_info['avatar']
+
+    def build_ranking_row(self, user_info) -> tuple[QtWidgets.QWidget, NView.Avatar]:
+        user_widget = QtWidgets.QWidget()
+        user_widget.setLayout(QtWidgets.QHBoxLayout())
+        image = user_info['avatar_image']
+        avatar = NView.Avatar(
+            icon=image if image is not None and not image.isNull() else '未知',
+            size=NCore.Core.Size.large
+        )
+        user_widget.layout().addWidget(avatar)
+        user_name = NView.Typography.Text(user_info['username'])
+        user_widget.layout().addWidget(user_name)
+        return user_widget, avatar
+
     @QtCore.Slot()
     def render_rankings(self, data):
+        # 只重建用户或名次发生变化的行
+        rows = []
+        for index, user_info in enumerate(data):
+            key = self.ranking_key(user_info)
+            if index < len(self.ranking_rows) and self.ranking_rows[index][0] == key:
+                rows.append(self.ranking_rows[index])
+                continue
+            user_widget, avatar = self.build_ranking_row(user_info)
+            if index < len(self.ranking_rows):
+                old_widget = self.ranking_rows[index][1]
+                self.ranking_widget.layout().replaceWidget(old_widget, user_widget)
+                old_widget.deleteLater()
+            else:
+                self.ranking_widget.layout().addWidget(user_widget)
+            rows.append((key, user_widget, avatar))
+        for _, widget, _ in self.ranking_rows[len(data):]:
+            self.ranking_widget.layout().removeWidget(widget)
+            widget.deleteLater()
+        self.ranking_rows = rows
 
-        self.clear_rankings()
-        self.ranking_widget_list = []
-        for user_info in data:
-            user_widget = QtWidgets.QWidget()
-            user_widget.setLayout(QtWidgets.QHBoxLayout())
-            avatar = NView.Avatar(
-                icon=QtGui.QImage.fromData(user_info['avatar_content']) if user_info['avatar_content'] else '未知',
-                size=NCore.Core.Size.large
+    @QtCore.Slot()
+    def render_avatar(self, url, image):
+        # 头像陆续下载完成, 逐个更新到对应的行
+        if image is None or image.isNull():
+            return
+        for key, _, avatar in self.ranking_rows:
+            if key[3] == url:
+                avatar.setupUi(image)
+
+    def get_rankings(self, ranking: tuple):
+        ranking_key = tuple(self.ranking_key(user_info) for user_info in ranking)
+        if ranking_key == self.last_ranking_key:
+            # 排行没有变化, 只重试还没有头像的行 (下载失败的 URL 过了 negative_ttl 才会重新下载)
+            self.avatar_cache.prefetch(
+                [user_info['avatar'] for user_info in ranking if self.avatar_cache.peek(user_info['avatar']) is None],
+                self.avatar_ready_signal.emit
             )
-            user_widget.layout().addWidget(avatar)
-            user_name = NView.Typography.Text(user_info['username'])
-            user_widget.layout().addWidget(user_name)
-            self.ranking_widget_list.append(user_widget)
-            self.ranking_widget.layout().addWidget(user_widget)
-
-    @NUtils.threadFunc()
-    def get_rankings(self):
-        data = []
-        for user_info in copy.deepcopy(self.main.live_data.ranking):
-            try:
-                res = requests.get(user_info['avatar']).content
-            except Exception as e:
-                logger.error(e, exc_info=True)
-                res = None
-            user_info['avatar_content'] = res
-            data.append({**user_info})
-        self.render_rankings_signal.emit(data)
+            return
+        self.last_ranking_key = ranking_key
+        data = [
+            {**user_info, 'avatar_image': self.avatar_cache.peek(user_info['avatar'])}
+            for user_info in ranking
+        ]
+        self.render_rankings(data)
+        self.avatar_cache.prefetch(
+            [user_info['avatar'] for user_info in data if user_info['avatar_image'] is None],
+            self.avatar_ready_signal.emit
+        )
 
     def clear_rankings(self):
-        for widget in self.ranking_widget_list:
+        for _, widget, _ in self.ranking_rows:
             self.ranking_widget.layout().removeWidget(widget)
             widget.deleteLater()
+        self.ranking_rows = []
+        self.last_ranking_key = None
 
     def update_data(self):
         if not self.isVisible(): return
+        data = self.main.live_data.snapshot()
+        if data.version == self.last_version:
+            return
+        self.last_version = data.version
         logger.info('更新数据')
-        data = self.main.live_data
         self.title.setText(data.live_title)
         self.user_count.setText(str(data.user_count))
         self.like_count.setText(str(data.like_count))
         self.message_count.setText(str(data.message_count))
         self.score.setText(str(data.score))
         self.total_user_count.setText(str(data.total_user_count))
-        self.get_rankings()
+        self.get_rankings(data.ranking)
 
 
 class TTSPage(QtWidgets.QWidget):
     message_signal = QtCore.Signal(str, str)
-    follow_callback_signal = QtCore.Signal(dict)
-    msg_callback_signal = QtCore.Signal(dict)
-    gift_callback_signal = QtCore.Signal(dict)
-    enter_callback_signal = QtCore.Signal(dict)
+    tts_error_signal = QtCore.Signal()
 
     def __init__(self, parent: 'MainWindow'):
         super().__init__()
-        mixer.init()
-
         self.main = parent
         self.queue = ExpiredQueue()
         self.tts_run = False
+        # 停止播报时打断正在播放的语音
+        self.playback_stop = threading.Event()
+        self.backend = self.create_backend()
+        # 分段模式: 模板静态文本预先合成, 播报时只合成变量部分; 输出不能直接拼接的后端不支持
+        self.segmented = self.main.config.get('tts_segment_mode', False) and self.backend.segmentable
+        cache_dir = Path('./') / 'cache' / 'tts'
+        if self.backend.name != EdgeBackend.name:
+            # 不同后端的音频格式不同, 分目录缓存; edge 沿用原来的目录
+            cache_dir = cache_dir / self.backend.name
+        self.audio_cache = AudioCache(
+            self.backend.synthesize,
+            cache_dir=cache_dir,
+            memory_budget=self.main.config.get('tts_cache_memory', 8 * 1024 * 1024),
+            disk_budget=self.main.config.get('tts_cache_disk', 128 * 1024 * 1024),
+            suffix=self.backend.format
+        )
+        # pygame 只能播放完整的音频, 不使用流式输出
+        self.pipeline = TTSPipeline(
+            self.queue,
+            synthesize=self.synthesize,
+            play=self.play_audio,
+            workers=self.main.config.get('tts_workers', 2),
+            buffer_size=self.main.config.get('tts_buffer_size', 4),
+            on_error=lambda e: self.tts_error_signal.emit()
+        )
         self.sys_msg = NView.SystemToast()
         self.message_signal.connect(self.message)
+        self.tts_error_signal.connect(self.tts_error)
         self.timbre_default = 'zh-CN-XiaoxiaoNeural'
         self.volume = '+0%'
         self.rate = '+0%'
@@ -413,9 +549,34 @@ class TTSPage(QtWidgets.QWidget):
     def timbre_toggle(self):
         self.timbre_default = self.timbre_map[self.timbre_group.checkedButton().text()]
 
+    def init_mixer(self) -> bool:
+        # pygame 的导入和音频设备初始化较慢, 第一次开始播报时才做
+        try:
+            from pygame import mixer
+            if not mixer.get_init():
+                with profile.stage('mixer.init'):
+                    mixer.init()
+        except Exception as e:
+            logger.error('音频设备初始化失败 {}'.format(e))
+            self.message('发生错误', '音频设备初始化失败')
+            return False
+        return True
+
     def run_tts(self):
+        if not self.init_mixer():
+            return
         self.tts_run = True
-        self._loop()
+        self.playback_stop.clear()
+        logger.info('tts run {}'.format(self.tts_run))
+        if self.segmented:
+            threading.Thread(
+                target=self.audio_cache.warm,
+                args=(self.welcome + self.give_gifts + self.follow,
+                      self.timbre_default, self.volume, self.rate, self.pitch),
+                name='tts-warm',
+                daemon=True
+            ).start()
+        self.pipeline.start()
         self.start_btn.setEnabled(False)
         self.stop_btn.setEnabled(True)
 
@@ -432,6 +593,9 @@ class TTSPage(QtWidgets.QWidget):
 
     def stop_tts(self):
         self.tts_run = False
+        self.playback_stop.set()
+        self.pipeline.stop()
+        logger.info('tts stop')
         self.start_btn.setEnabled(True)
         self.stop_btn.setEnabled(False)
 
@@ -448,55 +612,52 @@ class TTSPage(QtWidgets.QWidget):
             message=message
         )
 
-    @NUtils.threadFunc()
-    def _loop(self):
-        # if not self.win_tts:
-        #     self.win_tts =
-        logger.info('tts run {}'.format(self.tts_run))
-        while self.tts_run:
-            if len(self.queue) > 0:
-                try:
-                    text = self.queue.put()
-                    print(text)
-                    self.win_tts(text)
-                except Exception as e:
-                    logger.error(f'tts error {e}', exc_info=True)
-                    self.stop_tts()
-                    self.message_signal.emit('发生错误', '语音功能发生错误已停止请重新开启')
-
-        logger.info('tts stop')
+    def tts_error(self):
+        # 流水线线程中出错, 回到界面线程停止播报
+        if not self.tts_run:
+            return
+        self.stop_tts()
+        self.message('发生错误', '语音功能发生错误已停止请重新开启')
 
-    def win_tts(self, text):
-        logger.info('[播放] {}'.format(text))
-        communicate = edge_tts.Communicate(text, self.timbre_default, volume=self.volume,
-                                           rate=self.rate, pitch=self.pitch)
-        temp_file = Path(__file__).parent / 'temp.mp3'
-        communicate.save_sync(str(temp_file))
-        mixer.music.load(str(temp_file.absolute()))
-        mixer.music.play()
-        while mixer.music.get_busy():
+    def create_backend(self) -> TTSBackend:
+        # config.toml 中的 tts_backend: edge (默认) / local (离线, 需要 pyttsx3) / null (不发声)
+        name = self.main.config.get('tts_backend', EdgeBackend.name)
+        try:
+            return create_backend(name)
+        except Exception as e:
+            logger.error('语音后端 {} 不可用, 改用 edge: {}'.format(name, e))
+            return EdgeBackend()
+
+    def synthesize(self, text) -> bytes:
+        return self.audio_cache.render(text, self.timbre_default, self.volume, self.rate, self.pitch,
+                                       segmented=self.segmented)
+
+    def play_audio(self, audio: bytes):
+        from pygame import mixer
+        sound = mixer.Sound(file=io.BytesIO(audio))
+        channel = sound.play()
+        if channel is None:
+            return
+        # 按音频时长等待播放结束, 停止播报时立即返回
+        if self.playback_stop.wait(sound.get_length()):
+            channel.stop()
+            return
+        while channel.get_busy() and not self.playback_stop.wait(0.01):
             pass
-        mixer.music.unload()
 
     def init_callback(self):
-        self.follow_callback_signal.connect(self.follow_callback)
-        self.msg_callback_signal.connect(self.msg_callback)
-        self.gift_callback_signal.connect(self.gift_callback)
-        self.enter_callback_signal.connect(self.enter_callback)
-        self.main.data_callback.follow = self.follow_callback_signal.emit
-        self.main.data_callback.userMsg = self.msg_callback_signal.emit
-        self.main.data_callback.giftNews = self.gift_callback_signal.emit
-        self.main.data_callback.enterRoom = self.enter_callback_signal.emit
+        # 页面打开后才开始接收, 事件记录由 MainWindow 负责
+        self.main.follow_callback_signal.connect(self.follow_callback)
+        self.main.msg_callback_signal.connect(self.msg_callback)
+        self.main.gift_callback_signal.connect(self.gift_callback)
+        self.main.enter_callback_signal.connect(self.enter_callback)
 
     def follow_callback(self, data):
         # 关注回调
         username = data["user"]["nickName"]
-        self.main.msgData.append(
-            '[关注回调] {}'.format(data["user"]["nickName"].encode('utf-8', errors='ignore').decode('utf-8')))
         if not self.follow: return
-        template: Template = Template(random.choice(self.follow))
         try:
-            msg = template.substitute(username=username)
+            msg = render_template(random.choice(self.follow), username=username)
             self.queue.add(msg, 10)
         except Exception as e:
             print(e)
@@ -509,93 +670,146 @@ class TTSPage(QtWidgets.QWidget):
                 data["content"]
             )
         )
-        self.main.msgData.append(
-            '[用户消息回调] {} --> {}'.format(data["user"]["nickName"].encode('utf-8', errors='ignore').decode('utf-8'),
-                                              data["content"]))
-        pass
 
     def gift_callback(self, data):
         # 礼物回调
         username = data["user"]["nickName"]
-        self.main.msgData.append(
-            '[礼物回调] {} --> {}'.format(data["user"]["nickName"].encode('utf-8', errors='ignore').decode('utf-8'),
-                                          data["gift"]["name"]))
         if not self.give_gifts: return
-        template: Template = Template(random.choice(self.give_gifts))
         try:
-            msg = template.substitute(username=username, gift=data["gift"]["name"])
-            self.queue.add(msg, 15, exclude=False)
+            msg = render_template(random.choice(self.give_gifts), username=username, gift=data["gift"]["name"])
+            self.queue.add(msg, 15, exclude=False, priority=PRIORITY_HIGH)
         except Exception as e:
             logger.error(e)
 
     def enter_callback(self, data):
         # 进入直播间回调
         username = data["user"]["nickName"]
-        self.main.msgData.append(
-            '[进入直播间回调] {}'.format(data["user"]["nickName"].encode('utf-8', errors='ignore').decode('utf-8')))
         if not self.welcome: return
-        template: Template = Template(random.choice(self.welcome))
         try:
-            msg = template.substitute(username=username)
-            self.queue.add(msg, 10)
+            msg = render_template(random.choice(self.welcome), username=username)
+            self.queue.add(msg, 10, priority=PRIORITY_LOW)
         except:
             pass
 
 
 class MainWindow(NView.MicaWindow):
+    # 直播间回调在处理线程中触发, 经信号回到界面线程。回调参数是 LazyMessage (Mapping, 不是 dict),
+    # 声明为 dict 时 PySide6 无法转换, 槽函数只会收到 {}
+    follow_callback_signal = QtCore.Signal(object)
+    msg_callback_signal = QtCore.Signal(object)
+    gift_callback_signal = QtCore.Signal(object)
+    enter_callback_signal = QtCore.Signal(object)
+
     def __init__(self):
         self.config = {}
-        self.load_config()
+        with profile.stage('load_config'):
+            self.load_config()
+        # 直播数据在后台线程写入, 界面线程只负责入队; 队列满时直接丢弃计数, 不阻塞界面
+        self.session_writer = SessionWriter(
+            fsync=self.config.get('fsync', FSYNC_INTERVAL),
+            flush_interval=self.config.get('flush_interval', 1.0),
+            put_timeout=0
+        )
+        self.session_writer.start()
         self.timer = QtCore.QTimer()
-        self.timer.timeout.connect(self.writer_msg)
+        self.timer.timeout.connect(self.writer_live_data)
         self.timer.start(5000)
-        self.live_data = live_ws.LiveData()
-        self.data_callback = live_ws.CallBackMap()
-        self.msgData = []
+        self.live_data = LiveData()
+        self.last_written_version = None
+        self.last_written_ranking = None
+        # 在线人数等指标按 1 秒采样进内存时间序列, 每分钟按列保存
+        self.metrics = LiveMetrics()
+        self.metrics_path = Path('./') / 'live_data' / '{}_metrics.dylm'.format(time.strftime('%Y-%m-%d'))
+        if self.metrics_path.exists():
+            try:
+                with profile.stage('metrics.load'):
+                    self.metrics.load(self.metrics_path)
+            except Exception as e:
+                logger.error('读取指标文件失败 {}'.format(e))
+        self.metrics_timer = QtCore.QTimer()
+        self.metrics_timer.timeout.connect(self.record_metrics)
+        self.metrics_timer.start(1000)
+        self.metrics_save_timer = QtCore.QTimer()
+        self.metrics_save_timer.timeout.connect(
+            lambda: threading.Thread(target=self.save_metrics, daemon=True).start()
+        )
+        self.metrics_save_timer.start(60000)
+        self.data_callback = CallBackMap()
+        with profile.stage('page:首页'):
+            home_page = NView.Scroll(HomePage(self))
+        # 实时数据 (头像下载) 和语音播报页面在第一次打开时才构造
         menus = [
             NView.MenuItem(
                 title="首页",
                 icon="Icons:home.svg",
-                page=NView.Scroll(HomePage(self)),
+                page=home_page,
                 callback=None
             ),
             NView.MenuItem(
                 title="实时数据",
                 icon="Icons:data-sheet.svg",
-                page=NView.Scroll(RealTimeDataPage(self)),
+                page=LazyPage('实时数据', lambda: NView.Scroll(RealTimeDataPage(self))),
                 callback=None
             ),
             NView.MenuItem(
                 title="语音播报",
                 icon="Icons:entertainment.svg",
-                page=NView.Scroll(TTSPage(self)),
+                page=LazyPage('语音播报', lambda: NView.Scroll(TTSPage(self))),
                 callback=None
             )
         ]
-        super().__init__(
-            title="Dy-Tools",
-            version="0.0.1",
-            icon="Icons:naive.svg",
-            menus=menus
-        )
+        with profile.stage('window'):
+            super().__init__(
+                title="Dy-Tools",
+                version="0.0.1",
+                icon="Icons:naive.svg",
+                menus=menus
+            )
+        self.init_callback()
 
-    def writer_msg(self):
-        logger.info('[save]')
-        self.writer_live_data()
-        if not self.msgData: return
-        save_path = Path('./') / 'live_data' / '{}_msg.jsonl'.format(
-            datetime.datetime.now().strftime('%Y-%m-%d'))
-        with open(save_path, 'a', encoding='utf-8') as f:
-            f.write(
-                json.dumps(self.msgData, ensure_ascii=False).encode('utf-8', errors='ignore').decode('utf-8') + '\n')
-        self.msgData.clear()
+    def init_callback(self):
+        # 信号要在 QWidget 初始化之后才能连接; 事件记录不依赖语音播报页面是否已经打开
+        self.follow_callback_signal.connect(
+            lambda data: self.record_event('关注回调', data["user"]["nickName"]))
+        self.msg_callback_signal.connect(
+            lambda data: self.record_event('用户消息回调', data["user"]["nickName"], data["content"]))
+        self.gift_callback_signal.connect(
+            lambda data: self.record_event('礼物回调', data["user"]["nickName"], data["gift"]["name"]))
+        self.enter_callback_signal.connect(
+            lambda data: self.record_event('进入直播间回调', data["user"]["nickName"]))
+        self.data_callback.follow = self.follow_callback_signal.emit
+        self.data_callback.userMsg = self.msg_callback_signal.emit
+        self.data_callback.giftNews = self.gift_callback_signal.emit
+        self.data_callback.enterRoom = self.enter_callback_signal.emit
+
+    def record_event(self, kind: str, username: str, content: str | None = None):
+        record = {'time': int(time.time()), 'type': kind, 'user': username}
+        if content is not None:
+            record['content'] = content
+        self.session_writer.write('msg', record)
 
     def writer_live_data(self):
-        save_path = Path('./') / 'live_data' / '{}_live.jsonl'.format(
-            datetime.datetime.now().strftime('%Y-%m-%d'))
-        save_path.parent.mkdir(exist_ok=True, parents=True)
-        with open(save_path, 'a', encoding='utf-8') as f:
-            f.write(self.live_data.to_json().encode('utf-8', errors='ignore').decode('utf-8') + '\n')
+        snapshot = self.live_data.snapshot()
+        if snapshot.version == self.last_written_version:
+            return
+        self.last_written_version = snapshot.version
+        # 排行榜没有变化时只写数值, 数值的历史由 metrics 保存
+        ranking_changed = snapshot.ranking != self.last_written_ranking
+        self.last_written_ranking = snapshot.ranking
+        self.session_writer.write('live', snapshot.to_json(ranking=ranking_changed))
+
+    def record_metrics(self):
+        self.metrics.record(time.time(), self.live_data.snapshot())
+
+    def save_metrics(self):
+        try:
+            self.metrics.save(self.metrics_path)
+        except Exception as e:
+            logger.error('保存指标文件失败 {}'.format(e))
+
+    def close_storage(self):
+        self.save_metrics()
+        self.session_writer.close()
 
     def load_config(self):
         config_path = Path('./').parent / 'config.toml'
@@ -609,8 +823,21 @@ class MainWindow(NView.MicaWindow):
             toml.dump(self.config, f)
 
 
+def report_startup(app: QtWidgets.QApplication):
+    profile.uninstall()
+    print(profile.report())
+    app.quit()
+
+
 if __name__ == '__main__':
-    app = QtWidgets.QApplication(sys.argv)
-    window = MainWindow()
-    window.show()
+    with profile.stage('QApplication'):
+        app = QtWidgets.QApplication([arg for arg in sys.argv if arg != '--profile-startup'])
+    with profile.stage('MainWindow'):
+        window = MainWindow()
+    app.aboutToQuit.connect(window.close_storage)
+    with profile.stage('show'):
+        window.show()
+    if PROFILE_STARTUP:
+        # 事件循环处理完第一批事件 (窗口绘制) 后输出
+        QtCore.QTimer.singleShot(0, lambda: report_startup(app))
     sys.exit(app.exec())
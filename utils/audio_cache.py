@@ -0,0 +1,253 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from string import Template
+from typing import Callable, Union
+
+from .avatar_cache import _atomic_write
+from .metrics import Counters, LatencyStat
+
+logger = logging.getLogger(__name__)
+
+
+class Utterance(str):
+    """
+    带模板分段信息的播报文本
+
+    本身就是完整文本, 队列去重和日志不受影响; segments 为 ((是否为变量, 文本), ...)
+    """
+    segments: tuple
+
+    def __new__(cls, text: str, segments: tuple = ()):
+        obj = super().__new__(cls, text)
+        obj.segments = segments
+        return obj
+
+
+def _split_template(template: str) -> list[tuple[Union[str, None], str]]:
+    # [(变量名, ''), (None, 静态文本), ...], 相邻的静态文本合并为一段
+    segments = []
+    pos = 0
+    static = ''
+    for m in Template.pattern.finditer(template):
+        static += template[pos:m.start()]
+        pos = m.end()
+        named = m.group('named') or m.group('braced')
+        if named is not None:
+            if static:
+                segments.append((None, static))
+                static = ''
+            segments.append((named, ''))
+        elif m.group('escaped') is not None:
+            static += Template.delimiter
+        else:
+            raise ValueError('Invalid placeholder in string: {}'.format(template))
+    static += template[pos:]
+    if static:
+        segments.append((None, static))
+    return segments
+
+
+def render_template(template: str, **values) -> Utterance:
+    """
+    与 Template(template).substitute(**values) 结果相同, 同时记录静态文本和变量的分段
+    :param template:
+    :param values:
+    :return:
+    """
+    segments = tuple(
+        (True, str(values[name])) if name is not None else (False, text)
+        for name, text in _split_template(template)
+    )
+    return Utterance(''.join(text for _, text in segments), tuple(item for item in segments if item[1]))
+
+
+def _speakable(text: str) -> bool:
+    # 纯标点或空白的片段 edge-tts 不会返回音频
+    return any(ch.isalnum() for ch in text)
+
+
+class AudioCache:
+    """
+    合成语音缓存
+
+    以 (文本, 音色, 音量, 语速, 音调) 为键, 内存和磁盘各自按字节上限 LRU 淘汰。
+    分段模式下模板的静态文本单独合成并缓存, 播报时只需合成变量部分再拼接 MP3 数据,
+    常见的礼物名和老观众昵称也会命中缓存, 大部分播报不再需要请求网络。
+    """
+
+    def __init__(self, synthesize: Callable[[str, str, str, str, str], bytes],
+                 cache_dir: Union[Path, str] = Path('./') / 'cache' / 'tts',
+                 memory_budget: int = 8 * 1024 * 1024,
+                 disk_budget: int = 128 * 1024 * 1024,
+                 suffix: str = 'mp3'):
+        """
+        :param synthesize: synthesize(text, voice, volume, rate, pitch) -> 音频数据
+        :param cache_dir:
+        :param memory_budget: 内存缓存字节上限
+        :param disk_budget: 磁盘缓存字节上限
+        :param suffix: 缓存文件后缀, 与合成后端的输出格式一致
+        """
+        self.synthesize = synthesize
+        self.suffix = suffix
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.memory_budget = memory_budget
+        self.disk_budget = disk_budget
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        # key -> 文件大小, 按最近使用排序
+        self._disk = OrderedDict()
+        self._disk_bytes = 0
+        self.counters = Counters()
+        self.latency = LatencyStat()
+        self._load_disk_index()
+
+    def _load_disk_index(self):
+        files = []
+        for path in self.cache_dir.glob('*.{}'.format(self.suffix)):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, path.stem, stat.st_size))
+        for _, key, size in sorted(files):
+            self._disk[key] = size
+            self._disk_bytes += size
+        self._evict_disk()
+
+    @staticmethod
+    def key(text: str, voice: str, volume: str, rate: str, pitch: str) -> str:
+        return hashlib.sha1('\0'.join((text, voice, volume, rate, pitch)).encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / '{}.{}'.format(key, self.suffix)
+
+    def _memory_put(self, key: str, audio: bytes):
+        if len(audio) > self.memory_budget:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old)
+        self._memory[key] = audio
+        self._memory_bytes += len(audio)
+        while self._memory_bytes > self.memory_budget:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _evict_disk(self):
+        while self._disk_bytes > self.disk_budget and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            self.counters.incr('disk_evictions')
+            try:
+                self._path(key).unlink()
+            except OSError:
+                pass
+
+    def _disk_get(self, key: str) -> Union[bytes, None]:
+        with self._lock:
+            if key not in self._disk:
+                return None
+            self._disk.move_to_end(key)
+        path = self._path(key)
+        try:
+            audio = path.read_bytes()
+            # 用修改时间记录最近使用, 重启后按它恢复 LRU 顺序
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self._disk_bytes -= self._disk.pop(key, 0)
+            return None
+        return audio
+
+    def _disk_put(self, key: str, audio: bytes):
+        try:
+            _atomic_write(self._path(key), audio)
+        except OSError as e:
+            logger.error('语音缓存写入失败 {}'.format(e))
+            return
+        with self._lock:
+            self._disk_bytes -= self._disk.pop(key, 0)
+            self._disk[key] = len(audio)
+            self._disk_bytes += len(audio)
+            self._evict_disk()
+
+    def get(self, text: str, voice: str, volume: str, rate: str, pitch: str) -> bytes:
+        """
+        获取一段文本的语音, 依次查找内存、磁盘, 都未命中时调用 synthesize 合成
+        :return: 音频数据
+        """
+        key = self.key(text, voice, volume, rate, pitch)
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+                self.counters.incr('memory_hits')
+                return audio
+        audio = self._disk_get(key)
+        if audio is not None:
+            self.counters.incr('disk_hits')
+        else:
+            self.counters.incr('misses')
+            with self.latency.time():
+                audio = self.synthesize(text, voice, volume, rate, pitch)
+            if not audio:
+                # 合成结果为空时不缓存
+                return audio
+            self._disk_put(key, audio)
+        with self._lock:
+            self._memory_put(key, audio)
+        return audio
+
+    def render(self, text: str, voice: str, volume: str, rate: str, pitch: str, segmented: bool = False) -> bytes:
+        """
+        合成一条播报
+        :param text: 普通文本或 render_template 生成的 Utterance
+        :param segmented: 是否按模板分段合成后拼接
+        :return:
+        """
+        segments = getattr(text, 'segments', ())
+        if not segmented or len(segments) < 2:
+            return self.get(str(text), voice, volume, rate, pitch)
+        self.counters.incr('segmented')
+        # edge-tts 输出的是不带 ID3 头的 MP3 帧, 直接拼接即可连续播放
+        return b''.join(
+            self.get(segment, voice, volume, rate, pitch)
+            for _, segment in segments if _speakable(segment)
+        )
+
+    def warm(self, templates, voice: str, volume: str, rate: str, pitch: str):
+        """
+        预先合成模板中的静态文本
+        :param templates: 模板字符串列表
+        :return:
+        """
+        for template in templates:
+            try:
+                segments = _split_template(template)
+            except ValueError:
+                continue
+            for name, text in segments:
+                if name is None and _speakable(text):
+                    self._warm_one(text, voice, volume, rate, pitch)
+
+    def _warm_one(self, text: str, voice: str, volume: str, rate: str, pitch: str):
+        try:
+            self.get(text, voice, volume, rate, pitch)
+        except Exception as e:
+            logger.error('预合成失败 {}: {}'.format(text, e))
+
+    def stats(self) -> dict:
+        with self._lock:
+            sizes = {
+                'memory_items': len(self._memory),
+                'memory_bytes': self._memory_bytes,
+                'disk_items': len(self._disk),
+                'disk_bytes': self._disk_bytes,
+            }
+        return {**sizes, **self.counters.to_dict(), 'synthesize': self.latency.to_dict()}
@@ -0,0 +1,242 @@
+import email.utils
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Union
+
+from .metrics import Counters
+
+logger = logging.getLogger(__name__)
+
+_MAX_AGE = re.compile(r'max-age=(\d+)')
+
+
+def _atomic_write(path: Path, data: bytes):
+    tmp = path.with_name('{}.{}.tmp'.format(path.name, threading.get_ident()))
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def _expires_at(headers, default_ttl: float) -> float:
+    cache_control = headers.get('cache-control', '')
+    if 'no-store' in cache_control or 'no-cache' in cache_control:
+        return time.time()
+    if m := _MAX_AGE.search(cache_control):
+        return time.time() + int(m.group(1))
+    if expires := headers.get('expires'):
+        try:
+            return email.utils.parsedate_to_datetime(expires).timestamp()
+        except (TypeError, ValueError):
+            pass
+    return time.time() + default_ttl
+
+
+class AvatarCache:
+    """
+    两级头像缓存
+
+    内存中按字节预算 LRU 保存解码后的图片, 磁盘上以 URL 哈希为文件名保存原始数据,
+    过期后带 ETag / Last-Modified 发起条件请求, 未修改时直接复用磁盘文件。
+    下载失败 (且没有磁盘缓存) 的 URL 在 negative_ttl 秒内直接返回 None, 之后再次获取时重新下载。
+    """
+
+    def __init__(self, cache_dir: Union[Path, str] = Path('./') / 'cache' / 'avatars',
+                 memory_budget: int = 16 * 1024 * 1024,
+                 decode: Callable[[bytes], Any] = bytes,
+                 size_of: Callable[[Any], int] = len,
+                 default_ttl: float = 24 * 3600,
+                 max_workers: int = 8,
+                 timeout: float = 5.0,
+                 negative_ttl: float = 30.0):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.memory_budget = memory_budget
+        self.decode = decode
+        self.size_of = size_of
+        self.default_ttl = default_ttl
+        # 单个头像请求的超时时间
+        self.timeout = timeout
+        self.negative_ttl = negative_ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='avatar')
+        # 正在下载的请求, 同一个 URL 只下载一次
+        self._inflight: dict[str, Future] = {}
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        # 下载失败的 URL -> 允许重试的时间
+        self._failures: dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.counters = Counters()
+
+    @staticmethod
+    def key(url: str) -> str:
+        return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+    def _paths(self, url: str) -> tuple[Path, Path]:
+        key = self.key(url)
+        return self.cache_dir / key, self.cache_dir / '{}.json'.format(key)
+
+    def _memory_get(self, url: str):
+        with self._lock:
+            item = self._memory.get(url)
+            if item is None:
+                return None
+            self._memory.move_to_end(url)
+            return item[0]
+
+    def _memory_put(self, url: str, value):
+        size = self.size_of(value)
+        if size > self.memory_budget:
+            return
+        with self._lock:
+            old = self._memory.pop(url, None)
+            if old is not None:
+                self._memory_bytes -= old[1]
+            self._memory[url] = (value, size)
+            self._memory_bytes += size
+            while self._memory_bytes > self.memory_budget:
+                _, (_, evicted) = self._memory.popitem(last=False)
+                self._memory_bytes -= evicted
+                self.counters.incr('memory_evictions')
+
+    def _failed_recently(self, url: str) -> bool:
+        with self._lock:
+            retry_at = self._failures.get(url)
+            if retry_at is None:
+                return False
+            if retry_at > time.time():
+                return True
+            del self._failures[url]
+            return False
+
+    def _record_failure(self, url: str):
+        now = time.time()
+        with self._lock:
+            if len(self._failures) >= 1024:
+                # 清掉已经可以重试的记录
+                self._failures = {key: value for key, value in self._failures.items() if value > now}
+            self._failures[url] = now + self.negative_ttl
+
+    def _read_meta(self, meta_path: Path) -> dict:
+        try:
+            return json.loads(meta_path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return {}
+
+    def _fetch(self, url: str, meta: dict, data_path: Path, meta_path: Path) -> bytes:
+        headers = {}
+        if data_path.exists():
+            if etag := meta.get('etag'):
+                headers['if-none-match'] = etag
+            if last_modified := meta.get('last_modified'):
+                headers['if-modified-since'] = last_modified
+        # httpx 只在第一次下载时导入, 不拖慢界面启动
+        from .http_pool import get_pool
+        response = get_pool().get(url, headers=headers, timeout=self.timeout)
+        if response.status_code == 304:
+            self.counters.incr('revalidated')
+            content = data_path.read_bytes()
+        else:
+            response.raise_for_status()
+            self.counters.incr('downloads')
+            content = response.content
+            _atomic_write(data_path, content)
+            meta = {
+                'url': url,
+                'etag': response.headers.get('etag'),
+                'last_modified': response.headers.get('last-modified'),
+            }
+        meta['expires'] = _expires_at(response.headers, self.default_ttl)
+        _atomic_write(meta_path, json.dumps(meta).encode('utf-8'))
+        return content
+
+    def get(self, url: str):
+        """
+        依次查找内存、磁盘和网络, 返回解码后的图片, 失败时返回 None
+        :param url:
+        :return:
+        """
+        if not url:
+            return None
+        value = self._memory_get(url)
+        if value is not None:
+            self.counters.incr('memory_hits')
+            return value
+        if self._failed_recently(url):
+            self.counters.incr('negative_hits')
+            return None
+        data_path, meta_path = self._paths(url)
+        meta = self._read_meta(meta_path)
+        try:
+            if data_path.exists() and meta.get('expires', 0) > time.time():
+                self.counters.incr('disk_hits')
+                content = data_path.read_bytes()
+            else:
+                content = self._fetch(url, meta, data_path, meta_path)
+        except Exception as e:
+            logger.error('头像获取失败 {}: {}'.format(url, e))
+            self.counters.incr('errors')
+            # 网络失败时退回到已过期的磁盘缓存
+            if not data_path.exists():
+                self._record_failure(url)
+                return None
+            content = data_path.read_bytes()
+        value = self.decode(content)
+        self._memory_put(url, value)
+        return value
+
+    def peek(self, url: str):
+        """
+        只查找内存缓存, 不会阻塞
+        :param url:
+        :return:
+        """
+        return self._memory_get(url) if url else None
+
+    def fetch(self, url: str) -> Future:
+        """
+        在线程池中获取头像, 同一 URL 的并发请求共用一个 Future
+        :param url:
+        :return:
+        """
+        with self._lock:
+            future = self._inflight.get(url)
+            if future is not None:
+                self.counters.incr('inflight_hits')
+                return future
+            future = self._executor.submit(self.get, url)
+            self._inflight[url] = future
+
+        def done(_):
+            with self._lock:
+                self._inflight.pop(url, None)
+
+        future.add_done_callback(done)
+        return future
+
+    def prefetch(self, urls, on_ready: Callable[[str, Any], None]):
+        """
+        并发获取一批头像, 每完成一个就回调一次 on_ready(url, image), 不等待最慢的请求
+        :param urls:
+        :param on_ready: 在线程池线程中调用
+        :return:
+        """
+        for url in dict.fromkeys(url for url in urls if url):
+            self.fetch(url).add_done_callback(
+                lambda future, url=url: on_ready(url, None if future.exception() else future.result())
+            )
+
+    def stats(self) -> dict:
+        with self._lock:
+            memory = {
+                'memory_items': len(self._memory),
+                'memory_bytes': self._memory_bytes,
+                'inflight': len(self._inflight),
+            }
+        return {**memory, **self.counters.to_dict()}
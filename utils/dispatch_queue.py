@@ -0,0 +1,268 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Hashable, Union
+
+from .metrics import Counters, LatencyStat
+
+logger = logging.getLogger(__name__)
+
+# 队列满时按顺序丢弃, 越靠前越先丢; 不在其中的 method (礼物、弹幕、关注) 永不丢弃
+DEFAULT_DROP_ORDER = (
+    'WebcastLikeMessage',
+    'WebcastMemberMessage',
+    'WebcastRoomUserSeqMessage',
+    'WebcastUpdateFanTicketMessage',
+)
+
+
+class DispatchQueue:
+    """
+    消息处理队列
+
+    接收线程只负责入队, 解析和回调在工作线程中完成。同一个 (owner, method) 的消息按顺序
+    串行处理, 不同 method 之间可以并行, 因此点赞数等状态不会被旧消息覆盖。
+    队列满时按 drop_order 丢弃最旧的低价值消息, 受保护的消息即使超出容量也会入队。
+    workers 为 0 时 put 直接在调用线程中处理。close 之后 put 的消息计为丢弃, 调用 start 才重新打开。
+    """
+
+    def __init__(self, max_size: int = 5000, workers: int = 2,
+                 drop_order: tuple = DEFAULT_DROP_ORDER, name: str = 'dispatch'):
+        self.max_size = max_size
+        self.workers = workers
+        self.drop_order = tuple(drop_order)
+        self._droppable = set(self.drop_order)
+        self.name = name
+        self.counters = Counters()
+        # 入队到开始处理的等待时间
+        self.wait = LatencyStat()
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        # (owner, method) -> deque[(seq, 入队时间, handler, payload)]
+        self._queues: dict[tuple, deque] = {}
+        # method -> 有待处理消息的 key
+        self._by_method: dict[str, set] = {}
+        # 可以被取走的 key, (队首 seq, key)
+        self._ready = []
+        self._scheduled = set()
+        self._busy = set()
+        self._size = 0
+        self._closed = False
+        self._threads: list[threading.Thread] = []
+
+    def start(self):
+        """
+        启动工作线程, close 之后调用可以重新打开队列
+        :return:
+        """
+        with self._cond:
+            self._closed = False
+            threads = self._spawn()
+        for thread in threads:
+            thread.start()
+
+    def _spawn(self) -> list[threading.Thread]:
+        # 调用前需持有 _cond, 返回需要启动的线程
+        if self._threads or self.workers <= 0:
+            return []
+        self._threads = [
+            threading.Thread(target=self._worker, name='{}-{}'.format(self.name, i), daemon=True)
+            for i in range(self.workers)
+        ]
+        return self._threads
+
+    def _dropped(self, method: str):
+        self.counters.incr('dropped')
+        self.counters.incr('dropped.{}'.format(method))
+
+    def _schedule(self, key):
+        if key in self._busy or key in self._scheduled:
+            return
+        items = self._queues.get(key)
+        if items:
+            self._scheduled.add(key)
+            heapq.heappush(self._ready, (items[0][0], key))
+
+    def _evict(self) -> bool:
+        for method in self.drop_order:
+            keys = self._by_method.get(method)
+            if not keys:
+                continue
+            # 丢弃该 method 中最早入队的一条; keys 只包含有积压的连接, 数量不超过直播间数
+            key = min(keys, key=lambda key: self._queues[key][0][0])
+            items = self._queues[key]
+            items.popleft()
+            self._size -= 1
+            if not items:
+                keys.discard(key)
+                self._forget(key)
+            self._dropped(method)
+            return True
+        return False
+
+    def _forget(self, key):
+        # 调用前需持有 _cond; 删除空的 key, 不再引用已关闭的连接
+        if key not in self._busy and not self._queues.get(key, True):
+            del self._queues[key]
+
+    def discard(self, owner: Hashable) -> int:
+        """
+        丢弃某个连接还没处理的消息, 连接关闭时调用; 正在处理的那一条不受影响
+        :param owner:
+        :return: 丢弃的条数
+        """
+        dropped = 0
+        with self._cond:
+            for key in [key for key in self._queues if key[0] is owner]:
+                items = self._queues[key]
+                dropped += len(items)
+                self._size -= len(items)
+                items.clear()
+                self._by_method.get(key[1], set()).discard(key)
+                self._forget(key)
+            if not self._busy and not self._size:
+                self._cond.notify_all()
+        if dropped:
+            self.counters.incr('discarded', dropped)
+        return dropped
+
+    def put(self, owner: Hashable, method: str, handler: Callable[[Any], None], payload) -> bool:
+        """
+        加入一条消息
+        :param owner: 消息所属的连接, 与 method 一起决定处理顺序
+        :param method:
+        :param handler: 在工作线程中调用 handler(payload)
+        :param payload:
+        :return: 被丢弃 (包括队列已关闭) 时返回 False
+        """
+        if self.workers <= 0:
+            if self._closed:
+                self._dropped(method)
+                return False
+            self._call(handler, payload)
+            return True
+        with self._cond:
+            if self._closed:
+                self._dropped(method)
+                return False
+            # 第一次 put 时启动工作线程
+            threads = self._spawn()
+        for thread in threads:
+            thread.start()
+        with self._cond:
+            if self._closed:
+                self._dropped(method)
+                return False
+            if self._size >= self.max_size and not self._evict():
+                if method in self._droppable:
+                    self._dropped(method)
+                    return False
+                # 只剩受保护的消息, 宁可超出容量也不丢
+                self.counters.incr('over_capacity')
+            key = (owner, method)
+            items = self._queues.get(key)
+            if items is None:
+                items = self._queues[key] = deque()
+            items.append((next(self._seq), time.perf_counter(), handler, payload))
+            self._by_method.setdefault(method, set()).add(key)
+            self._size += 1
+            self.counters.incr('enqueued')
+            self._schedule(key)
+            self._cond.notify()
+        return True
+
+    def _take(self):
+        # 调用前需持有 _cond
+        while self._ready:
+            _, key = heapq.heappop(self._ready)
+            self._scheduled.discard(key)
+            items = self._queues.get(key)
+            if not items or key in self._busy:
+                continue
+            item = items.popleft()
+            self._size -= 1
+            if not items:
+                self._by_method[key[1]].discard(key)
+            self._busy.add(key)
+            return key, item
+        return None
+
+    def _call(self, handler, payload):
+        try:
+            handler(payload)
+            self.counters.incr('processed')
+        except Exception as e:
+            self.counters.incr('errors')
+            logger.error('消息处理失败 {}'.format(e), exc_info=True)
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                taken = self._take()
+                while taken is None:
+                    if self._closed:
+                        return
+                    self._cond.wait()
+                    taken = self._take()
+            key, (_, enqueued, handler, payload) = taken
+            self.wait.observe(time.perf_counter() - enqueued)
+            self._call(handler, payload)
+            with self._cond:
+                self._busy.discard(key)
+                self._forget(key)
+                self._schedule(key)
+                if self._ready:
+                    self._cond.notify()
+                if not self._busy and not self._size:
+                    self._cond.notify_all()
+
+    def join(self, timeout: Union[float, None] = None) -> bool:
+        """
+        等待队列中的消息全部处理完
+        :param timeout:
+        :return: 超时返回 False
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._size or self._busy:
+                if not self._threads:
+                    return False
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, drain: bool = False):
+        """
+        停止工作线程
+        :param drain: 是否先处理完剩余消息
+        :return:
+        """
+        if drain:
+            self.join()
+        with self._cond:
+            self._closed = True
+            self._queues.clear()
+            self._by_method.clear()
+            self._ready.clear()
+            self._scheduled.clear()
+            self._size = 0
+            threads, self._threads = self._threads, []
+            self._cond.notify_all()
+        current = threading.current_thread()
+        for thread in threads:
+            if thread is not current:
+                thread.join()
+
+    def __len__(self):
+        with self._cond:
+            return self._size
+
+    def stats(self) -> dict:
+        with self._cond:
+            depth = {'depth': self._size, 'busy': len(self._busy)}
+        return {**depth, **self.counters.to_dict(), 'wait': self.wait.to_dict()}
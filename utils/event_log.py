@@ -0,0 +1,369 @@
+import bisect
+import json
+import logging
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Iterable, Iterator, NamedTuple, Union
+
+from .metrics import Counters, LatencyStat
+from .scheduler import get_scheduler
+
+logger = logging.getLogger(__name__)
+
+# 块头: 魔数, 压缩后长度, 原始长度, 压缩数据 crc32
+_BLOCK = struct.Struct('<4sIII')
+_MAGIC = b'DYLB'
+# 记录头: 时间戳, method 长度, payload 长度
+_RECORD = struct.Struct('<dHI')
+
+_STOP = object()
+
+
+class Event(NamedTuple):
+    ts: float
+    method: str
+    payload: bytes
+
+
+def index_path(path: Union[Path, str]) -> Path:
+    path = Path(path)
+    return path.with_name(path.name + '.idx')
+
+
+def _decode_block(raw: bytes) -> Iterator[Event]:
+    view = memoryview(raw)
+    pos = 0
+    while pos < len(view):
+        ts, method_len, payload_len = _RECORD.unpack_from(view, pos)
+        pos += _RECORD.size
+        method = bytes(view[pos:pos + method_len]).decode('utf-8')
+        pos += method_len
+        yield Event(ts, method, bytes(view[pos:pos + payload_len]))
+        pos += payload_len
+
+
+def _block_entry(offset: int, size: int, events: list[Event]) -> dict:
+    methods = {}
+    for event in events:
+        methods[event.method] = methods.get(event.method, 0) + 1
+    return {
+        'offset': offset,
+        'size': size,
+        'count': len(events),
+        'min_ts': min(event.ts for event in events),
+        'max_ts': max(event.ts for event in events),
+        'methods': methods,
+    }
+
+
+def _read_block(f, offset: int) -> Union[tuple[int, bytes], None]:
+    """
+    读取 offset 处的一个块
+    :return: (块总长度, 解压后的数据), 块不完整或损坏时返回 None
+    """
+    f.seek(offset)
+    header = f.read(_BLOCK.size)
+    if len(header) < _BLOCK.size:
+        return None
+    magic, compressed_len, raw_len, crc = _BLOCK.unpack(header)
+    if magic != _MAGIC:
+        return None
+    compressed = f.read(compressed_len)
+    if len(compressed) < compressed_len or zlib.crc32(compressed) != crc:
+        return None
+    raw = zlib.decompress(compressed)
+    if len(raw) != raw_len:
+        return None
+    return _BLOCK.size + compressed_len, raw
+
+
+def scan_blocks(f, offset: int = 0) -> Iterator[dict]:
+    """
+    从 offset 开始顺序扫描数据文件, 生成索引条目, 遇到不完整的块停止
+    :param f: 以二进制模式打开的数据文件
+    :param offset:
+    :return:
+    """
+    while True:
+        block = _read_block(f, offset)
+        if block is None:
+            return
+        size, raw = block
+        events = list(_decode_block(raw))
+        if events:
+            yield _block_entry(offset, size, events)
+        offset += size
+
+
+def _load_index(path: Path) -> list[dict]:
+    size = path.stat().st_size
+    entries = []
+    try:
+        with open(index_path(path), 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # 写索引时中断只会损坏最后一行
+                    break
+                # 数据文件被截断时, 超出文件末尾的块不再可读
+                if entry['offset'] + entry['size'] > size:
+                    break
+                entries.append(entry)
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+class EventLogWriter:
+    """
+    只追加的直播事件日志
+
+    事件按 (时间戳, method, payload) 记录, 攒够 block_size 字节或超过 flush_interval 秒后
+    压缩成一个块写入数据文件, 同时在 .idx 文件追加一行该块的偏移、时间范围和 method 统计。
+    打开已有文件时会补齐缺失的索引并截掉写了一半的块。
+
+    append 在接收线程中调用, 只把记录追加到缓冲区; 压缩和写文件在后台写入线程中按顺序完成。
+    没有新事件时, 共享定时器每 flush_interval 秒把攒了一半的块交给写入线程。
+    """
+
+    def __init__(self, path: Union[Path, str], block_size: int = 256 * 1024,
+                 flush_interval: float = 5.0, level: int = 6, max_pending: int = 64):
+        """
+        :param path: 数据文件, 索引写到同名的 .idx 文件
+        :param block_size: 每块的原始字节数
+        :param flush_interval: 块最长攒多少秒
+        :param level: zlib 压缩级别
+        :param max_pending: 等待写入的块数上限, 磁盘或压缩跟不上时丢弃新块并计数, 不阻塞接收线程
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.block_size = block_size
+        self.flush_interval = flush_interval
+        self.level = level
+        self.counters = Counters()
+        # 每块压缩 + 写入耗时
+        self.latency = LatencyStat()
+        self._lock = threading.Lock()
+        self._buffer = bytearray()
+        self._events: list[Event] = []
+        self._block_start = time.monotonic()
+        # 等待写入的块 (原始数据, 事件), _STOP 表示结束
+        self._blocks = queue.Queue(maxsize=max_pending)
+        self._thread: Union[threading.Thread, None] = None
+        self._closed = False
+        self._recover()
+        self._data = open(self.path, 'ab')
+        self._index = open(index_path(self.path), 'a', encoding='utf-8')
+        self._timer = get_scheduler().call_every(flush_interval, self._flush_idle)
+
+    def _recover(self):
+        if not self.path.exists():
+            index_path(self.path).unlink(missing_ok=True)
+            return
+        entries = _load_index(self.path)
+        end = entries[-1]['offset'] + entries[-1]['size'] if entries else 0
+        with open(self.path, 'r+b') as f:
+            missing = list(scan_blocks(f, end))
+            if missing:
+                end = missing[-1]['offset'] + missing[-1]['size']
+            f.seek(0, os.SEEK_END)
+            if f.tell() > end:
+                logger.warning('{} 末尾有 {} 字节不完整的数据, 已截断'.format(self.path, f.tell() - end))
+                f.truncate(end)
+        # 重写索引, 顺带丢掉损坏的最后一行
+        with open(index_path(self.path), 'w', encoding='utf-8') as f:
+            for entry in entries + missing:
+                f.write(json.dumps(entry) + '\n')
+
+    def append(self, method: str, payload: bytes, ts: Union[float, None] = None):
+        if ts is None:
+            ts = time.time()
+        method_bytes = method.encode('utf-8')
+        with self._lock:
+            if self._closed:
+                self.counters.incr('dropped')
+                return
+            if not self._events:
+                self._block_start = time.monotonic()
+            self._buffer += _RECORD.pack(ts, len(method_bytes), len(payload))
+            self._buffer += method_bytes
+            self._buffer += payload
+            # 只保留索引需要的字段
+            self._events.append(Event(ts, method, b''))
+            if len(self._buffer) >= self.block_size or time.monotonic() - self._block_start >= self.flush_interval:
+                self._submit_block()
+
+    def _submit_block(self, wait: bool = False):
+        # 调用前需持有 _lock, 把当前块交给写入线程; 接收线程中不等待, 队列满时丢弃整块
+        if not self._events:
+            return
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='event-log-writer', daemon=True)
+            self._thread.start()
+        try:
+            self._blocks.put((bytes(self._buffer), self._events), block=wait)
+        except queue.Full:
+            self.counters.incr('dropped', len(self._events))
+            self.counters.incr('dropped_blocks')
+            logger.warning('{} 写入跟不上, 丢弃 {} 条事件'.format(self.path, len(self._events)))
+        self._buffer.clear()
+        self._events = []
+
+    def _flush_idle(self):
+        # 在共享定时器的工作线程中调用, 直播间安静时也按时落盘
+        with self._lock:
+            if self._events and time.monotonic() - self._block_start >= self.flush_interval:
+                self._submit_block()
+
+    def _write_block(self, raw: bytes, events: list[Event]):
+        with self.latency.time():
+            compressed = zlib.compress(raw, self.level)
+            offset = self._data.tell()
+            self._data.write(_BLOCK.pack(_MAGIC, len(compressed), len(raw), zlib.crc32(compressed)))
+            self._data.write(compressed)
+            self._data.flush()
+            # 先落数据再写索引, 中途退出时可以从数据文件补出索引
+            entry = _block_entry(offset, _BLOCK.size + len(compressed), events)
+            self._index.write(json.dumps(entry) + '\n')
+            self._index.flush()
+        self.counters.incr('blocks')
+        self.counters.incr('events', len(events))
+
+    def _run(self):
+        while True:
+            item = self._blocks.get()
+            try:
+                if item is _STOP:
+                    return
+                self._write_block(*item)
+            except Exception as e:
+                self.counters.incr('errors')
+                logger.error('写入事件日志失败 {}'.format(e), exc_info=True)
+            finally:
+                self._blocks.task_done()
+
+    def flush(self):
+        """
+        把缓冲区中的事件写入文件, 等待写入完成
+        :return:
+        """
+        with self._lock:
+            self._submit_block(wait=True)
+        self._blocks.join()
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._submit_block(wait=True)
+            thread = self._thread
+        self._timer.cancel()
+        if thread is not None:
+            self._blocks.put(_STOP)
+            thread.join()
+        self._data.close()
+        self._index.close()
+
+    def stats(self) -> dict:
+        return {'pending': self._blocks.qsize(), **self.counters.to_dict(), 'block': self.latency.to_dict()}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class EventLogReader:
+    """
+    按时间范围或 method 读取事件日志, 只解压索引命中的块
+    """
+
+    def __init__(self, path: Union[Path, str]):
+        self.path = Path(path)
+        self.blocks = _load_index(self.path)
+        end = self.blocks[-1]['offset'] + self.blocks[-1]['size'] if self.blocks else 0
+        # 索引落后于数据文件 (写入时中断或索引丢失) 时从数据补齐
+        if self.path.stat().st_size > end:
+            with open(self.path, 'rb') as f:
+                self.blocks += list(scan_blocks(f, end))
+        # 前缀最大 max_ts 和后缀最小 min_ts 都是单调的, 时钟回拨时也能二分
+        self._prefix_max = []
+        for block in self.blocks:
+            self._prefix_max.append(max(block['max_ts'], self._prefix_max[-1]) if self._prefix_max else block['max_ts'])
+        self._suffix_min = [0.0] * len(self.blocks)
+        running = float('inf')
+        for i in range(len(self.blocks) - 1, -1, -1):
+            running = min(running, self.blocks[i]['min_ts'])
+            self._suffix_min[i] = running
+
+    def __len__(self):
+        return sum(block['count'] for block in self.blocks)
+
+    def time_range(self) -> Union[tuple[float, float], None]:
+        if not self.blocks:
+            return None
+        return self._suffix_min[0], self._prefix_max[-1]
+
+    def methods(self) -> dict:
+        counts = {}
+        for block in self.blocks:
+            for method, count in block['methods'].items():
+                counts[method] = counts.get(method, 0) + count
+        return counts
+
+    def select(self, start: Union[float, None] = None, end: Union[float, None] = None,
+               methods: Union[Iterable[str], None] = None) -> list[dict]:
+        """
+        返回可能包含符合条件事件的块
+        """
+        first = 0 if start is None else bisect.bisect_left(self._prefix_max, start)
+        methods = set(methods) if methods is not None else None
+        selected = []
+        for i in range(first, len(self.blocks)):
+            if end is not None and self._suffix_min[i] > end:
+                break
+            block = self.blocks[i]
+            if start is not None and block['max_ts'] < start:
+                continue
+            if end is not None and block['min_ts'] > end:
+                continue
+            if methods is not None and methods.isdisjoint(block['methods']):
+                continue
+            selected.append(block)
+        return selected
+
+    def read(self, start: Union[float, None] = None, end: Union[float, None] = None,
+             methods: Union[Iterable[str], None] = None) -> Iterator[Event]:
+        """
+        读取 [start, end] 时间范围内、method 在 methods 中的事件
+        :param start: 时间戳, None 表示不限
+        :param end:
+        :param methods: None 表示全部
+        :return:
+        """
+        methods = set(methods) if methods is not None else None
+        with open(self.path, 'rb') as f:
+            for block in self.select(start, end, methods):
+                result = _read_block(f, block['offset'])
+                if result is None:
+                    logger.warning('{} 偏移 {} 处的块已损坏'.format(self.path, block['offset']))
+                    continue
+                for event in _decode_block(result[1]):
+                    if start is not None and event.ts < start:
+                        continue
+                    if end is not None and event.ts > end:
+                        continue
+                    if methods is not None and event.method not in methods:
+                        continue
+                    yield event
+
+    def __iter__(self) -> Iterator[Event]:
+        return self.read()
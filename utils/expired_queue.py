@@ -1,64 +1,200 @@
-import copy
+import heapq
+import itertools
 import pprint
+import threading
 import time
+from collections import deque
+
+# 优先级, 数值越大越先播报
+PRIORITY_LOW = 0
+PRIORITY_NORMAL = 1
+PRIORITY_HIGH = 2
+
+
+class _Entry:
+    __slots__ = ('data', 'crt_time', 'expire_at', 'exclude', 'priority', 'seq', 'alive')
+
+    def __init__(self, data, crt_time: float, timeout: float, exclude: bool, priority: int, seq: int):
+        self.data = data
+        self.crt_time = crt_time
+        self.expire_at = crt_time + timeout
+        self.exclude = exclude
+        self.priority = priority
+        self.seq = seq
+        self.alive = True
+
+    def to_dict(self) -> dict:
+        return {
+            'data': self.data,
+            'crt_time': self.crt_time,
+            'exclude': self.exclude,
+            'timeout': self.expire_at - self.crt_time,
+            'priority': self.priority,
+        }
 
 
 class ExpiredQueue:
-    def __init__(self, max_count: int = 20):
-        self.queue = []
-        self.cache = []
+    """
+    带过期时间的播报队列
+
+    - 队列中和最近播报过的相同内容不会重复入队
+    - 超过 timeout 仍未播报的内容自动丢弃 (按过期时间建堆, 惰性清理)
+    - 超过 max_count 时丢弃最早入队的可丢弃 (exclude=True) 内容
+    - 优先级高的先出队, 同优先级按入队顺序
+    - get 阻塞等待新内容, 空闲时不占用 CPU
+    """
+
+    def __init__(self, max_count: int = 20, played_timeout: float = 15):
         self.max_count = max_count
+        # 播报过的内容在该时长内不再重复入队
+        self.played_timeout = played_timeout
+        self._cond = threading.Condition()
+        # interrupt 每调用一次加一, 用于唤醒阻塞中的 get
+        self._interrupts = 0
+        self._seq = itertools.count()
+        # (-priority, seq, entry)
+        self._ready = []
+        # (expire_at, seq, entry)
+        self._expiry = []
+        # 可丢弃的内容, 按入队顺序
+        self._excludable = deque()
+        # data -> entry
+        self._pending = {}
+        # data -> 播报去重截止时间
+        self._played = {}
+        # (expire_at, seq, data)
+        self._played_expiry = []
 
-    def add(self, data, timeout: int, exclude: bool = True):
-        self._clear_timeout_data()
-        for item in self.queue:
-            if data == item['data']:
-                return
-        for item in self.cache:
-            if data == item['data']:
-                return
-        self.queue.append({
-            'data': data,
-            'crt_time': time.time(),
-            'exclude': exclude,
-            'timeout': timeout
-        })
-        if len(self.queue) > self.max_count:
-            f_msg = filter(lambda item: item['exclude'], self.queue)
-            if len(f_msg) > 0:
-                self.queue.pop(f_msg[0])
-
-    def _clear_timeout_data(self):
-        new_queue = []
-        for item in self.queue:
-            data = copy.deepcopy(item)
-            crt_time = data['crt_time']
-            timeout = data['timeout']
-            if time.time() - crt_time < timeout:
-                new_queue.append(data)
-        self.queue = new_queue
-
-        cache = []
-        for item in self.cache:
-            data = copy.deepcopy(item)
-            crt_time = data['crt_time']
-            timeout = data['timeout']
-            if time.time() - crt_time < timeout:
-                cache.append(data)
-        self.cache = cache
+    def _remove(self, entry: _Entry):
+        entry.alive = False
+        del self._pending[entry.data]
+
+    def _evict(self, now: float):
+        while self._expiry and self._expiry[0][0] <= now:
+            entry = heapq.heappop(self._expiry)[2]
+            if entry.alive:
+                self._remove(entry)
+        while self._played_expiry and self._played_expiry[0][0] <= now:
+            expire_at, _, data = heapq.heappop(self._played_expiry)
+            if self._played.get(data) == expire_at:
+                del self._played[data]
+        while self._excludable and not self._excludable[0].alive:
+            self._excludable.popleft()
+        # 已出队或被丢弃的条目残留在堆和队列里, 各自按残留数量判断是否重建
+        limit = 2 * len(self._pending) + 64
+        if len(self._ready) > limit:
+            self._ready = [item for item in self._ready if item[2].alive]
+            heapq.heapify(self._ready)
+        if len(self._expiry) > limit:
+            self._expiry = [item for item in self._expiry if item[2].alive]
+            heapq.heapify(self._expiry)
+        if len(self._excludable) > limit:
+            self._excludable = deque(entry for entry in self._excludable if entry.alive)
+
+    def _drop_oldest_excludable(self) -> bool:
+        while self._excludable:
+            entry = self._excludable.popleft()
+            if entry.alive:
+                self._remove(entry)
+                return True
+        return False
+
+    def add(self, data, timeout: float, exclude: bool = True, priority: int = PRIORITY_NORMAL) -> bool:
+        """
+        加入队列
+        :param data: 播报内容, 需要可哈希
+        :param timeout: 超过该秒数未播报则丢弃
+        :param exclude: 队列已满时是否允许被丢弃
+        :param priority: 优先级, 数值越大越先播报
+        :return: 是否成功加入
+        """
+        now = time.time()
+        with self._cond:
+            self._evict(now)
+            if data in self._pending or data in self._played:
+                return False
+            entry = _Entry(data, now, timeout, exclude, priority, next(self._seq))
+            self._pending[data] = entry
+            heapq.heappush(self._ready, (-priority, entry.seq, entry))
+            heapq.heappush(self._expiry, (entry.expire_at, entry.seq, entry))
+            if exclude:
+                self._excludable.append(entry)
+            if len(self._pending) > self.max_count:
+                self._drop_oldest_excludable()
+            if entry.alive:
+                self._cond.notify()
+            return entry.alive
+
+    def _pop(self) -> _Entry | None:
+        now = time.time()
+        self._evict(now)
+        while self._ready:
+            entry = heapq.heappop(self._ready)[2]
+            if not entry.alive:
+                continue
+            self._remove(entry)
+            expire_at = now + self.played_timeout
+            self._played[entry.data] = expire_at
+            heapq.heappush(self._played_expiry, (expire_at, entry.seq, entry.data))
+            return entry
+        return None
 
     def put(self):
-        text = self.queue.pop(0)['data'] if len(self.queue) > 0 else None
-        self.cache.append({
-            'data': text,
-            'crt_time': time.time(),
-            'timeout': 15
-        })
-        print(self.cache, self.queue)
-        return text
+        """
+        取出下一条待播报内容, 队列为空时返回 None
+        :return:
+        """
+        with self._cond:
+            entry = self._pop()
+            return entry.data if entry else None
+
+    def get(self, timeout: float | None = None):
+        """
+        取出下一条待播报内容, 队列为空时阻塞等待
+        :param timeout: 最长等待秒数, None 表示一直等待
+        :return: 超时或被 interrupt 唤醒时返回 None
+        """
+        entry = self.get_entry(timeout)
+        return entry[0] if entry else None
+
+    def get_entry(self, timeout: float | None = None) -> tuple | None:
+        """
+        与 get 相同, 但同时返回过期时间
+        :param timeout:
+        :return: (data, expire_at) 或 None
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            interrupts = self._interrupts
+            while True:
+                entry = self._pop()
+                if entry is not None:
+                    return entry.data, entry.expire_at
+                if self._interrupts != interrupts:
+                    return None
+                if deadline is None:
+                    self._cond.wait()
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def interrupt(self):
+        """
+        唤醒所有阻塞在 get 上的消费者
+        :return:
+        """
+        with self._cond:
+            self._interrupts += 1
+            self._cond.notify_all()
 
     def __len__(self):
-        return len(self.queue)
+        with self._cond:
+            self._evict(time.time())
+            return len(self._pending)
 
     def __str__(self):
-        return pprint.pformat(self.queue)
+        with self._cond:
+            entries = sorted((item for item in self._ready if item[2].alive), key=lambda item: item[:2])
+            return pprint.pformat([item[2].to_dict() for item in entries])
@@ -0,0 +1,110 @@
+import logging
+import threading
+import time
+from http.cookiejar import DefaultCookiePolicy
+
+import httpx
+
+from .metrics import Counters, LatencyStat
+
+logger = logging.getLogger(__name__)
+
+
+class HttpPool:
+    """
+    全局共享的 HTTP 客户端
+
+    保持长连接并在请求间复用, 支持 HTTP/2, 同时限制每个主机的并发连接数。
+    """
+
+    def __init__(self, max_connections: int = 32, max_per_host: int = 8, timeout: float = 10.0,
+                 keepalive_expiry: float = 30.0, http2: bool = True):
+        self.max_per_host = max_per_host
+        self._client = httpx.Client(
+            http2=http2,
+            timeout=httpx.Timeout(timeout),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            follow_redirects=True,
+        )
+        # 各个直播间的 cookie 不能互相污染, 客户端本身不保存任何 cookie
+        self._client.cookies.jar.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        self._hosts: dict[str, threading.BoundedSemaphore] = {}
+        self._hosts_lock = threading.Lock()
+        self.counters = Counters()
+        # 等待连接的时间 (每主机并发限制 + 连接池)
+        self.wait = LatencyStat()
+        # 新建连接 (TCP + TLS) 耗时
+        self.connect = LatencyStat()
+
+    def _host_semaphore(self, host: str) -> threading.BoundedSemaphore:
+        with self._hosts_lock:
+            sem = self._hosts.get(host)
+            if sem is None:
+                sem = self._hosts[host] = threading.BoundedSemaphore(self.max_per_host)
+            return sem
+
+    def request(self, method: str, url, **kwargs) -> httpx.Response:
+        host = httpx.URL(url).host
+        state = {'connect_start': None, 'connect_end': None, 'sent': None}
+
+        def trace(event_name, info):
+            if event_name == 'connection.connect_tcp.started':
+                state['connect_start'] = time.perf_counter()
+            elif event_name in ('connection.connect_tcp.complete', 'connection.start_tls.complete'):
+                state['connect_end'] = time.perf_counter()
+            elif event_name.endswith('send_request_headers.started') and state['sent'] is None:
+                state['sent'] = time.perf_counter()
+
+        extensions = dict(kwargs.pop('extensions', None) or {})
+        extensions['trace'] = trace
+        start = time.perf_counter()
+        with self._host_semaphore(host):
+            try:
+                response = self._client.request(method, url, extensions=extensions, **kwargs)
+            except Exception:
+                self.counters.incr('errors')
+                raise
+        self.counters.incr('requests')
+        if state['connect_start'] is not None:
+            self.counters.incr('new_connections')
+            connect_time = (state['connect_end'] or state['sent'] or time.perf_counter()) - state['connect_start']
+            self.connect.observe(connect_time)
+            wait_time = state['connect_start'] - start
+        else:
+            self.counters.incr('pool_hits')
+            wait_time = (state['sent'] or start) - start
+        self.wait.observe(max(wait_time, 0.0))
+        return response
+
+    def get(self, url, **kwargs) -> httpx.Response:
+        return self.request('GET', url, **kwargs)
+
+    def stats(self) -> dict:
+        return {
+            **self.counters.to_dict(),
+            'wait': self.wait.to_dict(),
+            'connect': self.connect.to_dict(),
+        }
+
+    def close(self):
+        self._client.close()
+
+
+_pool: HttpPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> HttpPool:
+    """
+    获取进程内共享的 HTTP 连接池
+    :return:
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = HttpPool()
+        return _pool
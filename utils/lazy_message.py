@@ -0,0 +1,97 @@
+import base64
+from collections.abc import Mapping
+
+from google.protobuf import json_format
+from google.protobuf.descriptor import FieldDescriptor
+
+# MessageToDict 会把 64 位整数转成字符串, 这里保持一致
+_INT64_TYPES = {
+    FieldDescriptor.TYPE_INT64,
+    FieldDescriptor.TYPE_UINT64,
+    FieldDescriptor.TYPE_FIXED64,
+    FieldDescriptor.TYPE_SFIXED64,
+    FieldDescriptor.TYPE_SINT64,
+}
+
+
+def _is_set(message, field: FieldDescriptor) -> bool:
+    value = getattr(message, field.name)
+    if field.label == FieldDescriptor.LABEL_REPEATED:
+        return len(value) > 0
+    if field.type == FieldDescriptor.TYPE_MESSAGE:
+        return message.HasField(field.name)
+    return value != field.default_value
+
+
+def _convert_scalar(field: FieldDescriptor, value):
+    if field.type in _INT64_TYPES:
+        return str(value)
+    if field.type == FieldDescriptor.TYPE_ENUM:
+        enum_value = field.enum_type.values_by_number.get(value)
+        return enum_value.name if enum_value else value
+    if field.type == FieldDescriptor.TYPE_BYTES:
+        return base64.b64encode(value).decode('utf-8')
+    return value
+
+
+def _convert(field: FieldDescriptor, value):
+    if field.message_type is not None and field.message_type.GetOptions().map_entry:
+        value_field = field.message_type.fields_by_name['value']
+        return {
+            str(k): LazyMessage(v) if value_field.type == FieldDescriptor.TYPE_MESSAGE else _convert_scalar(value_field, v)
+            for k, v in value.items()
+        }
+    if field.label == FieldDescriptor.LABEL_REPEATED:
+        if field.type == FieldDescriptor.TYPE_MESSAGE:
+            return [LazyMessage(i) for i in value]
+        return [_convert_scalar(field, i) for i in value]
+    if field.type == FieldDescriptor.TYPE_MESSAGE:
+        return LazyMessage(value)
+    return _convert_scalar(field, value)
+
+
+class LazyMessage(Mapping):
+    """
+    protobuf 消息的只读字典视图
+
+    与 json_format.MessageToDict(preserving_proto_field_name=True) 的结果保持一致,
+    但只有被访问到的字段才会转换, 未访问的字段不产生任何开销。
+    """
+    __slots__ = ('_message', '_cache')
+
+    def __init__(self, message):
+        self._message = message
+        self._cache = {}
+
+    @property
+    def message(self):
+        # 原始 protobuf 消息, 需要强类型读取时直接使用
+        return self._message
+
+    def __getitem__(self, key):
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+        field = self._message.DESCRIPTOR.fields_by_name.get(key)
+        if field is None or not _is_set(self._message, field):
+            raise KeyError(key)
+        value = _convert(field, getattr(self._message, key))
+        self._cache[key] = value
+        return value
+
+    def __iter__(self):
+        return (field.name for field, _ in self._message.ListFields())
+
+    def __len__(self):
+        return len(self._message.ListFields())
+
+    def __repr__(self):
+        return 'LazyMessage({})'.format(self.to_dict())
+
+    def to_dict(self) -> dict:
+        """
+        完整转换为普通字典
+        :return:
+        """
+        return json_format.MessageToDict(self._message, preserving_proto_field_name=True)
@@ -0,0 +1,237 @@
+import asyncio
+import logging
+import time
+from typing import Union
+
+from websockets.asyncio.client import connect, ClientConnection
+
+from .dispatch_queue import DispatchQueue
+from .event_log import EventLogWriter
+from .live_ws import CallBackMap, DWS, LiveData
+from .message_policy import MessagePolicy
+from .replay import FrameRecorder
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncDWS(DWS):
+    """
+    基于 asyncio 的直播间连接
+
+    解析和回调逻辑与 DWS 完全相同, 区别在于收发、心跳和重连都在事件循环上完成,
+    不再为每个直播间占用接收线程和心跳线程。
+    """
+
+    def __init__(self, room_id, callback_map: CallBackMap, live_data: LiveData,
+                 wss_url: Union[str, None] = None, headers: Union[dict, None] = None,
+                 event_log: Union[EventLogWriter, None] = None,
+                 frame_recorder: Union[FrameRecorder, None] = None,
+                 dispatch_queue: Union[DispatchQueue, None] = None,
+                 message_policy: Union[MessagePolicy, None] = None):
+        super().__init__(room_id, callback_map, live_data, event_log, frame_recorder, dispatch_queue,
+                         message_policy)
+        # 指定 wss_url 时跳过直播间解析和签名, 用于本地压测
+        self.wss_url = wss_url
+        self.headers = headers or {}
+        self._closed = False
+        # close 时置位, 打断重连前的等待; 在 run 中创建, 绑定到当前事件循环
+        self._closed_event: Union[asyncio.Event, None] = None
+        self._outbox: Union[asyncio.Queue, None] = None
+        self._loop: Union[asyncio.AbstractEventLoop, None] = None
+
+    def send_ack(self, ws, log_id, internal):
+        self._outbox.put_nowait(self.build_ack(log_id, internal))
+
+    async def _writer(self, ws: ClientConnection):
+        while True:
+            data = await self._outbox.get()
+            await ws.send(data)
+
+    async def _heartbeat(self, ws: ClientConnection):
+        while True:
+            self._outbox.put_nowait(self.build_heartbeat())
+            logger.debug("[💗心跳] ====> 房间🏖标题【{}】".format(self.live_room_title))
+            await asyncio.sleep(self.heartbeat_interval)
+            if time.time() - self.last_msg_time > self.idle_timeout:
+                logger.warning('[{}] {}秒未收到消息, 重新连接'.format(self.live_room_id, self.idle_timeout))
+                await ws.close()
+                return
+
+    async def _connect_params(self) -> tuple[str, dict]:
+        if self.wss_url:
+            return self.wss_url, self.headers
+        # 页面请求和签名都是阻塞调用, 放到线程池执行
+        return await asyncio.get_running_loop().run_in_executor(None, self.connect_params)
+
+    async def _serve(self, ws: ClientConnection):
+        self._outbox = asyncio.Queue()
+        self.last_msg_time = time.time()
+        self.ws_open(ws)
+        tasks = [
+            asyncio.create_task(self._writer(ws)),
+            asyncio.create_task(self._heartbeat(ws)),
+        ]
+        try:
+            async for message in ws:
+                if isinstance(message, bytes):
+                    self.message_dispatch(ws, message)
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.ws_close(ws, None, None)
+
+    def ws_open(self, ws):
+        self._connected()
+        self.start_time = time.time()
+        logger.info("[webSocket Open事件] 房间 {}".format(self.live_room_id))
+
+    async def run(self):
+        """
+        保持连接直到 close, 断线后自动重连
+        :return:
+        """
+        self._loop = asyncio.get_running_loop()
+        self._closed_event = asyncio.Event()
+        while not self._closed:
+            error = None
+            self._ws_breaker = None
+            try:
+                wss_url, headers = await self._connect_params()
+                self._connecting(wss_url)
+                headers = dict(headers)
+                user_agent = headers.pop('user-agent', self.USER_AGENT)
+                async with connect(wss_url, additional_headers=headers, user_agent_header=user_agent,
+                                   max_size=None, ping_interval=None) as ws:
+                    self.ws = ws
+                    await self._serve(ws)
+            except asyncio.CancelledError:
+                raise
+            except ConnectionError as e:
+                # 直播间已关闭、熔断等情况
+                error = e
+                logger.error('[{}] 连接失败: {}'.format(self.live_room_id, e))
+            except Exception as e:
+                error = e
+                self.ws_error(self.ws, e)
+            finally:
+                self.ws = None
+            if not self._closed:
+                try:
+                    await asyncio.wait_for(self._closed_event.wait(), self.reconnect_wait(error))
+                except asyncio.TimeoutError:
+                    pass
+
+    def start(self):
+        asyncio.run(self.run())
+
+    async def aclose(self):
+        self._closed = True
+        if self._closed_event is not None:
+            self._closed_event.set()
+        if self.message_policy is not None:
+            self.message_policy.close(self)
+        if self.ws is not None:
+            await self.ws.close()
+        if self._own_queue:
+            self.dispatch_queue.close()
+        else:
+            # 共享的处理队列不再保留该连接的消息和 key
+            self.dispatch_queue.discard(self)
+
+    def _close_ws(self):
+        # 可以从其他线程调用
+        if self._loop is not None and self.ws is not None:
+            ws = self.ws
+            self._loop.call_soon_threadsafe(lambda: asyncio.ensure_future(ws.close()))
+
+    def close(self):
+        self._closed = True
+        if self._loop is not None and self._closed_event is not None:
+            self._loop.call_soon_threadsafe(self._closed_event.set)
+        if self.message_policy is not None:
+            self.message_policy.close(self)
+        self._close_ws()
+        if self._own_queue:
+            self.dispatch_queue.close()
+        else:
+            # 共享的处理队列不再保留该连接的消息和 key
+            self.dispatch_queue.discard(self)
+
+    def restart(self):
+        self._close_ws()
+
+
+class LiveManager:
+    """
+    在一个事件循环上管理多个直播间连接
+
+    每个直播间仍然拥有独立的 CallBackMap 和 LiveData。
+    """
+
+    def __init__(self, workers: int = 4, queue_size: int = 20000):
+        self.rooms: dict[str, AsyncDWS] = {}
+        # 所有直播间共用一组处理线程, 事件循环只负责收发
+        self.dispatch_queue = DispatchQueue(max_size=queue_size, workers=workers, name='live-manager')
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._loop: Union[asyncio.AbstractEventLoop, None] = None
+        self._stopped: Union[asyncio.Event, None] = None
+
+    def add_room(self, room_id, callback_map: Union[CallBackMap, None] = None,
+                 live_data: Union[LiveData, None] = None, **kwargs) -> AsyncDWS:
+        room_id = str(room_id)
+        if room_id in self.rooms:
+            return self.rooms[room_id]
+        kwargs.setdefault('dispatch_queue', self.dispatch_queue)
+        dws = AsyncDWS(room_id, callback_map or CallBackMap(), live_data or LiveData(), **kwargs)
+        self.rooms[room_id] = dws
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._spawn, room_id)
+        return dws
+
+    def remove_room(self, room_id):
+        room_id = str(room_id)
+        dws = self.rooms.pop(room_id, None)
+        if dws is None:
+            return
+        dws.close()
+        task = self._tasks.pop(room_id, None)
+        if task is not None and self._loop is not None:
+            self._loop.call_soon_threadsafe(task.cancel)
+
+    def _spawn(self, room_id):
+        if room_id in self.rooms and room_id not in self._tasks:
+            self._tasks[room_id] = asyncio.create_task(self.rooms[room_id].run(), name='room-{}'.format(room_id))
+
+    async def run(self):
+        """
+        运行全部直播间, 直到 stop 被调用
+        :return:
+        """
+        self._loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        # 上一次 run 结束时关闭了处理队列, 重新打开
+        self.dispatch_queue.start()
+        for room_id in list(self.rooms):
+            self._spawn(room_id)
+        try:
+            await self._stopped.wait()
+        finally:
+            await self.close()
+            self._loop = None
+
+    def stop(self):
+        # 可以从其他线程调用
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stopped.set)
+
+    async def close(self):
+        for dws in self.rooms.values():
+            await dws.aclose()
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._tasks.clear()
+        self.dispatch_queue.close()
+
+    def run_forever(self):
+        asyncio.run(self.run())
@@ -0,0 +1,141 @@
+import json
+import threading
+import time
+from dataclasses import dataclass, replace
+from typing import Callable, Union
+
+from .scheduler import TimerHandle, get_scheduler
+
+
+@dataclass(frozen=True)
+class LiveSnapshot:
+    """
+    某一时刻的直播间数据, 发布后不再修改, 读取时不需要加锁或拷贝
+    """
+    version: int = 0
+    live_title: str = '直播间标题'
+    create_time: int = 0
+    # 直播间在线人数
+    user_count: int = 0
+    # 直播间累计人数
+    total_user_count: int = 0
+    # 直播间当前点赞数
+    like_count: int = 0
+    # 弹幕消息数
+    message_count: int = 0
+    # 排名 ({id, username, rank, avatar}, ...), 只读
+    ranking: tuple = ()
+    # 总榜
+    score: int = 0
+
+    def __str__(self):
+        return '在线人数: {} | 点赞数: {} | 消息数: {} | 总榜: {} | 排名: {}'.format(
+            self.user_count, self.like_count, self.message_count, self.score,
+            ', '.join([i['username'] for i in self.ranking])
+        )
+
+    def to_json(self, ranking: bool = True):
+        """
+        :param ranking: 为 False 时不输出排行榜
+        :return:
+        """
+        obj = {
+            'live_title': self.live_title,
+            'time': int(time.time()),
+            'create_time': self.create_time,
+            'user_count': self.user_count,
+            'total_user_count': self.total_user_count,
+            'like_count': self.like_count,
+            'message_count': self.message_count,
+            'score': self.score,
+        }
+        if ranking:
+            obj['ranking'] = list(self.ranking)
+        return json.dumps(obj, ensure_ascii=False)
+
+
+class LiveData:
+    """
+    直播间数据
+
+    写入方通过 update / incr 修改暂存的字段, 最多每 publish_interval 秒发布一次新的
+    LiveSnapshot; 读取方通过 snapshot() 拿到完整一致的快照, version 没变时可以跳过处理。
+    """
+
+    def __init__(self, publish_interval: float = 0.2):
+        self.publish_interval = publish_interval
+        self._lock = threading.Lock()
+        self._snapshot = LiveSnapshot()
+        self._staging = {}
+        self._last_publish = 0.0
+        self._timer: Union[TimerHandle, None] = None
+
+    def snapshot(self) -> LiveSnapshot:
+        return self._snapshot
+
+    @property
+    def version(self) -> int:
+        return self._snapshot.version
+
+    def update(self, **fields):
+        """
+        修改字段, 按发布频率合并后生效
+        :param fields: LiveSnapshot 中的字段
+        :return:
+        """
+        if 'ranking' in fields:
+            fields['ranking'] = tuple(fields['ranking'])
+        with self._lock:
+            self._staging.update(fields)
+            self._schedule()
+
+    def incr(self, field: str, value: int = 1):
+        with self._lock:
+            current = self._staging.get(field, getattr(self._snapshot, field))
+            self._staging[field] = current + value
+            self._schedule()
+
+    def _schedule(self):
+        # 调用前需持有 _lock
+        delay = self._last_publish + self.publish_interval - time.monotonic()
+        if delay <= 0:
+            self._publish()
+        elif self._timer is None:
+            self._timer = get_scheduler().call_later(delay, self.flush)
+
+    def _publish(self):
+        if self._staging:
+            self._snapshot = replace(self._snapshot, version=self._snapshot.version + 1, **self._staging)
+            self._staging = {}
+        self._last_publish = time.monotonic()
+
+    def flush(self):
+        """
+        立即发布暂存的修改
+        :return:
+        """
+        with self._lock:
+            self._timer = None
+            self._publish()
+
+    def __str__(self):
+        return str(self._snapshot)
+
+    def to_json(self):
+        return self._snapshot.to_json()
+
+
+class CallBackMap:
+    def __init__(self,
+                 follow: Union[Callable, None] = None,
+                 userMsg: Union[Callable, None] = None,
+                 giftNews: Union[Callable, None] = None,
+                 enterRoom: Union[Callable, None] = None):
+        # 关注回调
+        self.follow: Union[Callable, None] = follow
+        # 用户消息回调
+        self.userMsg: Union[Callable, None] = userMsg
+        # 礼物回调
+        self.giftNews: Union[Callable, None] = giftNews
+        # 进入直播间回调
+        self.enterRoom: Union[Callable, None] = enterRoom
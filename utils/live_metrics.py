@@ -0,0 +1,249 @@
+import json
+import os
+import struct
+import threading
+import zlib
+from array import array
+from pathlib import Path
+from typing import Union
+
+# 记录的 LiveSnapshot 字段
+FIELDS = ('user_count', 'total_user_count', 'like_count', 'message_count', 'score')
+# (分辨率秒数, 保留的桶数): 1 秒保留 1 小时, 10 秒保留 1 天, 1 分钟保留 7 天
+DEFAULT_RESOLUTIONS = ((1, 3600), (10, 8640), (60, 10080))
+
+_MAGIC = b'DYLM'
+_HEADER = struct.Struct('<4sI')
+_AGGREGATES = ('min', 'max', 'first', 'last')
+
+
+class _Ring:
+    """
+    单一分辨率的环形缓冲, 桶号对容量取模直接定位, 更新为 O(1)
+    """
+
+    def __init__(self, resolution: int, capacity: int, fields: tuple):
+        self.resolution = resolution
+        self.capacity = capacity
+        self.fields = fields
+        # 每个槽位当前保存的桶号, -1 表示空
+        self.buckets = array('q', [-1]) * capacity
+        self.columns = {
+            (field, agg): array('d', [0.0]) * capacity
+            for field in fields for agg in _AGGREGATES
+        }
+
+    def add(self, ts: float, values: dict):
+        bucket = int(ts // self.resolution)
+        slot = bucket % self.capacity
+        fresh = self.buckets[slot] != bucket
+        if fresh:
+            self.buckets[slot] = bucket
+        columns = self.columns
+        for field in self.fields:
+            value = values[field]
+            if fresh:
+                columns[field, 'min'][slot] = value
+                columns[field, 'max'][slot] = value
+                columns[field, 'first'][slot] = value
+            else:
+                if value < columns[field, 'min'][slot]:
+                    columns[field, 'min'][slot] = value
+                if value > columns[field, 'max'][slot]:
+                    columns[field, 'max'][slot] = value
+            columns[field, 'last'][slot] = value
+
+    def oldest_bucket(self, newest: int) -> int:
+        return newest - self.capacity + 1
+
+    def query(self, field: str, start: float, end: float) -> list[dict]:
+        first = int(start // self.resolution)
+        last = int(end // self.resolution)
+        first = max(first, last - self.capacity + 1)
+        mins, maxs = self.columns[field, 'min'], self.columns[field, 'max']
+        firsts, lasts = self.columns[field, 'first'], self.columns[field, 'last']
+        points = []
+        prev_bucket, prev_last = None, None
+        for bucket in range(first, last + 1):
+            slot = bucket % self.capacity
+            if self.buckets[slot] != bucket:
+                continue
+            # 与上一个桶相邻时用两桶的 last 求速率, 否则只能用桶内的变化
+            if prev_bucket == bucket - 1:
+                delta = lasts[slot] - prev_last
+            else:
+                delta = lasts[slot] - firsts[slot]
+            points.append({
+                'ts': bucket * self.resolution,
+                'min': mins[slot],
+                'max': maxs[slot],
+                'last': lasts[slot],
+                'rate': delta / self.resolution,
+            })
+            prev_bucket, prev_last = bucket, lasts[slot]
+        return points
+
+    def copy(self) -> '_Ring':
+        # 整块复制 array, 持锁时间很短
+        ring = _Ring.__new__(_Ring)
+        ring.resolution, ring.capacity, ring.fields = self.resolution, self.capacity, self.fields
+        ring.buckets = self.buckets[:]
+        ring.columns = {key: column[:] for key, column in self.columns.items()}
+        return ring
+
+    def dump(self) -> tuple[dict, list[bytes]]:
+        # 只保存有数据的槽位, 按时间排序后逐列输出
+        slots = sorted((b, i) for i, b in enumerate(self.buckets) if b >= 0)
+        order = [i for _, i in slots]
+        columns = [array('q', [b for b, _ in slots]).tobytes()]
+        for field in self.fields:
+            for agg in _AGGREGATES:
+                column = self.columns[field, agg]
+                columns.append(array('d', [column[i] for i in order]).tobytes())
+        meta = {'resolution': self.resolution, 'capacity': self.capacity, 'count': len(order)}
+        return meta, columns
+
+    def restore(self, count: int, columns: list[bytes]):
+        buckets = array('q')
+        buckets.frombytes(columns[0])
+        values = []
+        for data in columns[1:]:
+            column = array('d')
+            column.frombytes(data)
+            values.append(column)
+        for n in range(count):
+            bucket = buckets[n]
+            slot = bucket % self.capacity
+            # 容量变小时, 同一槽位保留较新的桶
+            if self.buckets[slot] > bucket:
+                continue
+            self.buckets[slot] = bucket
+            index = 0
+            for field in self.fields:
+                for agg in _AGGREGATES:
+                    self.columns[field, agg][slot] = values[index][n]
+                    index += 1
+
+
+class LiveMetrics:
+    """
+    直播间指标的多分辨率时间序列
+
+    每个分辨率一个定长环形缓冲, 每个桶记录 min / max / last, 查询时按相邻桶计算速率。
+    数据保存在 array 中, 持久化时按列压缩写入一个文件。
+    """
+
+    def __init__(self, resolutions: tuple = DEFAULT_RESOLUTIONS, fields: tuple = FIELDS):
+        self.fields = tuple(fields)
+        self._rings = [_Ring(resolution, capacity, self.fields) for resolution, capacity in resolutions]
+        self._lock = threading.Lock()
+        # 定时保存与退出时保存可能同时发生
+        self._save_lock = threading.Lock()
+        self.last_ts = None
+
+    @property
+    def resolutions(self) -> list[int]:
+        return [ring.resolution for ring in self._rings]
+
+    def record(self, ts: float, snapshot):
+        """
+        记录一次采样
+        :param ts: 时间戳
+        :param snapshot: LiveSnapshot 或包含 fields 的字典
+        :return:
+        """
+        if isinstance(snapshot, dict):
+            values = {field: float(snapshot[field]) for field in self.fields}
+        else:
+            values = {field: float(getattr(snapshot, field)) for field in self.fields}
+        with self._lock:
+            for ring in self._rings:
+                ring.add(ts, values)
+            self.last_ts = ts
+
+    def _pick(self, start: float, end: float, resolution: Union[int, None]) -> _Ring:
+        if resolution is not None:
+            for ring in self._rings:
+                if ring.resolution == resolution:
+                    return ring
+            raise ValueError('unknown resolution {}'.format(resolution))
+        # 取能覆盖整个时间范围的最细分辨率
+        for ring in self._rings:
+            if start // ring.resolution >= ring.oldest_bucket(int(end // ring.resolution)):
+                return ring
+        return self._rings[-1]
+
+    def query(self, field: str, start: float, end: float, resolution: Union[int, None] = None) -> list[dict]:
+        """
+        查询时间范围内的聚合数据
+        :param field: FIELDS 中的字段
+        :param start: 起始时间戳
+        :param end: 结束时间戳 (包含)
+        :param resolution: 指定分辨率, 为 None 时自动选择
+        :return: [{ts, min, max, last, rate}]
+        """
+        if field not in self.fields:
+            raise KeyError(field)
+        with self._lock:
+            return self._pick(start, end, resolution).query(field, start, end)
+
+    def save(self, path: Union[Path, str]):
+        """
+        按列压缩保存, 先写临时文件再替换
+        :param path:
+        :return:
+        """
+        with self._lock:
+            rings = [ring.copy() for ring in self._rings]
+        dumps = [ring.dump() for ring in rings]
+        header = {'fields': list(self.fields), 'aggregates': list(_AGGREGATES), 'rings': []}
+        blobs = []
+        for meta, columns in dumps:
+            compressed = [zlib.compress(column) for column in columns]
+            meta['columns'] = [len(column) for column in compressed]
+            header['rings'].append(meta)
+            blobs.extend(compressed)
+        header_bytes = json.dumps(header).encode('utf-8')
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + '.tmp')
+        with self._save_lock:
+            with open(tmp, 'wb') as f:
+                f.write(_HEADER.pack(_MAGIC, len(header_bytes)))
+                f.write(header_bytes)
+                for blob in blobs:
+                    f.write(blob)
+            os.replace(tmp, path)
+
+    def load(self, path: Union[Path, str]):
+        """
+        读取 save 保存的数据, 与当前配置相同分辨率的部分会被恢复
+        :param path:
+        :return:
+        """
+        data = Path(path).read_bytes()
+        magic, header_len = _HEADER.unpack_from(data)
+        if magic != _MAGIC:
+            raise ValueError('not a metrics file: {}'.format(path))
+        offset = _HEADER.size
+        header = json.loads(data[offset:offset + header_len])
+        offset += header_len
+        if header['fields'] != list(self.fields) or header['aggregates'] != list(_AGGREGATES):
+            raise ValueError('metrics file layout mismatch: {}'.format(path))
+        rings = {ring.resolution: ring for ring in self._rings}
+        with self._lock:
+            for meta in header['rings']:
+                columns = []
+                for size in meta['columns']:
+                    columns.append(zlib.decompress(data[offset:offset + size]))
+                    offset += size
+                ring = rings.get(meta['resolution'])
+                if ring is not None:
+                    ring.restore(meta['count'], columns)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                ring.resolution: sum(1 for bucket in ring.buckets if bucket >= 0)
+                for ring in self._rings
+            }
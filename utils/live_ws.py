@@ -1,20 +1,18 @@
 import gzip
 import hashlib
-import json
 import logging
 import random
-import re
+import socket
 import threading
 import time
-from pathlib import Path
+import zlib
 from typing import Union, Callable
 from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
 
 import httpx
-import jsengine
 import websocket
-from google.protobuf import json_format
 
+from .dispatch_queue import DispatchQueue
 from .dy_pb2 import ChatMessage
 from .dy_pb2 import GiftMessage
 from .dy_pb2 import LikeMessage
@@ -24,76 +22,113 @@ from .dy_pb2 import Response
 from .dy_pb2 import RoomUserSeqMessage
 from .dy_pb2 import SocialMessage
 from .dy_pb2 import UpdateFanTicketMessage
+from .event_log import EventLogWriter
+from .http_pool import get_pool
+from .lazy_message import LazyMessage
+# LiveData 等移到了不依赖网络和 protobuf 的 live_data 模块, 这里保留原来的导入路径
+from .live_data import CallBackMap, LiveData, LiveSnapshot
+from .message_policy import MessagePolicy
+from .metrics import Counters
+from .replay import FrameRecorder
+from .retry import Backoff, CircuitBreaker, CircuitOpenError, RetryPolicy, TTLCache, get_breaker
+from .room_page import extract_room_info
+from .router import MethodRouter, Subscription
+from .scheduler import Scheduler, TimerHandle, get_scheduler
+from .signer import get_signer
 
 logger = logging.getLogger(__name__)
 
+# 直播间地址 -> (live_room_id, ttwid, 标题), 重连时跳过页面请求
+room_cache = TTLCache()
 
-class LiveData:
-    def __init__(self):
-        self.live_title = '直播间标题'
-        self.create_time = 0
-        # 直播间在线人数
-        self.user_count = 0
-        # 直播间累计人数
-        self.total_user_count = 0
-        # 直播间当前点赞数
-        self.like_count = 0
-        # 弹幕消息数
-        self.message_count = 0
-        # 排名 {id, username, rank, avatar}[]
-        self.ranking = []
-        # 总榜
-        self.score = 0
-
-    def __str__(self):
-        return '在线人数: {} | 点赞数: {} | 消息数: {} | 总榜: {} | 排名: {}'.format(
-            self.user_count, self.like_count, self.message_count, self.score,
-            ', '.join([i['username'] for i in self.ranking])
-        )
 
-    def to_json(self):
-        obj = {
-            'live_title': self.live_title,
-            'time': int(time.time()),
-            'create_time': self.create_time,
-            'user_count': self.user_count,
-            'total_user_count': self.total_user_count,
-            'like_count': self.like_count,
-            'message_count': self.message_count,
-            'score': self.score,
-            'ranking': self.ranking,
-        }
-        # print(obj)
-        return json.dumps(obj, ensure_ascii=False)
-
-
-class CallBackMap:
-    def __init__(self,
-                 follow: Union[Callable, None] = None,
-                 userMsg: Union[Callable, None] = None,
-                 giftNews: Union[Callable, None] = None,
-                 enterRoom: Union[Callable, None] = None):
-        # 关注回调
-        self.follow: Union[Callable, None] = follow
-        # 用户消息回调
-        self.userMsg: Union[Callable, None] = userMsg
-        # 礼物回调
-        self.giftNews: Union[Callable, None] = giftNews
-        # 进入直播间回调
-        self.enterRoom: Union[Callable, None] = enterRoom
+def inflate(payload: bytes) -> bytes:
+    """
+    解压 gzip 负载
+
+    gzip.decompress 会先切片去掉头部, 再把结果拼接一次。这里直接交给 zlib 解析 gzip 头,
+    并按尾部记录的原始长度一次分配输出缓冲, 单个成员时没有额外拷贝。
+    :param payload:
+    :return:
+    """
+    # gzip 尾部 4 字节为原始长度 (mod 2^32)
+    size = int.from_bytes(payload[-4:], 'little') if len(payload) >= 18 else 0
+    decompressor = zlib.decompressobj(31)
+    data = decompressor.decompress(payload, size)
+    if decompressor.eof and not decompressor.unused_data:
+        return data
+    # 多个 gzip 成员拼接或长度不符, 实际很少出现
+    return gzip.decompress(payload)
 
 
 class DWS:
-    def __init__(self, room_id, callback_map: CallBackMap, live_data: LiveData):
+    # 心跳间隔
+    heartbeat_interval = 10
+    # 超过该时长没有收到消息则重连
+    idle_timeout = 60
+    # 重连等待时间的基数, 连续失败时按指数增长并加随机抖动
+    reconnect_delay = 5
+    # 重连等待时间上限
+    reconnect_max_delay = 120
+    # 直播间解析结果的缓存时间
+    room_cache_ttl = 600
+
+    def __init__(self, room_id, callback_map: CallBackMap, live_data: LiveData,
+                 event_log: Union[EventLogWriter, None] = None,
+                 frame_recorder: Union[FrameRecorder, None] = None,
+                 dispatch_queue: Union[DispatchQueue, None] = None,
+                 message_policy: Union[MessagePolicy, None] = None,
+                 scheduler: Union[Scheduler, None] = None):
         self.last_msg_time = time.time()
+        # 原始消息落盘, 为 None 时不记录
+        self.event_log = event_log
+        # 录制原始帧, 用于离线回放
+        self.frame_recorder = frame_recorder
+        # 接收线程只解析外层帧和发送 ACK, 消息解析和回调交给处理队列
+        self._own_queue = dispatch_queue is None
+        if dispatch_queue is None:
+            dispatch_queue = DispatchQueue(name='dws-{}'.format(room_id))
+        self.dispatch_queue = dispatch_queue
+        # 按 method 跳过、采样或合并消息, 为 None 时全部处理
+        self.message_policy = message_policy
+        # 心跳和空闲检测由共享的时间轮触发, 不再为每个连接开线程
+        self.scheduler = get_scheduler() if scheduler is None else scheduler
+        self._timers: list[TimerHandle] = []
+        self._stopped = threading.Event()
+        # 重连定时器触发或 close 时置位
+        self._wakeup = threading.Event()
+        self.backoff = Backoff(base=self.reconnect_delay, cap=self.reconnect_max_delay)
+        # 连续连接失败次数, 连接成功后清零
+        self._failures = 0
+        self._opened = False
+        self._ws_breaker: Union[CircuitBreaker, None] = None
+        self.counters = Counters()
+        # 按 method 分发, 内置处理 (更新 LiveData、CallBackMap 回调) 也是订阅者
+        self.router = MethodRouter()
+        for method, handler in (
+                ('WebcastLikeMessage', self.giveALike),
+                ('WebcastMemberMessage', self.enterRoom),
+                ('WebcastGiftMessage', self.giftNews),
+                ('WebcastChatMessage', self.userMsg),
+                ('WebcastSocialMessage', self.follow),
+                ('WebcastRoomUserSeqMessage', self.ranking),
+                ('WebcastUpdateFanTicketMessage', self.overall_ranking),
+        ):
+            self.router.subscribe(method, handler)
         self.live_data = live_data
         self.live_room_url = f"https://live.douyin.com/{room_id}"
+        # 页面请求失败时退避重试, 并经过 live.douyin.com 的熔断器。只重试网络错误和服务端 5xx,
+        # 直播间已关闭、页面结构变化等重试也不会成功, 直接抛出且不计入熔断
+        self.page_policy = RetryPolicy(attempts=3, retry_on=(httpx.TransportError, httpx.HTTPStatusError),
+                                       host=urlparse(self.live_room_url).hostname)
         self.live_room_id = room_id
         self.live_room_title = ''
         self._ttwid = ''
         self.start_time = time.time()
         self.ws: websocket.WebSocketApp | None = None
         self.callbackMap: CallBackMap = callback_map
+        # 同一连接重连时沿用, 签名摘要不变, 可以命中签名缓存
+        self.user_unique_id = str(random.randint(7300000000000000000, 7999999999999999999))
         self.USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36 Edg/126.0.0.0'
         pass
 
@@ -108,61 +143,39 @@ class DWS:
             "upgrade-insecure-requests": "1",
             "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36 Edg/120.0.0.0",
         }
-        response = httpx.get(self.live_room_url, headers=headers)
+        response = get_pool().get(self.live_room_url, headers=headers)
+        if response.is_server_error:
+            # 5xx 抛出 HTTPStatusError, 交给 page_policy 重试
+            response.raise_for_status()
         self._ttwid = response.cookies.get("ttwid")
         if self._ttwid is None:
             raise Exception("cookies is Error")
-        res_text = response.text
-        res_room_info = re.search(
-            r'room\\":{.*\\"id_str\\":\\"(\d+)\\".*,\\"status\\":(\d+).*"title\\":\\"([^"]*)\\"',
-            res_text,
-        )
-        if res_room_info:
-            room_status = res_room_info.group(2)
-            room_title = res_room_info.group(3)
-            self.live_data.live_title = room_title
-            logger.info(f"房间标题: {room_title}")
-            self.live_room_title = room_title
-            if room_status == "4":
-                raise ConnectionError("房间已关闭")
-        res_room = re.search(r'roomId\\":\\"(\d+)\\"', res_text)
-        live_room_search = re.search(r'owner\\":(.*?),\\"room_auth', res_text)
-        live_room_res = live_room_search.group(1).replace('\\"', '"')
-        live_room_info = json.loads(live_room_res)
-        logger.info(f"主播账号信息: {live_room_info}")
-        live_room_id = res_room.group(1)
-        res_stream = re.search(r'hls_pull_url_map\\":(\{.*?})', res_text)
-        res_stream_m3u8s = json.loads(res_stream.group(1).replace('\\"', '"'))
-        res_m3u8_hd1 = res_stream_m3u8s.get("FULL_HD1", "").replace("http", "https")
-        if not res_m3u8_hd1:
-            res_m3u8_hd1 = res_m3u8_hd1.get("HD1", "").replace("http", "https")
-        logger.info(f"直播流m3u8链接地址是: {res_m3u8_hd1}")
-        res_flv_search = re.search(r'flv\\":\\"(.*?)\\"', res_text)
-        res_stream_flv = (
-            res_flv_search.group(1).replace('\\"', '"').replace("\\\\u0026", "&")
-        )
-        if "https" not in res_stream_flv:
-            res_stream_flv = res_stream_flv.replace("http", "https")
-        logger.info(f"直播流FLV地址是: {res_stream_flv}")
+        room_info = extract_room_info(response.text)
+        if room_info.title is not None:
+            self.live_data.update(live_title=room_info.title)
+            logger.info(f"房间标题: {room_info.title}")
+            self.live_room_title = room_info.title
+        logger.info(f"主播账号信息: {room_info.owner}")
+        logger.info(f"直播流m3u8链接地址是: {room_info.hls_url}")
+        logger.info(f"直播流FLV地址是: {room_info.flv_url}")
+        return room_info.live_room_id
+
+    def resolve_room(self) -> str:
+        """
+        解析直播间, 结果缓存 room_cache_ttl 秒, 重连时不必重新请求页面
+        :return: live_room_id
+        """
+        cached = room_cache.get(self.live_room_url)
+        if cached is not None:
+            self.live_room_id, self._ttwid, self.live_room_title = cached
+            return self.live_room_id
+        live_room_id = self.page_policy.call(self.parse_live_room)
+        room_cache.set(self.live_room_url, (live_room_id, self._ttwid, self.live_room_title), self.room_cache_ttl)
         return live_room_id
 
     def get_signature(self, x_ms_stub):
         try:
-            ctx = jsengine.jsengine()
-            js_dom = f"""
-    document = {{}}
-    window = {{}}
-    navigator = {{
-    'userAgent': '{self.USER_AGENT}'
-    }}
-    """.strip()
-            js_enc = Path(__file__).parent.parent.joinpath('static/webmssdk.js').read_text(encoding='utf-8')
-            final_js = js_dom + js_enc
-            ctx.eval(final_js)
-            function_caller = f"get_sign('{x_ms_stub}')"
-            signature = ctx.eval(function_caller)
-            # print("signature: ", signature)
-            return signature
+            return get_signer(self.USER_AGENT).sign(x_ms_stub)
         except:
             logger.exception("get_signature error")
         return "00000000"
@@ -187,12 +200,22 @@ class DWS:
         ))
         return new_url
 
-    def send_ack(self, ws, log_id, internal):
+    @staticmethod
+    def build_ack(log_id, internal) -> bytes:
         obj = PushFrame()
         obj.payloadType = "ack"
         obj.logId = log_id
         obj.payloadType = internal
-        data = obj.SerializeToString()
+        return obj.SerializeToString()
+
+    @staticmethod
+    def build_heartbeat() -> bytes:
+        obj = PushFrame()
+        obj.payloadType = "hb"
+        return obj.SerializeToString()
+
+    def send_ack(self, ws, log_id, internal):
+        data = self.build_ack(log_id, internal)
         ws.send(data, websocket.ABNF.OPCODE_BINARY)
         logger.debug(
             "[sendAck] [🌟发送Ack] [房间Id："
@@ -206,31 +229,69 @@ class DWS:
         logger.error(f"[websocket] 错误: {error}", exc_info=True)
 
     def ws_close(self, ws, a, b):
+        self._cancel_timers()
         total_time = time.time() - self.start_time
-        total_info = f"工具运行时长：{total_time}，点赞数量总计：{self.live_data.like_count}, 评论数量总计: {self.live_data.message_count}"
+        data = self.live_data.snapshot()
+        total_info = f"工具运行时长：{total_time}，点赞数量总计：{data.like_count}, 评论数量总计: {data.message_count}"
         logger.info(total_info)
         logger.info("[onClose] [webSocket Close事件]")
 
     def ping(self, ws):
-        while True:
-            obj = PushFrame()
-            obj.payloadType = "hb"
-            data = obj.SerializeToString()
-            ws.send(data, websocket.ABNF.OPCODE_BINARY)
-            logger.info("[💗心跳] ====> 房间🏖标题【{}】".format(self.live_room_title))
-            time.sleep(10)
-            if time.time() - self.last_msg_time > 60:
-                self.restart()
+        try:
+            ws.send(self.build_heartbeat(), websocket.ABNF.OPCODE_BINARY)
+        except Exception as e:
+            # 连接已断开, 由接收线程负责重连
+            logger.debug('心跳发送失败 {}'.format(e))
+            return
+        logger.debug("[💗心跳] ====> 房间🏖标题【{}】".format(self.live_room_title))
+
+    def watchdog(self, ws):
+        if time.time() - self.last_msg_time > self.idle_timeout:
+            logger.warning('[{}] {}秒未收到消息, 重新连接'.format(self.live_room_id, self.idle_timeout))
+            # 只关闭连接, start 中的循环负责重连
+            self._drop_ws(ws)
+
+    @staticmethod
+    def _drop_ws(ws: websocket.WebSocketApp):
+        # WebSocketApp.close 会在调用线程里读取最多 3 秒等待对方的关闭帧, 与接收线程抢数据。
+        # 这里只发送关闭帧并 shutdown, 由接收线程自己退出 run_forever
+        ws.keep_running = False
+        sock = ws.sock
+        if sock is None or sock.sock is None:
+            return
+        try:
+            sock.send_close()
+            sock.sock.shutdown(socket.SHUT_RDWR)
+        except (OSError, websocket.WebSocketException):
+            pass
+
+    def _cancel_timers(self):
+        timers, self._timers = self._timers, []
+        for timer in timers:
+            timer.cancel()
 
     def ws_open(self, ws):
+        if self._stopped.is_set():
+            # run_forever 启动前 close 已被调用
+            self._drop_ws(ws)
+            return
+        self._connected()
         self.start_time = time.time()
-        threading.Thread(target=self.ping, args=(ws,), daemon=True).start()
+        self.last_msg_time = time.time()
+        self._cancel_timers()
+        self._timers = [
+            self.scheduler.call_every(self.heartbeat_interval, self.ping, ws, delay=0),
+            self.scheduler.call_every(self.heartbeat_interval, self.watchdog, ws),
+        ]
         logger.info("[webSocket Open事件]")
 
-    def start(self):
-        websocket.enableTrace(False)
-        self.live_room_id = self.parse_live_room()
-        USER_UNIQUE_ID = str(random.randint(7300000000000000000, 7999999999999999999))
+    def connect_params(self) -> tuple[str, dict]:
+        """
+        解析直播间并签名, 得到 websocket 地址和请求头
+        :return: (wss_url, headers)
+        """
+        self.live_room_id = self.resolve_room()
+        USER_UNIQUE_ID = self.user_unique_id
         VERSION_CODE = 180800
         WEBCAST_SDK_VERSION = "1.0.14-beta.0"
         sig_params = {
@@ -268,161 +329,250 @@ class DWS:
             "cookie": f"ttwid={self._ttwid}",
             "user-agent": self.USER_AGENT,
         }
-        self.ws = websocket.WebSocketApp(
-            wss_url,
-            header=headers,
-            on_message=self.message_dispatch,
-            on_error=self.ws_error,
-            on_close=self.ws_close,
-            on_open=self.ws_open,
-        )
-        self.ws.run_forever()
+        return wss_url, headers
+
+    def _connecting(self, wss_url: str):
+        # 连接前检查 websocket 主机的熔断器, 打开时抛出 CircuitOpenError
+        self._opened = False
+        self._ws_breaker = get_breaker(urlparse(wss_url).hostname)
+        self._ws_breaker.check()
+
+    def _connected(self):
+        self._opened = True
+        self._failures = 0
+        if self._ws_breaker is not None:
+            self._ws_breaker.record_success()
+
+    def reconnect_wait(self, error: Union[Exception, None] = None) -> float:
+        """
+        根据本次连接的结果计算重连前的等待时间
+        :param error: 连接过程中的异常
+        :return: 秒
+        """
+        if self._opened:
+            # 正常断线, 在 [0, reconnect_delay) 内随机等待, 避免所有直播间同时重连
+            self._opened = False
+            return self.backoff.delay(0)
+        self._failures += 1
+        if isinstance(error, CircuitOpenError):
+            # 请求没有发出, 至少等到熔断器允许探测
+            return max(error.remaining, self.backoff.delay(self._failures))
+        if self._ws_breaker is not None:
+            self._ws_breaker.record_failure()
+        # 没连上时缓存的 room_id / ttwid 可能已失效, 下次重新解析页面
+        room_cache.invalidate(self.live_room_url)
+        return self.backoff.delay(self._failures)
+
+    def start(self):
+        """
+        保持连接直到 close, 断线后按退避时间重连。close 之后 (包括线程启动前就已 close) 直接返回
+        :return:
+        """
+        websocket.enableTrace(False)
+        while not self._stopped.is_set():
+            error = None
+            self._ws_breaker = None
+            try:
+                wss_url, headers = self.connect_params()
+                self._connecting(wss_url)
+                self.ws = websocket.WebSocketApp(
+                    wss_url,
+                    header=headers,
+                    on_message=self.message_dispatch,
+                    on_error=self.ws_error,
+                    on_close=self.ws_close,
+                    on_open=self.ws_open,
+                )
+                if self._stopped.is_set():
+                    break
+                self.ws.run_forever()
+            except Exception as e:
+                error = e
+                logger.error('[{}] 连接失败: {}'.format(self.live_room_id, e))
+            finally:
+                self._cancel_timers()
+            delay = self.reconnect_wait(error)
+            logger.info('[{}] {:.1f} 秒后重连'.format(self.live_room_id, delay))
+            self._wait_reconnect(delay)
+
+    def _wait_reconnect(self, delay: float):
+        # 重连定时器由共享时间轮持有, 接收线程只等它触发; close 时立即返回
+        self._wakeup.clear()
+        if self._stopped.is_set():
+            return
+        timer = self.scheduler.call_later(delay, self._wakeup.set)
+        try:
+            self._wakeup.wait()
+        finally:
+            timer.cancel()
 
     def close(self):
-        self.ws.close()
+        self._stopped.set()
+        self._wakeup.set()
+        self._cancel_timers()
+        if self.message_policy is not None:
+            self.message_policy.close(self)
+        if self.ws is not None:
+            self._drop_ws(self.ws)
+        if self._own_queue:
+            self.dispatch_queue.close()
+        else:
+            # 共享的处理队列不再保留该连接的消息和 key
+            self.dispatch_queue.discard(self)
+
+    def stats(self) -> dict:
+        stats = {'dispatch': self.dispatch_queue.stats(), 'router': self.router.stats(),
+                 'failures': self._failures, **self.counters.to_dict(),
+                 'room_cache': room_cache.counters.to_dict()}
+        if self.message_policy is not None:
+            stats['policy'] = self.message_policy.stats()
+        if self.event_log is not None:
+            stats['event_log'] = self.event_log.stats()
+        # 进程内共享, 多个直播间看到的是同一份
+        stats['signer'] = get_signer(self.USER_AGENT).stats()
+        if self._ws_breaker is not None:
+            stats['breaker'] = self._ws_breaker.stats()
+        return stats
+
+    def subscribe(self, method: str, callback: Callable, predicate: Union[Callable, None] = None) -> Subscription:
+        """
+        订阅任意已注册的 method, 如点赞、排名、粉丝团票数
+        :param method: 如 WebcastLikeMessage
+        :param callback: callback(message), message 为解析后的 protobuf 消息, 可用 LazyMessage 包装成字典
+        :param predicate: predicate(message) 为 False 时不调用 callback
+        :return:
+        """
+        return self.router.subscribe(method, callback, predicate)
 
-    def restart(self):
-        self.ws.close()
+    def drain(self, timeout: Union[float, None] = None) -> bool:
+        """
+        等待已收到的消息全部处理完
+        :param timeout:
+        :return:
+        """
+        return self.dispatch_queue.join(timeout)
 
-        self.start()
+    def restart(self):
+        # 关闭当前连接, 由 start 中的循环重连
+        if self.ws is not None:
+            self._drop_ws(self.ws)
 
     def message_dispatch(self, ws: websocket.WebSocketApp, message: bytes):
         self.last_msg_time = time.time()
+        if self.frame_recorder is not None:
+            self.frame_recorder.record(message, self.last_msg_time)
         ws_package = PushFrame()
         ws_package.ParseFromString(message)
-        log_id = ws_package.logId
-        decompressed = gzip.decompress(ws_package.payload)
+        payload_type = ws_package.payloadType
+        if payload_type and payload_type != 'msg':
+            # 心跳回复等非消息帧不需要解压
+            self.counters.incr('skipped_frames.{}'.format(payload_type))
+            return
         payload = Response()
-        payload.ParseFromString(decompressed)
+        payload.ParseFromString(inflate(ws_package.payload))
         if payload.needAck:
-            self.send_ack(ws, log_id, payload.internalExt)
+            self.send_ack(ws, ws_package.logId, payload.internalExt)
+        event_log = self.event_log
         for msg in payload.messagesList:
-            match msg.method:
-                case "WebcastLikeMessage":
-                    self.giveALike(msg.payload)
-                case "WebcastMemberMessage":
-                    self.enterRoom(msg.payload)
-                case "WebcastGiftMessage":
-                    self.giftNews(msg.payload)
-                case "WebcastChatMessage":
-                    self.userMsg(msg.payload)
-                case "WebcastSocialMessage":
-                    self.follow(msg.payload)
-                case "WebcastRoomUserSeqMessage":
-                    self.ranking(msg.payload)
-                case "WebcastUpdateFanTicketMessage":
-                    self.overall_ranking(msg.payload)
-
-    def giveALike(self, data):
+            # protobuf 每次访问字段都会生成新对象, 只读取一次
+            method = msg.method
+            handler = self.router.route(method)
+            if handler is None:
+                if event_log is not None:
+                    event_log.append(method, msg.payload)
+                continue
+            data = msg.payload
+            if event_log is not None:
+                event_log.append(method, data)
+            if self.message_policy is None:
+                self.dispatch_queue.put(self, method, handler, data)
+            else:
+                self.message_policy.submit(
+                    self, method, data,
+                    lambda data, method=method, handler=handler: self.dispatch_queue.put(self, method, handler, data)
+                )
+
+    def giveALike(self, likeMessage: LikeMessage):
         """
         点赞消息
-        :param data:
+        :param likeMessage:
         :return:
         """
-        likeMessage = LikeMessage()
-        likeMessage.ParseFromString(data)
-        data = json_format.MessageToDict(likeMessage, preserving_proto_field_name=True)
-        self.live_data.like_count = int(data.get("total", 0))
+        self.live_data.update(like_count=likeMessage.total)
         logger.info(
             '[直播间点赞统计{}] {} 点赞'.format(
-                data["total"],
-                data["user"]["nickName"].encode('utf-8', errors='ignore').decode('utf-8'))
+                likeMessage.total,
+                likeMessage.user.nickName.encode('utf-8', errors='ignore').decode('utf-8'))
         )
 
-    def enterRoom(self, data):
+    def enterRoom(self, memberMessage: MemberMessage):
         """
         进入直播间消息
-        :param data:
+        :param memberMessage:
         :return:
         """
-        memberMessage = MemberMessage()
-        memberMessage.ParseFromString(data)
-        data = json_format.MessageToDict(
-            memberMessage, preserving_proto_field_name=True
-        )
-        user_count = int(data.get("memberCount", 0))
-        self.live_data.user_count = user_count
-        self.callbackMap.enterRoom(data) if self.callbackMap.enterRoom else {}
+        user_count = memberMessage.memberCount
+        self.live_data.update(user_count=user_count)
+        self.callbackMap.enterRoom(LazyMessage(memberMessage)) if self.callbackMap.enterRoom else {}
         logger.info("[直播间成员加入: {}] --> {}".format(
             user_count,
-            data["user"]["nickName"].encode('utf-8', errors='ignore').decode('utf-8')))
+            memberMessage.user.nickName.encode('utf-8', errors='ignore').decode('utf-8')))
 
-    def giftNews(self, data):
+    def giftNews(self, giftMessage: GiftMessage):
         """
         礼物消息
-        :param data:
+        :param giftMessage:
         :return:
         """
-        giftMessage = GiftMessage()
-        giftMessage.ParseFromString(data)
-        data = json_format.MessageToDict(giftMessage, preserving_proto_field_name=True)
-        self.callbackMap.giftNews(data) if self.callbackMap.giftNews else {}
+        self.callbackMap.giftNews(LazyMessage(giftMessage)) if self.callbackMap.giftNews else {}
         logger.info(
             "[直播间礼物消息] {} 送出 {}".format(
-                data["user"]["nickName"].encode('utf-8', errors='ignore').decode('utf-8'),
-                data["gift"]["name"])
+                giftMessage.user.nickName.encode('utf-8', errors='ignore').decode('utf-8'),
+                giftMessage.gift.name)
         )
 
-    def userMsg(self, data):
-        chatMessage = ChatMessage()
-        chatMessage.ParseFromString(data)
-        data = json_format.MessageToDict(chatMessage, preserving_proto_field_name=True)
-        self.live_data.message_count += 1
-        self.callbackMap.userMsg(data) if self.callbackMap.userMsg else {}
+    def userMsg(self, chatMessage: ChatMessage):
+        self.live_data.incr('message_count')
+        self.callbackMap.userMsg(LazyMessage(chatMessage)) if self.callbackMap.userMsg else {}
         logger.info(
             "[直播间弹幕消息] {} --> {}".format(
-                data["user"]["nickName"].encode('utf-8', errors='ignore').decode('utf-8'),
-                data["content"])
+                chatMessage.user.nickName.encode('utf-8', errors='ignore').decode('utf-8'),
+                chatMessage.content)
         )
 
-    def follow(self, data):
+    def follow(self, socialMessage: SocialMessage):
         """
         关注消息
-        :param data:
+        :param socialMessage:
         :return:
         """
-        socialMessage = SocialMessage()
-        socialMessage.ParseFromString(data)
-        data = json_format.MessageToDict(
-            socialMessage, preserving_proto_field_name=True
-        )
-        log = json.dumps(data, ensure_ascii=False)
-        self.callbackMap.follow(data) if self.callbackMap.follow else {}
-        logger.info("[➕直播间关注消息] {}".format(log))
+        self.callbackMap.follow(LazyMessage(socialMessage)) if self.callbackMap.follow else {}
+        logger.info("[➕直播间关注消息] {}".format(
+            socialMessage.user.nickName.encode('utf-8', errors='ignore').decode('utf-8')))
 
-    def ranking(self, data):
+    def ranking(self, roomUserSeqMessage: RoomUserSeqMessage):
         """
         排名消息
         :return:
         """
-        roomUserSeqMessage = RoomUserSeqMessage()
-        roomUserSeqMessage.ParseFromString(data)
-        data = json_format.MessageToDict(
-            roomUserSeqMessage, preserving_proto_field_name=True
-        )
-        ranks_list = data['ranksList']
-        print(ranks_list)
         user_info = [
             {
-                'id': i['user']['id'],
-                'username': i['user'].get('nickName', '匿名用户').encode('utf-8', errors='ignore').decode('utf-8'),
-                'rank': i['rank'],
-                'avatar': i['user']['AvatarThumb']['urlListList'][0],
+                'id': str(i.user.id),
+                'username': (i.user.nickName or '匿名用户').encode('utf-8', errors='ignore').decode('utf-8'),
+                'rank': str(i.rank),
+                'avatar': i.user.AvatarThumb.urlListList[0] if i.user.AvatarThumb.urlListList else '',
             }
-            for i in ranks_list
+            for i in roomUserSeqMessage.ranksList
         ]
         user_info.sort(key=lambda item: int(item['rank']))
-        self.live_data.ranking = user_info
-        self.live_data.create_time = int(data['common']['createTime'])
-        self.live_data.total_user_count = int(data['totalUser'])
-
-    def overall_ranking(self, data):
-        updateFanTicketMessage = UpdateFanTicketMessage()
-        updateFanTicketMessage.ParseFromString(data)
-        data = json_format.MessageToDict(
-            updateFanTicketMessage, preserving_proto_field_name=True
+        self.live_data.update(
+            ranking=user_info,
+            create_time=roomUserSeqMessage.common.createTime,
+            total_user_count=roomUserSeqMessage.totalUser
         )
-        self.live_data.score = data['roomFanTicketCount']
+
+    def overall_ranking(self, updateFanTicketMessage: UpdateFanTicketMessage):
+        self.live_data.update(score=updateFanTicketMessage.roomFanTicketCount)
 
 
 if __name__ == '__main__':
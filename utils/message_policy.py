@@ -0,0 +1,160 @@
+import logging
+import threading
+import time
+from typing import Callable, Hashable, Union
+
+from .metrics import Counters
+from .scheduler import TimerHandle, get_scheduler
+
+logger = logging.getLogger(__name__)
+
+ALWAYS = 'always'
+SKIP = 'skip'
+SAMPLE = 'sample'
+COALESCE = 'coalesce'
+
+
+def parse_rule(rule: str) -> tuple[str, float]:
+    """
+    解析单条策略, 语法见 MessagePolicy 和 README 中的说明 (config.toml 会被界面重写, 不要在其中写注释)
+    :param rule: always / skip / sample:N / coalesce:秒数
+    :return: (策略, 参数)
+    """
+    name, _, arg = str(rule).strip().partition(':')
+    name = name.strip().lower()
+    if name in (ALWAYS, SKIP) and not arg:
+        return name, 0
+    if name == SAMPLE:
+        n = int(arg)
+        if n < 1:
+            raise ValueError('sample 的参数必须大于 0: {}'.format(rule))
+        return name, n
+    if name == COALESCE:
+        interval = float(arg)
+        if interval <= 0:
+            raise ValueError('coalesce 的参数必须大于 0: {}'.format(rule))
+        return name, interval
+    raise ValueError('未知的消息策略: {}'.format(rule))
+
+
+class MessagePolicy:
+    """
+    按 method 决定消息是否需要解析
+
+    - always: 每条都处理
+    - skip: 直接丢弃, 不解析
+    - sample:N: 每 N 条处理 1 条
+    - coalesce:S: 每 S 秒最多处理 1 条, 期间只保留最新的一条, 到时间后补发
+
+    没有配置的 method 按 always 处理。
+    """
+
+    def __init__(self, rules: Union[dict, None] = None):
+        self.rules: dict[str, tuple[str, float]] = {}
+        for method, rule in (rules or {}).items():
+            self.rules[method] = parse_rule(rule)
+        self.counters = Counters()
+        self._lock = threading.Lock()
+        # (owner, method) -> 已收到条数
+        self._seen: dict[tuple, int] = {}
+        # (owner, method) -> 上次处理时间
+        self._last: dict[tuple, float] = {}
+        # (owner, method) -> (payload, dispatch), 等待补发的最新一条
+        self._pending: dict[tuple, tuple] = {}
+        # (owner, method) -> 补发定时器
+        self._timers: dict[tuple, TimerHandle] = {}
+
+    @classmethod
+    def from_config(cls, config: dict) -> 'MessagePolicy':
+        """
+        读取 config.toml 中的 [message_policy], 写错的条目记录日志后按 always 处理
+        :param config:
+        :return:
+        """
+        rules = {}
+        for method, rule in (config.get('message_policy') or {}).items():
+            try:
+                parse_rule(rule)
+            except ValueError as e:
+                logger.error('{} 的消息策略无效, 按 always 处理: {}'.format(method, e))
+                continue
+            rules[method] = rule
+        return cls(rules)
+
+    def submit(self, owner: Hashable, method: str, payload, dispatch: Callable[[bytes], None]):
+        """
+        按策略决定是否调用 dispatch(payload)
+        :param owner: 消息所属的连接
+        :param method:
+        :param payload: 未解析的消息
+        :param dispatch: 放行时调用, coalesce 补发时在共享定时器的工作线程中调用
+        :return:
+        """
+        name, arg = self.rules.get(method, (ALWAYS, 0))
+        if name == ALWAYS:
+            dispatch(payload)
+            return
+        if name == SKIP:
+            self.counters.incr('skipped')
+            self.counters.incr('skipped.{}'.format(method))
+            return
+        key = (owner, method)
+        if name == SAMPLE:
+            with self._lock:
+                seen = self._seen.get(key, 0)
+                self._seen[key] = seen + 1
+            if seen % arg:
+                self.counters.incr('sampled_out')
+                self.counters.incr('sampled_out.{}'.format(method))
+                return
+            dispatch(payload)
+            return
+        now = time.monotonic()
+        with self._lock:
+            last = self._last.get(key)
+            dispatch_now = last is None or now - last >= arg
+            if dispatch_now:
+                self._last[key] = now
+                replaced = self._pending.pop(key, None)
+                timer = self._timers.pop(key, None)
+                if timer is not None:
+                    timer.cancel()
+            else:
+                replaced = self._pending.get(key)
+                self._pending[key] = (payload, dispatch)
+                if replaced is None:
+                    self._timers[key] = get_scheduler().call_later(last + arg - now, self._flush, key)
+        # 被更新的消息取代、不再处理的那一条
+        if replaced is not None:
+            self.counters.incr('coalesced')
+            self.counters.incr('coalesced.{}'.format(method))
+        if dispatch_now:
+            dispatch(payload)
+
+    def _flush(self, key: tuple):
+        with self._lock:
+            self._timers.pop(key, None)
+            pending = self._pending.pop(key, None)
+            if pending is None:
+                return
+            self._last[key] = time.monotonic()
+        payload, dispatch = pending
+        dispatch(payload)
+
+    def close(self, owner: Hashable = None):
+        """
+        取消等待中的补发, 连接关闭时调用, 之后不会再调用该连接的 dispatch
+        :param owner: 只清理该连接, 为 None 时清理全部
+        :return:
+        """
+        with self._lock:
+            for key in [key for key in self._timers if owner is None or key[0] is owner]:
+                self._timers.pop(key).cancel()
+            for state in (self._pending, self._last, self._seen):
+                for key in [key for key in state if owner is None or key[0] is owner]:
+                    del state[key]
+
+    def stats(self) -> dict:
+        counters = self.counters.to_dict()
+        saved = counters.get('skipped', 0) + counters.get('sampled_out', 0) + counters.get('coalesced', 0)
+        return {'saved': saved, **counters}
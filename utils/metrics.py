@@ -0,0 +1,73 @@
+import threading
+import time
+from collections import defaultdict
+
+
+class LatencyStat:
+    """
+    线程安全的耗时统计
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            self.last = seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def time(self):
+        return _Timer(self)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                'count': self.count,
+                'avg_ms': self.total / self.count * 1000 if self.count else 0.0,
+                'max_ms': self.max * 1000,
+                'last_ms': self.last * 1000,
+            }
+
+
+class _Timer:
+    __slots__ = ('_stat', '_start')
+
+    def __init__(self, stat: LatencyStat):
+        self._stat = stat
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stat.observe(time.perf_counter() - self._start)
+
+
+class Counters:
+    """
+    线程安全的计数器集合
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = defaultdict(int)
+
+    def incr(self, name, value: int = 1):
+        with self._lock:
+            self._values[name] += value
+
+    def get(self, name) -> int:
+        with self._lock:
+            return self._values.get(name, 0)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return dict(self._values)
@@ -0,0 +1,232 @@
+import asyncio
+import logging
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, Iterator, Union
+
+from .metrics import Counters
+
+logger = logging.getLogger(__name__)
+
+# 帧头: 接收时间戳, 帧长度
+_FRAME = struct.Struct('>dI')
+
+
+class FrameRecorder:
+    """
+    录制 websocket 收到的原始二进制帧, 每帧为 8 字节时间戳 + 4 字节长度 + PushFrame 字节
+    """
+
+    def __init__(self, path: Union[Path, str]):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = open(self.path, 'ab')
+        self.frames = 0
+
+    def record(self, frame: bytes, ts: Union[float, None] = None):
+        header = _FRAME.pack(time.time() if ts is None else ts, len(frame))
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(header)
+            self._file.write(frame)
+            self.frames += 1
+
+    def flush(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def iter_recording(path: Union[Path, str]) -> Iterator[tuple[float, bytes]]:
+    """
+    逐帧读取录制文件, 末尾写了一半的帧会被忽略
+    :param path:
+    :return: (时间戳, 帧)
+    """
+    with open(path, 'rb') as f:
+        while True:
+            header = f.read(_FRAME.size)
+            if len(header) < _FRAME.size:
+                return
+            ts, size = _FRAME.unpack(header)
+            frame = f.read(size)
+            if len(frame) < size:
+                return
+            yield ts, frame
+
+
+def load_recording(path: Union[Path, str]) -> list[tuple[float, bytes]]:
+    return list(iter_recording(path))
+
+
+class ReplaySocket:
+    """
+    回放时代替 websocket 传给 message_dispatch, 只统计客户端发出的 ACK 和心跳
+    """
+
+    def __init__(self):
+        self.sent = 0
+
+    def send(self, data, opcode=None):
+        self.sent += 1
+
+    def close(self):
+        pass
+
+
+class Replayer:
+    """
+    按录制时的节奏回放帧
+
+    speed 为 1 时按原始时间间隔回放, 为 N 时加速 N 倍, 为 None 时不等待, 尽快回放。
+    落后于时间线时不会补睡, 而是记录最大落后时间, 用来判断处理速度是否跟得上。
+    """
+
+    def __init__(self, frames: Iterable[tuple[float, bytes]], speed: Union[float, None] = 1.0):
+        if speed is not None and speed <= 0:
+            raise ValueError('speed must be positive or None')
+        self.frames = frames
+        self.speed = speed
+        self.counters = Counters()
+        # 相对时间线的最大落后秒数
+        self.max_lag = 0.0
+
+    def _delay(self, first_ts: float, ts: float, start: float) -> float:
+        return start + (ts - first_ts) / self.speed - time.perf_counter()
+
+    def paced(self) -> Iterator[bytes]:
+        first_ts = None
+        start = time.perf_counter()
+        for ts, frame in self.frames:
+            if first_ts is None:
+                first_ts = ts
+            if self.speed is not None:
+                delay = self._delay(first_ts, ts, start)
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    self.max_lag = max(self.max_lag, -delay)
+            self.counters.incr('frames')
+            yield frame
+
+    def run(self, dws) -> dict:
+        """
+        在当前线程中把帧直接送入 dws.message_dispatch
+        :param dws: DWS 或其子类实例
+        :return: 回放统计, elapsed 为送完全部帧的耗时, drained 为处理完全部消息的耗时
+        """
+        ws = ReplaySocket()
+        start = time.perf_counter()
+        for frame in self.paced():
+            try:
+                dws.message_dispatch(ws, frame)
+            except Exception as e:
+                self.counters.incr('errors')
+                logger.error('回放帧处理失败 {}'.format(e), exc_info=True)
+        elapsed = time.perf_counter() - start
+        # 等处理队列中剩余的消息处理完
+        dws.drain()
+        frames = self.counters.get('frames')
+        return {
+            **self.counters.to_dict(),
+            'elapsed': elapsed,
+            'drained': time.perf_counter() - start,
+            'fps': frames / elapsed if elapsed else 0.0,
+            'max_lag': self.max_lag,
+            'client_sent': ws.sent,
+        }
+
+
+class ReplayServer:
+    """
+    本地 websocket 服务, 按录制节奏向每个连接推送帧, 配合 AsyncDWS(wss_url=server.url)
+    回放完整的 接收 -> 解析 -> 回调 链路
+    """
+
+    def __init__(self, frames: list[tuple[float, bytes]], speed: Union[float, None] = 1.0,
+                 host: str = '127.0.0.1', port: int = 0, loop_forever: bool = False):
+        self.frames = frames
+        self.speed = speed
+        self.host = host
+        self.port = port
+        # 回放完后从头再来, 用于长时间压测
+        self.loop_forever = loop_forever
+        self.counters = Counters()
+        self._ready = threading.Event()
+        self._loop: Union[asyncio.AbstractEventLoop, None] = None
+        self._stop: Union[asyncio.Event, None] = None
+        self._thread: Union[threading.Thread, None] = None
+
+    @property
+    def url(self) -> str:
+        return 'ws://{}:{}/'.format(self.host, self.port)
+
+    async def _reader(self, ws):
+        async for _ in ws:
+            self.counters.incr('client_sent')
+
+    async def _handler(self, ws):
+        reader = asyncio.create_task(self._reader(ws))
+        self.counters.incr('connections')
+        try:
+            while True:
+                first_ts = None
+                start = time.perf_counter()
+                for ts, frame in self.frames:
+                    if first_ts is None:
+                        first_ts = ts
+                    if self.speed is not None:
+                        delay = start + (ts - first_ts) / self.speed - time.perf_counter()
+                        if delay > 0:
+                            # 等待期间客户端断开时立即结束, 下面的 send 会抛出异常
+                            try:
+                                await asyncio.wait_for(ws.wait_closed(), delay)
+                            except asyncio.TimeoutError:
+                                pass
+                    await ws.send(frame)
+                    self.counters.incr('frames')
+                if not self.loop_forever:
+                    break
+            # 等客户端发完最后的 ACK
+            await asyncio.sleep(0.1)
+        except Exception as e:
+            logger.debug('回放连接断开 {}'.format(e))
+        finally:
+            reader.cancel()
+            await ws.close()
+
+    async def _main(self):
+        # 只有回放服务需要 websockets, 录制 (FrameRecorder) 不需要
+        from websockets.asyncio.server import serve
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        async with serve(self._handler, self.host, self.port, max_size=None) as server:
+            self.port = server.sockets[0].getsockname()[1]
+            self._ready.set()
+            await self._stop.wait()
+
+    def start(self) -> 'ReplayServer':
+        self._thread = threading.Thread(target=asyncio.run, args=(self._main(),), name='replay-server', daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stop.set)
+        if self._thread is not None:
+            self._thread.join()
@@ -1,17 +1,293 @@
-import time
+import asyncio
+import functools
+import inspect
 import logging
+import random
+import threading
+import time
+from typing import Callable, Hashable, Union
+
+from .metrics import Counters
 
 logger = logging.getLogger(__name__)
 
 
-def retry(retry_num=5):
+class CircuitOpenError(ConnectionError):
+    """
+    主机的熔断器处于打开状态, 本次请求没有发出
+    """
+
+    def __init__(self, host: str, remaining: float):
+        super().__init__('{} 熔断中, {:.1f} 秒后重试'.format(host, remaining))
+        self.host = host
+        self.remaining = remaining
+
+
+class Backoff:
+    """
+    指数退避 + full jitter: 第 n 次失败后等待 uniform(0, min(cap, base * factor ** n)) 秒,
+    让同时失败的连接错开重试时间
+    """
+
+    def __init__(self, base: float = 1.0, cap: float = 60.0, factor: float = 2.0,
+                 rng: Union[random.Random, None] = None):
+        self.base = base
+        self.cap = cap
+        self.factor = factor
+        self._rng = rng or random.Random()
+
+    def ceiling(self, attempt: int) -> float:
+        return min(self.cap, self.base * self.factor ** attempt)
+
+    def delay(self, attempt: int) -> float:
+        return self._rng.uniform(0, self.ceiling(attempt))
+
+
+class TTLCache:
+    """
+    带过期时间的线程安全缓存
+    """
+
+    def __init__(self, ttl: float = 600.0):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # key -> (过期时间, 值)
+        self._items: dict[Hashable, tuple[float, object]] = {}
+        self.counters = Counters()
+
+    def get(self, key: Hashable, default=None):
+        now = time.monotonic()
+        with self._lock:
+            item = self._items.get(key)
+            if item is None or item[0] <= now:
+                if item is not None:
+                    del self._items[key]
+                self.counters.incr('miss')
+                return default
+        self.counters.incr('hit')
+        return item[1]
+
+    def set(self, key: Hashable, value, ttl: Union[float, None] = None):
+        with self._lock:
+            self._items[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+class CircuitBreaker:
+    """
+    单个主机的熔断器
+
+    连续失败 failure_threshold 次后打开, reset_timeout 秒内直接拒绝; 之后进入半开状态,
+    只放行一个探测请求, 成功则关闭, 失败则重新打开。
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, host: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.counters = Counters()
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def remaining(self) -> float:
+        """
+        距离允许下一次探测的秒数
+        :return:
+        """
+        with self._lock:
+            if self._state != self.OPEN:
+                return 0.0
+            return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    self.counters.incr('rejected')
+                    return False
+                self._state = self.HALF_OPEN
+                self._probing = False
+            # 半开状态只放行一个探测
+            if self._probing:
+                self.counters.incr('rejected')
+                return False
+            self._probing = True
+            return True
+
+    def check(self):
+        """
+        不允许请求时抛出 CircuitOpenError
+        :return:
+        """
+        if not self.allow():
+            raise CircuitOpenError(self.host, self.remaining())
+
+    def record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info('[熔断] {} 恢复'.format(self.host))
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self.counters.incr('failures')
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning('[熔断] {} 连续失败 {} 次, 暂停 {} 秒'.format(
+                        self.host, self._failures, self.reset_timeout))
+                    self.counters.incr('opened')
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def release(self):
+        """
+        请求以不计入熔断的异常结束: 既不算成功也不算失败, 半开状态下允许下一个探测
+        :return:
+        """
+        with self._lock:
+            self._probing = False
+
+    def stats(self) -> dict:
+        return {'state': self.state, **self.counters.to_dict()}
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(host: str) -> CircuitBreaker:
+    """
+    获取进程内共享的主机熔断器, 同一主机的所有连接共用
+    :param host:
+    :return:
+    """
+    with _breakers_lock:
+        breaker = _breakers.get(host)
+        if breaker is None:
+            breaker = _breakers[host] = CircuitBreaker(host)
+        return breaker
+
+
+class RetryPolicy:
+    """
+    重试策略: 最多尝试 attempts 次, 失败之间按 backoff 等待, 指定 host 时经过该主机的熔断器。
+    全部失败后抛出最后一次的异常。只有 retry_on 中的异常会重试并计入熔断, 其他异常直接抛出。
+    """
+
+    def __init__(self, attempts: int = 5, backoff: Union[Backoff, None] = None,
+                 retry_on: tuple = (Exception,), host: Union[str, None] = None):
+        self.attempts = attempts
+        self.backoff = backoff or Backoff(base=0.5, cap=10.0)
+        self.retry_on = retry_on
+        self.host = host
+
+    def _breaker(self) -> Union[CircuitBreaker, None]:
+        return None if self.host is None else get_breaker(self.host)
+
+    def _failed(self, attempt: int, error: Exception, breaker: Union[CircuitBreaker, None]) -> Union[float, None]:
+        # 返回下次重试前的等待时间, 不再重试时返回 None
+        if breaker is not None:
+            breaker.record_failure()
+        if attempt + 1 >= self.attempts:
+            return None
+        logger.error('第{}次重试: {}'.format(attempt + 1, error))
+        return self.backoff.delay(attempt)
+
+    def call(self, func: Callable, *args, **kwargs):
+        breaker = self._breaker()
+        for attempt in range(self.attempts):
+            if breaker is not None:
+                breaker.check()
+            try:
+                result = func(*args, **kwargs)
+            except self.retry_on as e:
+                delay = self._failed(attempt, e, breaker)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            except BaseException:
+                # 不重试的异常 (如直播间已关闭) 不计入熔断, 但要释放半开状态的探测名额
+                if breaker is not None:
+                    breaker.release()
+                raise
+            if breaker is not None:
+                breaker.record_success()
+            return result
+
+    async def acall(self, func: Callable, *args, **kwargs):
+        breaker = self._breaker()
+        for attempt in range(self.attempts):
+            if breaker is not None:
+                breaker.check()
+            try:
+                result = await func(*args, **kwargs)
+            except self.retry_on as e:
+                delay = self._failed(attempt, e, breaker)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # 不重试的异常 (如直播间已关闭) 不计入熔断, 但要释放半开状态的探测名额
+                if breaker is not None:
+                    breaker.release()
+                raise
+            if breaker is not None:
+                breaker.record_success()
+            return result
+
+
+def retry(retry_num: int = 5, base: float = 0.5, cap: float = 10.0, retry_on: tuple = (Exception,),
+          host: Union[str, None] = None):
+    """
+    重试装饰器, 同时支持普通函数和协程函数
+    :param retry_num: 最多尝试次数
+    :param base: 退避基数 (秒)
+    :param cap: 单次等待上限 (秒)
+    :param retry_on: 需要重试的异常类型
+    :param host: 指定时经过该主机的熔断器
+    :return:
+    """
+    policy = RetryPolicy(retry_num, Backoff(base=base, cap=cap), retry_on, host)
+
     def wrapper(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_inner(*args, **kwargs):
+                return await policy.acall(func, *args, **kwargs)
+
+            return async_inner
+
+        @functools.wraps(func)
         def inner(*args, **kwargs):
-            for i in range(retry_num):
-                try:
-                    return func(*args, **kwargs)
-                except Exception as e:
-                    logger.error(f'第{i + 1}次重试:{e}')
+            return policy.call(func, *args, **kwargs)
 
         return inner
 
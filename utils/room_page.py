@@ -0,0 +1,153 @@
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Union
+
+# 直播间页面把房间数据以转义后的 JSON 字符串嵌在脚本里, 形如 \"key\":value
+_MARKER = re.compile(r'\\"(room|id_str|status|title|roomId|owner|hls_pull_url_map|flv)\\":')
+# 对象扫描只关心花括号和引号, 引号前面的反斜杠一起匹配用于判断转义层级
+_OBJECT_TOKEN = re.compile(r'[{}]|\\+"')
+_STRING_END = re.compile(r'\\+"')
+_DIGITS = re.compile(r'\d+')
+
+
+class RoomClosedError(ConnectionError):
+    """
+    直播间已关闭
+    """
+
+
+class LayoutChangedError(ValueError):
+    """
+    页面结构与预期不符, 无法提取直播间信息
+    """
+
+
+@dataclass
+class RoomInfo:
+    # 用于连接 websocket 的房间号
+    live_room_id: str
+    # room 对象中的 id_str
+    room_id_str: Union[str, None] = None
+    # 2 直播中 4 已关闭
+    status: Union[int, None] = None
+    title: Union[str, None] = None
+    owner: dict = field(default_factory=dict)
+    hls_pull_url_map: dict = field(default_factory=dict)
+    hls_url: str = ''
+    flv_url: str = ''
+
+
+def _is_string_end(token: str) -> bool:
+    # 外层字符串结束是 \" (1 个反斜杠), 内层被转义的引号是 \\\" (3 个反斜杠)
+    return (len(token) - 1) % 4 == 1
+
+
+def _unescape(raw: str):
+    # 先去掉外层 JS 字符串的转义, 再按 JSON 解析
+    try:
+        return json.loads(json.loads('"' + raw + '"'))
+    except ValueError as e:
+        raise LayoutChangedError('无法解析页面数据: {}'.format(raw[:80])) from e
+
+
+def _scan_string(text: str, pos: int) -> tuple[str, int]:
+    if not text.startswith('\\"', pos):
+        raise LayoutChangedError('位置 {} 不是字符串'.format(pos))
+    for m in _STRING_END.finditer(text, pos + 2):
+        if _is_string_end(m.group()):
+            return _unescape(text[pos:m.end()]), m.end()
+    raise LayoutChangedError('字符串未结束')
+
+
+def _scan_object(text: str, pos: int) -> tuple[dict, int]:
+    if not text.startswith('{', pos):
+        raise LayoutChangedError('位置 {} 不是对象'.format(pos))
+    depth = 0
+    in_string = False
+    for m in _OBJECT_TOKEN.finditer(text, pos):
+        token = m.group()
+        if token[-1] == '"':
+            if _is_string_end(token):
+                in_string = not in_string
+        elif not in_string:
+            depth += 1 if token == '{' else -1
+            if depth == 0:
+                return _unescape(text[pos:m.end()]), m.end()
+    raise LayoutChangedError('对象未结束')
+
+
+def _https(url: str) -> str:
+    if url.startswith('http://'):
+        return 'https://' + url[len('http://'):]
+    return url
+
+
+def extract_room_info(text: str) -> RoomInfo:
+    """
+    单次线性扫描直播间页面, 提取房间号、状态、标题、主播信息和直播流地址
+
+    :param text: 直播间页面 HTML
+    :return:
+    :raises RoomClosedError: 直播间已关闭
+    :raises LayoutChangedError: 页面中找不到必须的字段
+    """
+    values = {}
+    in_room = False
+    pos = 0
+    wanted = {'id_str', 'status', 'title', 'roomId', 'owner', 'hls_pull_url_map', 'flv'}
+    while wanted:
+        m = _MARKER.search(text, pos)
+        if m is None:
+            break
+        key = m.group(1)
+        pos = m.end()
+        if key == 'room':
+            in_room = in_room or text.startswith('{', pos)
+            continue
+        if key not in wanted:
+            continue
+        # id_str、status、title 取 room 对象里依次出现的第一个
+        if key == 'id_str' and not in_room:
+            continue
+        if key == 'status' and 'id_str' not in values:
+            continue
+        if key == 'title' and 'status' not in values:
+            continue
+        if key in ('owner', 'hls_pull_url_map'):
+            if not text.startswith('{', pos):
+                continue
+            values[key], pos = _scan_object(text, pos)
+        elif key == 'status':
+            digits = _DIGITS.match(text, pos)
+            if digits is None:
+                continue
+            values[key] = int(digits.group())
+            pos = digits.end()
+        else:
+            if not text.startswith('\\"', pos):
+                continue
+            values[key], pos = _scan_string(text, pos)
+            if key == 'roomId' and not values[key].isdigit():
+                del values[key]
+                continue
+        wanted.discard(key)
+
+    if values.get('status') == 4:
+        raise RoomClosedError('房间已关闭')
+    missing = [key for key in ('roomId', 'status') if key not in values]
+    if missing:
+        raise LayoutChangedError('页面中缺少字段: {}'.format(', '.join(missing)))
+
+    hls_pull_url_map = values.get('hls_pull_url_map') or {}
+    hls_url = hls_pull_url_map.get('FULL_HD1') or hls_pull_url_map.get('HD1') or ''
+    return RoomInfo(
+        live_room_id=values['roomId'],
+        room_id_str=values.get('id_str'),
+        status=values['status'],
+        title=values.get('title'),
+        owner=values.get('owner') or {},
+        hls_pull_url_map=hls_pull_url_map,
+        hls_url=_https(hls_url),
+        flv_url=_https(values.get('flv', '')),
+    )
@@ -0,0 +1,176 @@
+import logging
+import threading
+from typing import Callable, Union
+
+from google.protobuf.message import Message
+
+from . import dy_pb2
+from .metrics import Counters
+
+logger = logging.getLogger(__name__)
+
+# 已知的 method 及其 protobuf 类型
+DEFAULT_TYPES: dict[str, type] = {
+    'Webcast' + name: getattr(dy_pb2, name)
+    for name in (
+        'ChatMessage',
+        'CommonTextMessage',
+        'EpisodeChatMessage',
+        'GiftMessage',
+        'LikeMessage',
+        'LiveShoppingMessage',
+        'MatchAgainstScoreMessage',
+        'MemberMessage',
+        'ProductChangeMessage',
+        'RoomStatsMessage',
+        'RoomUserSeqMessage',
+        'SocialMessage',
+        'UpdateFanTicketMessage',
+    )
+}
+
+
+class Subscription:
+    """
+    subscribe 返回的订阅, unsubscribe 后不再收到消息
+    """
+    __slots__ = ('method', 'callback', 'predicate', '_router')
+
+    def __init__(self, router: 'MethodRouter', method: str, callback: Callable[[Message], None],
+                 predicate: Union[Callable[[Message], bool], None]):
+        self._router = router
+        self.method = method
+        self.callback = callback
+        self.predicate = predicate
+
+    def unsubscribe(self):
+        self._router.unsubscribe(self)
+
+
+class Route:
+    """
+    单个 method 的处理函数: 解析一次, 依次交给满足条件的订阅者
+    """
+    __slots__ = ('method', 'message_type', 'subscriptions', 'counters')
+
+    def __init__(self, method: str, message_type: type, subscriptions: tuple, counters: Counters):
+        self.method = method
+        self.message_type = message_type
+        self.subscriptions = subscriptions
+        self.counters = counters
+
+    def __call__(self, payload: bytes):
+        message = self.message_type()
+        message.ParseFromString(payload)
+        for subscription in self.subscriptions:
+            try:
+                if subscription.predicate is not None and not subscription.predicate(message):
+                    self.counters.incr('filtered')
+                    continue
+                subscription.callback(message)
+            except Exception as e:
+                # 一个订阅者出错不影响其他订阅者
+                self.counters.incr('errors')
+                logger.error('{} 订阅者处理失败 {}'.format(self.method, e), exc_info=True)
+
+
+class MethodRouter:
+    """
+    按 method 分发消息
+
+    每个 method 对应一个 protobuf 类型和任意多个订阅者, 订阅者收到解析后的消息,
+    可以用 predicate 过滤。没有订阅者的 method 不做解析, 未注册类型的 method 按名称计数,
+    方便发现新的消息类型。
+    """
+
+    def __init__(self, types: Union[dict, None] = None):
+        self.counters = Counters()
+        self._lock = threading.Lock()
+        self._types: dict[str, type] = dict(DEFAULT_TYPES if types is None else types)
+        self._subscriptions: dict[str, list[Subscription]] = {}
+        # method -> Route, 订阅变化时整体替换, 读取时不加锁
+        self._routes: dict[str, Route] = {}
+        # method -> 没有订阅者而跳过的次数 / 未注册类型的出现次数; 只在接收线程中写入, 不加锁
+        self._skipped: dict[str, int] = {}
+        self._unknown: dict[str, int] = {}
+
+    def register(self, method: str, message_type: type):
+        """
+        注册 method 对应的 protobuf 类型
+        :param method:
+        :param message_type:
+        :return:
+        """
+        with self._lock:
+            self._types[method] = message_type
+            self._rebuild()
+
+    def subscribe(self, method: str, callback: Callable[[Message], None],
+                  predicate: Union[Callable[[Message], bool], None] = None) -> Subscription:
+        """
+        订阅 method
+        :param method: 如 WebcastLikeMessage, 需已注册类型
+        :param callback: callback(message), 在处理队列的工作线程中调用
+        :param predicate: predicate(message) 为 False 时跳过该订阅者
+        :return:
+        """
+        if method not in self._types:
+            raise KeyError('未注册的消息类型: {}'.format(method))
+        subscription = Subscription(self, method, callback, predicate)
+        with self._lock:
+            self._subscriptions.setdefault(method, []).append(subscription)
+            self._rebuild()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.method, [])
+            if subscription in subscriptions:
+                subscriptions.remove(subscription)
+                self._rebuild()
+
+    def _rebuild(self):
+        # 调用前需持有 _lock
+        self._routes = {
+            method: Route(method, self._types[method], tuple(subscriptions), self.counters)
+            for method, subscriptions in self._subscriptions.items()
+            if subscriptions and method in self._types
+        }
+
+    def route(self, method: str) -> Union[Route, None]:
+        """
+        查找 method 的处理函数, 没有订阅者时返回 None
+        :param method:
+        :return:
+        """
+        route = self._routes.get(method)
+        if route is None:
+            if method in self._types:
+                self._skipped[method] = self._skipped.get(method, 0) + 1
+            else:
+                seen = self._unknown.get(method, 0)
+                if not seen:
+                    logger.info('发现未知消息类型: {}'.format(method))
+                self._unknown[method] = seen + 1
+        return route
+
+    def subscribers(self, method: str) -> int:
+        route = self._routes.get(method)
+        return 0 if route is None else len(route.subscriptions)
+
+    def unknown(self) -> dict[str, int]:
+        """
+        未注册类型的 method 及出现次数
+        :return:
+        """
+        return dict(self._unknown)
+
+    def skipped(self) -> dict[str, int]:
+        """
+        因没有订阅者而未解析的 method 及次数
+        :return:
+        """
+        return dict(self._skipped)
+
+    def stats(self) -> dict:
+        return {**self.counters.to_dict(), 'skipped': self.skipped(), 'unknown': self.unknown()}
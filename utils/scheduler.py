@@ -0,0 +1,216 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Union
+
+from .metrics import Counters, LatencyStat
+
+logger = logging.getLogger(__name__)
+
+
+class TimerHandle:
+    """
+    call_later / call_every 返回的定时任务, cancel 后不会再触发
+    """
+    __slots__ = ('callback', 'args', 'interval', 'deadline', 'rounds', 'cancelled', '_scheduler')
+
+    def __init__(self, scheduler: 'Scheduler', callback: Callable, args: tuple, interval: Union[float, None]):
+        self._scheduler = scheduler
+        self.callback = callback
+        self.args = args
+        # 为 None 时只触发一次
+        self.interval = interval
+        self.deadline = 0.0
+        self.rounds = 0
+        self.cancelled = False
+
+    def cancel(self):
+        if not self.cancelled:
+            self.cancelled = True
+            self._scheduler._cancelled(self)
+
+
+class Scheduler:
+    """
+    时间轮定时器
+
+    所有直播间的心跳、空闲检测等定时任务共用一个时间轮线程, 到期的回调交给固定数量的
+    工作线程执行, 线程数与连接数无关。触发时间的误差在半个 tick 以内。
+    """
+
+    def __init__(self, tick: float = 0.1, slots: int = 512, workers: int = 2, name: str = 'scheduler'):
+        self.tick = tick
+        self.slots = slots
+        self.workers = workers
+        self.name = name
+        self.counters = Counters()
+        # 计划触发时间到实际开始执行的延迟
+        self.lag = LatencyStat()
+        self._wheel: list[list[TimerHandle]] = [[] for _ in range(slots)]
+        self._cond = threading.Condition()
+        self._cursor = 0
+        self._next_tick = 0.0
+        self._pending = 0
+        self._closed = False
+        self._thread: Union[threading.Thread, None] = None
+        self._executor: Union[ThreadPoolExecutor, None] = None
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._closed = False
+            self._next_tick = time.monotonic() + self.tick
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=self.name)
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def _insert(self, handle: TimerHandle):
+        # 调用前需持有 _cond; 当前槽位在 _next_tick 时处理, 之后每个 tick 前进一格,
+        # 按最近的一格放入
+        if not self._pending:
+            # 时间轮空闲时线程不走动, 先把下一格对齐到当前时间
+            self._next_tick = time.monotonic() + self.tick
+        ticks = max(0, round((handle.deadline - self._next_tick) / self.tick))
+        handle.rounds = ticks // self.slots
+        self._wheel[(self._cursor + ticks) % self.slots].append(handle)
+        self._pending += 1
+
+    def _add(self, delay: float, callback: Callable, args: tuple, interval: Union[float, None]) -> TimerHandle:
+        if self._thread is None:
+            self.start()
+        handle = TimerHandle(self, callback, args, interval)
+        with self._cond:
+            if self._closed:
+                handle.cancelled = True
+                return handle
+            handle.deadline = time.monotonic() + delay
+            self._insert(handle)
+            self.counters.incr('scheduled')
+            self._cond.notify()
+        return handle
+
+    def call_later(self, delay: float, callback: Callable, *args) -> TimerHandle:
+        """
+        delay 秒后在工作线程中调用 callback(*args)
+        :param delay:
+        :param callback:
+        :param args:
+        :return:
+        """
+        return self._add(delay, callback, args, None)
+
+    def call_every(self, interval: float, callback: Callable, *args, delay: Union[float, None] = None) -> TimerHandle:
+        """
+        每隔 interval 秒调用一次 callback(*args), 上一次执行完才会安排下一次
+        :param interval:
+        :param callback:
+        :param args:
+        :param delay: 第一次触发前的等待时间, 默认等于 interval
+        :return:
+        """
+        return self._add(interval if delay is None else delay, callback, args, interval)
+
+    def _cancelled(self, handle: TimerHandle):
+        # 惰性删除: 到期时再从时间轮中移除
+        self.counters.incr('cancelled')
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed:
+                    if not self._pending:
+                        # 没有定时任务时不空转
+                        self._cond.wait()
+                        continue
+                    remaining = self._next_tick - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._closed:
+                    return
+                bucket = self._wheel[self._cursor]
+                due, keep = [], []
+                for handle in bucket:
+                    if handle.cancelled:
+                        self._pending -= 1
+                    elif handle.rounds > 0:
+                        handle.rounds -= 1
+                        keep.append(handle)
+                    else:
+                        self._pending -= 1
+                        due.append(handle)
+                self._wheel[self._cursor] = keep
+                self._cursor = (self._cursor + 1) % self.slots
+                self._next_tick += self.tick
+                executor = self._executor
+            for handle in due:
+                try:
+                    executor.submit(self._fire, handle)
+                except RuntimeError:
+                    # close 之后提交
+                    return
+
+    def _fire(self, handle: TimerHandle):
+        if handle.cancelled:
+            return
+        self.lag.observe(max(0.0, time.monotonic() - handle.deadline))
+        try:
+            handle.callback(*handle.args)
+            self.counters.incr('fired')
+        except Exception as e:
+            self.counters.incr('errors')
+            logger.error('定时任务执行失败 {}'.format(e), exc_info=True)
+        if handle.interval is not None and not handle.cancelled:
+            with self._cond:
+                if self._closed:
+                    return
+                handle.deadline = time.monotonic() + handle.interval
+                self._insert(handle)
+                self._cond.notify()
+
+    def close(self, wait: bool = True):
+        """
+        取消全部定时任务并停止线程
+        :param wait: 是否等待正在执行的回调结束
+        :return:
+        """
+        with self._cond:
+            self._closed = True
+            for bucket in self._wheel:
+                for handle in bucket:
+                    handle.cancelled = True
+                bucket.clear()
+            self._pending = 0
+            thread, self._thread = self._thread, None
+            executor, self._executor = self._executor, None
+            self._cond.notify_all()
+        current = threading.current_thread()
+        if thread is not None and thread is not current:
+            thread.join()
+        if executor is not None:
+            executor.shutdown(wait=wait and not current.name.startswith(self.name))
+
+    def __len__(self):
+        with self._cond:
+            return self._pending
+
+    def stats(self) -> dict:
+        return {'pending': len(self), **self.counters.to_dict(), 'lag': self.lag.to_dict()}
+
+
+_scheduler: Scheduler | None = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> Scheduler:
+    """
+    获取进程内共享的定时器
+    :return:
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = Scheduler()
+        return _scheduler
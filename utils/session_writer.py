@@ -0,0 +1,190 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Union
+
+from .metrics import Counters, LatencyStat
+
+logger = logging.getLogger(__name__)
+
+FSYNC_ALWAYS = 'always'
+FSYNC_INTERVAL = 'interval'
+FSYNC_NEVER = 'never'
+
+_STOP = object()
+
+
+class SessionWriter:
+    """
+    直播数据后台写入
+
+    每条事件写一行 JSON 到 <directory>/<日期>_<stream>.jsonl, 文件保持打开,
+    按条数和时间批量写入, 跨天自动切换文件。写入队列有上限, 磁盘跟不上时
+    write 最多等待 put_timeout 秒, 仍然写不进去就丢弃并计数, 不会拖住界面线程。
+    """
+
+    def __init__(self, directory: Union[Path, str] = Path('./') / 'live_data',
+                 batch_size: int = 512,
+                 flush_interval: float = 1.0,
+                 fsync: str = FSYNC_INTERVAL,
+                 fsync_interval: float = 5.0,
+                 max_pending: int = 10000,
+                 put_timeout: float = 0.05):
+        """
+        :param directory:
+        :param batch_size: 攒够该条数立即写入
+        :param flush_interval: 最长攒批时间
+        :param fsync: always 每批都 fsync, interval 每 fsync_interval 秒一次, never 交给系统
+        :param fsync_interval:
+        :param max_pending: 队列中最多积压的条数
+        :param put_timeout: 队列满时 write 最长等待时间, 0 为不等待直接丢弃 (在界面线程中写入时使用)
+        """
+        if fsync not in (FSYNC_ALWAYS, FSYNC_INTERVAL, FSYNC_NEVER):
+            raise ValueError('unknown fsync policy {}'.format(fsync))
+        self.directory = Path(directory)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.put_timeout = put_timeout
+        self.counters = Counters()
+        # 每批写入 (含 fsync) 耗时
+        self.latency = LatencyStat()
+        self._queue = queue.Queue(maxsize=max_pending)
+        # stream -> (日期, 文件)
+        self._files = {}
+        self._last_fsync = time.monotonic()
+        self._thread: Union[threading.Thread, None] = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._thread = threading.Thread(target=self._run, name='session-writer', daemon=True)
+            self._thread.start()
+
+    def write(self, stream: str, record: Union[dict, list, str]) -> bool:
+        """
+        写入一条记录, 在调用线程中只做入队
+        :param stream: 文件名后缀, 如 msg / live
+        :param record: 字典或已经序列化好的 JSON 字符串
+        :return: 队列已满被丢弃时返回 False
+        """
+        if self._thread is None:
+            self.start()
+        item = (time.time(), stream, record)
+        try:
+            if self.put_timeout > 0:
+                self._queue.put(item, timeout=self.put_timeout)
+            else:
+                self._queue.put_nowait(item)
+        except queue.Full:
+            self.counters.incr('dropped')
+            return False
+        return True
+
+    def _file(self, stream: str, day: str):
+        current = self._files.get(stream)
+        if current is not None:
+            if current[0] == day:
+                return current[1]
+            current[1].close()
+            self.counters.incr('rotations')
+        f = open(self.directory / '{}_{}.jsonl'.format(day, stream), 'ab')
+        self._files[stream] = (day, f)
+        return f
+
+    def _write_batch(self, batch: list):
+        with self.latency.time():
+            # (日期, stream) -> 行, 按日期先后写入, 跨天的批次先写完旧文件再切换
+            lines = {}
+            for ts, stream, record in batch:
+                if not isinstance(record, str):
+                    record = json.dumps(record, ensure_ascii=False)
+                # 昵称里可能有无法编码的代理字符, 直接丢掉
+                line = record.encode('utf-8', errors='ignore') + b'\n'
+                day = time.strftime('%Y-%m-%d', time.localtime(ts))
+                lines.setdefault((day, stream), []).append(line)
+            written = 0
+            for (day, stream), chunk in sorted(lines.items(), key=lambda item: item[0][0]):
+                data = b''.join(chunk)
+                f = self._file(stream, day)
+                f.write(data)
+                f.flush()
+                written += len(data)
+            now = time.monotonic()
+            if self.fsync == FSYNC_ALWAYS or (
+                    self.fsync == FSYNC_INTERVAL and now - self._last_fsync >= self.fsync_interval):
+                for _, f in self._files.values():
+                    os.fsync(f.fileno())
+                self._last_fsync = now
+                self.counters.incr('fsyncs')
+        self.counters.incr('batches')
+        self.counters.incr('events', len(batch))
+        self.counters.incr('bytes', written)
+
+    def _run(self):
+        batch = []
+        deadline = None
+        stopping = False
+        while not stopping:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                stopping = True
+            elif item is not None:
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                batch.append(item)
+                # 把已经积压的一起取出来, 减少唤醒次数
+                while len(batch) < self.batch_size:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+            if batch and (stopping or len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                try:
+                    self._write_batch(batch)
+                except Exception as e:
+                    self.counters.incr('errors')
+                    logger.error('写入直播数据失败 {}'.format(e), exc_info=True)
+                batch = []
+                deadline = None
+        for _, f in self._files.values():
+            try:
+                f.flush()
+                if self.fsync != FSYNC_NEVER:
+                    os.fsync(f.fileno())
+                f.close()
+            except OSError as e:
+                logger.error('关闭直播数据文件失败 {}'.format(e))
+        self._files.clear()
+
+    def close(self, timeout: Union[float, None] = None):
+        """
+        写完队列中剩余的记录后关闭文件
+        :param timeout:
+        :return:
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+
+    def stats(self) -> dict:
+        return {'pending': self._queue.qsize(), **self.counters.to_dict(), 'batch': self.latency.to_dict()}
@@ -0,0 +1,143 @@
+import functools
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import jsengine
+
+from .metrics import Counters, LatencyStat
+
+logger = logging.getLogger(__name__)
+
+SDK_PATH = Path(__file__).parent.parent.joinpath('static/webmssdk.js')
+
+
+@functools.lru_cache(maxsize=None)
+def _sdk_source() -> str:
+    # webmssdk.js 有近 500KB, 每个进程只读取一次
+    return SDK_PATH.read_text(encoding='utf-8')
+
+
+class Signer:
+    """
+    websocket 签名服务
+
+    加载了 webmssdk.js 的 JS 上下文放入池中复用, 并缓存相同摘要的签名结果
+    (同一连接重连时摘要不变)。JS 上下文不是线程安全的, 每次签名独占一个上下文,
+    池满时等待其他签名归还或丢弃上下文。
+    """
+
+    def __init__(self, user_agent: str, pool_size: int = 2, cache_size: int = 256):
+        self.user_agent = user_agent
+        self.pool_size = pool_size
+        self.cache_size = cache_size
+        # 空闲的上下文, 后进先出
+        self._idle = []
+        self._created = 0
+        # 保护 _idle / _created, 上下文归还或丢弃时通知等待的签名
+        self._cond = threading.Condition()
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        # 单次签名耗时 (不含缓存命中)
+        self.latency = LatencyStat()
+        # 创建上下文并加载 SDK 的耗时
+        self.load_latency = LatencyStat()
+        self.counters = Counters()
+
+    def _new_context(self):
+        with self.load_latency.time():
+            ctx = jsengine.jsengine()
+            js_dom = f"""
+    document = {{}}
+    window = {{}}
+    navigator = {{
+    'userAgent': '{self.user_agent}'
+    }}
+    """.strip()
+            ctx.eval(js_dom + _sdk_source())
+        self.counters.incr('contexts_created')
+        return ctx
+
+    def _acquire(self):
+        with self._cond:
+            waited = False
+            while not self._idle:
+                if self._created < self.pool_size:
+                    # 池未满 (或有上下文被丢弃), 新建一个
+                    self._created += 1
+                    break
+                if not waited:
+                    self.counters.incr('pool_waits')
+                    waited = True
+                self._cond.wait()
+            else:
+                return self._idle.pop()
+        try:
+            return self._new_context()
+        except Exception:
+            self._discard()
+            raise
+
+    def _release(self, ctx):
+        with self._cond:
+            self._idle.append(ctx)
+            self._cond.notify()
+
+    def _discard(self):
+        # 等待中的签名被唤醒后可以新建上下文补上
+        with self._cond:
+            self._created -= 1
+            self._cond.notify()
+
+    def sign(self, x_ms_stub: str) -> str:
+        with self._lock:
+            signature = self._cache.get(x_ms_stub)
+            if signature is not None:
+                self._cache.move_to_end(x_ms_stub)
+        if signature is not None:
+            self.counters.incr('cache_hits')
+            return signature
+        self.counters.incr('cache_misses')
+        with self.latency.time():
+            ctx = self._acquire()
+            try:
+                signature = ctx.eval(f"get_sign('{x_ms_stub}')")
+            except Exception:
+                # 出错的上下文状态未知, 直接丢弃
+                self._discard()
+                raise
+            self._release(ctx)
+        with self._lock:
+            self._cache[x_ms_stub] = signature
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return signature
+
+    def stats(self) -> dict:
+        with self._cond:
+            contexts, idle = self._created, len(self._idle)
+        return {
+            'latency': self.latency.to_dict(),
+            'load_latency': self.load_latency.to_dict(),
+            'contexts': contexts,
+            'idle_contexts': idle,
+            **self.counters.to_dict(),
+        }
+
+
+_signers: dict[str, Signer] = {}
+_signers_lock = threading.Lock()
+
+
+def get_signer(user_agent: str) -> Signer:
+    """
+    获取进程内共享的签名服务, 同一 user agent 共用一个上下文池
+    :param user_agent:
+    :return:
+    """
+    with _signers_lock:
+        signer = _signers.get(user_agent)
+        if signer is None:
+            signer = _signers[user_agent] = Signer(user_agent)
+        return signer
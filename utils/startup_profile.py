@@ -0,0 +1,152 @@
+import importlib.abc
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Union
+
+
+class _TimedLoader(importlib.abc.Loader):
+    """
+    包装原始 loader, 记录模块执行耗时
+    """
+
+    def __init__(self, profile: 'StartupProfile', loader):
+        self._profile = profile
+        self._loader = loader
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        # 换回原始 loader, 避免影响按 loader 类型判断的代码
+        module.__loader__ = self._loader
+        if module.__spec__ is not None:
+            module.__spec__.loader = self._loader
+        with self._profile.importing(module.__name__):
+            self._loader.exec_module(module)
+
+    def __getattr__(self, name):
+        # get_resource_reader 等其他接口交给原始 loader
+        return getattr(self._loader, name)
+
+
+class _TimedFinder(importlib.abc.MetaPathFinder):
+    def __init__(self, profile: 'StartupProfile'):
+        self._profile = profile
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is None:
+                continue
+            if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+                spec.loader = _TimedLoader(self._profile, spec.loader)
+            return spec
+        return None
+
+
+class StartupProfile:
+    """
+    启动耗时统计: 每个模块的导入耗时 (自身 / 含子模块) 和各初始化阶段的耗时
+
+    install 之后导入的模块才会被统计, 需要在其他导入之前调用。只统计主线程的导入。
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        # 模块 -> [自身耗时, 累计耗时]
+        self.imports: dict[str, list[float]] = {}
+        # [(阶段, 耗时)]
+        self.stages: list[tuple[str, float]] = []
+        self._stack: list[list] = []
+        self._finder: Union[_TimedFinder, None] = None
+        self._thread = threading.get_ident()
+
+    def install(self) -> 'StartupProfile':
+        if self._finder is None:
+            self._finder = _TimedFinder(self)
+            sys.meta_path.insert(0, self._finder)
+        return self
+
+    def uninstall(self):
+        if self._finder is not None:
+            sys.meta_path.remove(self._finder)
+            self._finder = None
+
+    @contextmanager
+    def importing(self, name: str):
+        if threading.get_ident() != self._thread:
+            yield
+            return
+        # [模块名, 开始时间, 子模块耗时]
+        frame = [name, time.perf_counter(), 0.0]
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            elapsed = time.perf_counter() - frame[1]
+            self.imports[name] = [elapsed - frame[2], elapsed]
+            if self._stack:
+                self._stack[-1][2] += elapsed
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        统计一个初始化阶段
+        :param name:
+        :return:
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.append((name, time.perf_counter() - start))
+
+    def top_level(self) -> dict[str, float]:
+        """
+        按顶层包汇总的导入耗时 (自身耗时之和)
+        :return:
+        """
+        packages = {}
+        for name, (self_time, _) in self.imports.items():
+            package = name.split('.')[0]
+            packages[package] = packages.get(package, 0.0) + self_time
+        return dict(sorted(packages.items(), key=lambda item: item[1], reverse=True))
+
+    def report(self, limit: int = 20) -> str:
+        total = time.perf_counter() - self.start
+        lines = ['启动耗时 {:.3f}s, 导入模块 {} 个, 导入合计 {:.3f}s'.format(
+            total, len(self.imports), sum(self_time for self_time, _ in self.imports.values()))]
+        lines.append('按包 (自身耗时):')
+        for package, seconds in list(self.top_level().items())[:limit]:
+            lines.append('  {:<32} {:8.1f}ms'.format(package, seconds * 1000))
+        lines.append('最慢的模块 (自身 / 含子模块):')
+        slowest = sorted(self.imports.items(), key=lambda item: item[1][0], reverse=True)[:limit]
+        for name, (self_time, cumulative) in slowest:
+            lines.append('  {:<32} {:8.1f}ms {:8.1f}ms'.format(name, self_time * 1000, cumulative * 1000))
+        lines.append('初始化阶段:')
+        for name, seconds in self.stages:
+            lines.append('  {:<32} {:8.1f}ms'.format(name, seconds * 1000))
+        return '\n'.join(lines)
+
+    def to_dict(self) -> dict:
+        return {
+            'total': time.perf_counter() - self.start,
+            'imports': {name: {'self': self_time, 'cumulative': cumulative}
+                        for name, (self_time, cumulative) in self.imports.items()},
+            'stages': dict(self.stages),
+        }
+
+
+class NullProfile:
+    """
+    未开启统计时使用, stage 不做任何事
+    """
+
+    @contextmanager
+    def stage(self, name: str):
+        yield
@@ -0,0 +1,202 @@
+import logging
+import os
+import struct
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterator, Union
+
+logger = logging.getLogger(__name__)
+
+# 整段输出的后端按该大小分块交给播放端
+CHUNK_SIZE = 16 * 1024
+
+
+def _percent(value: str) -> float:
+    """
+    '+10%' -> 0.1, '-20%' -> -0.2
+    :param value:
+    :return:
+    """
+    try:
+        return float(value.rstrip('%')) / 100
+    except ValueError:
+        return 0.0
+
+
+def wav_header(frames: int, sample_rate: int = 16000, channels: int = 1, sample_width: int = 2) -> bytes:
+    """
+    PCM WAV 文件头
+    :param frames: 采样帧数
+    :return:
+    """
+    size = frames * channels * sample_width
+    return struct.pack('<4sI4s4sIHHIIHH4sI', b'RIFF', 36 + size, b'WAVE', b'fmt ', 16, 1, channels,
+                       sample_rate, sample_rate * channels * sample_width, channels * sample_width,
+                       sample_width * 8, b'data', size)
+
+
+class TTSBackend:
+    """
+    语音合成后端
+
+    stream 按块产出音频, 第一块到达后播放端就可以开始处理; synthesize 返回完整音频。
+    参数沿用 edge-tts 的格式: voice 如 zh-CN-XiaoxiaoNeural, volume / rate 如 +0%, pitch 如 +0Hz。
+    """
+    name = 'base'
+    # 输出格式, 缓存文件后缀和播放端据此处理
+    format = 'mp3'
+    # 多段输出能否直接拼接成一段 (模板分段模式需要)
+    segmentable = False
+
+    def stream(self, text: str, voice: str, volume: str, rate: str, pitch: str) -> Iterator[bytes]:
+        raise NotImplementedError
+
+    def synthesize(self, text: str, voice: str, volume: str, rate: str, pitch: str) -> bytes:
+        return b''.join(self.stream(text, voice, volume, rate, pitch))
+
+    def close(self):
+        pass
+
+
+class EdgeBackend(TTSBackend):
+    """
+    edge-tts 在线合成, 服务端边合成边推送 MP3 帧
+    """
+    name = 'edge'
+    format = 'mp3'
+    # 输出是不带 ID3 头的 MP3 帧
+    segmentable = True
+
+    def stream(self, text: str, voice: str, volume: str, rate: str, pitch: str) -> Iterator[bytes]:
+        # edge_tts 导入较慢, 第一次合成时才导入
+        import edge_tts
+        communicate = edge_tts.Communicate(text, voice, volume=volume, rate=rate, pitch=pitch)
+        for chunk in communicate.stream_sync():
+            if chunk['type'] == 'audio':
+                yield chunk['data']
+
+
+class LocalBackend(TTSBackend):
+    """
+    离线合成, 通过 pyttsx3 调用系统语音引擎 (Windows SAPI5 / macOS NSSpeechSynthesizer / Linux eSpeak)
+
+    系统引擎只能整段输出到文件, 合成完成后再分块交给播放端; 引擎不是线程安全的,
+    所有合成在同一个线程中完成。pitch 不支持, 忽略。
+    """
+    name = 'local'
+    format = 'wav'
+
+    def __init__(self, base_rate: int = 200):
+        """
+        :param base_rate: rate 为 +0% 时的每分钟字数
+        """
+        # 可选依赖, 没有安装时抛出 ImportError
+        import pyttsx3
+        self._pyttsx3 = pyttsx3
+        self.base_rate = base_rate
+        self._engine = None
+        # 语言 -> 引擎中的 voice id
+        self._voices: dict[str, Union[str, None]] = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='tts-local')
+
+    def _match_voice(self, voice: str) -> Union[str, None]:
+        # 按 edge 音色名的语言部分 (zh-CN-XiaoxiaoNeural -> zh) 选择系统音色
+        language = voice.split('-')[0].lower()
+        if language not in self._voices:
+            self._voices[language] = None
+            for item in self._engine.getProperty('voices'):
+                names = [str(name).lower() for name in (item.languages or [])] + [str(item.id).lower()]
+                if any(language in name for name in names):
+                    self._voices[language] = item.id
+                    break
+        return self._voices[language]
+
+    def _synthesize(self, text: str, voice: str, volume: str, rate: str) -> bytes:
+        if self._engine is None:
+            self._engine = self._pyttsx3.init()
+        engine = self._engine
+        engine.setProperty('rate', int(self.base_rate * (1 + _percent(rate))))
+        engine.setProperty('volume', min(1.0, max(0.0, 1 + _percent(volume))))
+        voice_id = self._match_voice(voice)
+        if voice_id is not None:
+            engine.setProperty('voice', voice_id)
+        fd, path = tempfile.mkstemp(suffix='.wav')
+        os.close(fd)
+        try:
+            engine.save_to_file(text, path)
+            engine.runAndWait()
+            return Path(path).read_bytes()
+        finally:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    def stream(self, text: str, voice: str, volume: str, rate: str, pitch: str) -> Iterator[bytes]:
+        audio = self._executor.submit(self._synthesize, text, voice, volume, rate).result()
+        for start in range(0, len(audio), CHUNK_SIZE):
+            yield audio[start:start + CHUNK_SIZE]
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class NullBackend(TTSBackend):
+    """
+    不发声的后端, 用于测试和压测
+
+    输出与文本长度成正比的静音 WAV, 可以模拟首块延迟和逐块合成耗时。
+    """
+    name = 'null'
+    format = 'wav'
+
+    def __init__(self, first_chunk_delay: float = 0.0, chunk_delay: float = 0.0, sample_rate: int = 16000,
+                 seconds_per_char: float = 0.2, chunk_seconds: float = 0.1):
+        """
+        :param first_chunk_delay: 第一块之前的等待 (秒), 模拟网络往返
+        :param chunk_delay: 之后每块之间的等待 (秒)
+        :param sample_rate:
+        :param seconds_per_char: 每个字对应的音频时长
+        :param chunk_seconds: 每块的音频时长
+        """
+        self.first_chunk_delay = first_chunk_delay
+        self.chunk_delay = chunk_delay
+        self.sample_rate = sample_rate
+        self.seconds_per_char = seconds_per_char
+        self.chunk_seconds = chunk_seconds
+
+    def stream(self, text: str, voice: str, volume: str, rate: str, pitch: str) -> Iterator[bytes]:
+        frames = int(max(len(text), 1) * self.seconds_per_char * self.sample_rate)
+        chunk_frames = max(int(self.chunk_seconds * self.sample_rate), 1)
+        if self.first_chunk_delay:
+            time.sleep(self.first_chunk_delay)
+        header = wav_header(frames, self.sample_rate)
+        for start in range(0, frames, chunk_frames):
+            if start and self.chunk_delay:
+                time.sleep(self.chunk_delay)
+            chunk = bytes(min(chunk_frames, frames - start) * 2)
+            if header:
+                chunk, header = header + chunk, b''
+            yield chunk
+
+
+BACKENDS: dict[str, type] = {
+    EdgeBackend.name: EdgeBackend,
+    LocalBackend.name: LocalBackend,
+    NullBackend.name: NullBackend,
+}
+
+
+def create_backend(name: str, **kwargs) -> TTSBackend:
+    """
+    按名称创建后端
+    :param name: edge / local / null
+    :param kwargs: 后端的构造参数
+    :return:
+    """
+    backend = BACKENDS.get(name)
+    if backend is None:
+        raise ValueError('unknown tts backend {}'.format(name))
+    return backend(**kwargs)
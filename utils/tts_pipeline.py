@@ -0,0 +1,256 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, Union
+
+from .expired_queue import ExpiredQueue
+from .metrics import Counters
+
+logger = logging.getLogger(__name__)
+
+
+class AudioStream:
+    """
+    合成中的音频: 合成线程 write 写入, 播放线程迭代读取, 第一块到达就可以开始播放。
+    abort 之后迭代立即结束, 合成线程也会停止写入。
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._chunks: list[bytes] = []
+        self._done = False
+        self._aborted = False
+        self._error: Union[Exception, None] = None
+
+    @property
+    def aborted(self) -> bool:
+        return self._aborted
+
+    def write(self, chunk: bytes):
+        with self._cond:
+            if self._done:
+                return
+            self._chunks.append(chunk)
+            self._cond.notify_all()
+
+    def finish(self, error: Union[Exception, None] = None):
+        """
+        合成结束
+        :param error: 合成失败时的异常, 读取完已有数据后抛出
+        :return:
+        """
+        with self._cond:
+            if self._done:
+                return
+            self._done = True
+            self._error = error
+            self._cond.notify_all()
+
+    def abort(self):
+        with self._cond:
+            self._aborted = True
+            self._done = True
+            self._cond.notify_all()
+
+    def __iter__(self) -> Iterator[bytes]:
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self._chunks) and not self._done:
+                    self._cond.wait()
+                if self._aborted:
+                    return
+                if index < len(self._chunks):
+                    chunk = self._chunks[index]
+                    index += 1
+                elif self._error is not None:
+                    raise self._error
+                else:
+                    return
+            yield chunk
+
+    def read(self) -> bytes:
+        """
+        等待合成结束, 返回完整音频
+        :return:
+        """
+        return b''.join(self)
+
+
+class TTSPipeline:
+    """
+    语音播报流水线
+
+    合成阶段最多同时合成 workers 条, 合成结果放入容量为 buffer_size 的缓冲区,
+    播放阶段按出队顺序依次播放。当前语音播放时, 后面几条已经在合成了。
+    音频全程保存在内存中, 播放前已经过期的内容直接丢弃。
+
+    stream 为 True 时 synthesize 返回音频块的迭代器, play 收到 AudioStream,
+    轮到播放时不必等整段合成完成, 第一块到达即可开始。
+    """
+
+    def __init__(self, queue: ExpiredQueue,
+                 synthesize: Callable[[str], Union[bytes, Iterable[bytes]]],
+                 play: Callable[[Union[bytes, AudioStream]], None],
+                 workers: int = 2,
+                 buffer_size: int = 4,
+                 on_error: Union[Callable[[Exception], None], None] = None,
+                 stream: bool = False):
+        self.queue = queue
+        self.synthesize = synthesize
+        self.play = play
+        self.stream = stream
+        self.workers = workers
+        self.buffer_size = buffer_size
+        self.on_error = on_error
+        self.counters = Counters()
+        self._running = False
+        # 限制合成中 + 等待播放的总数
+        self._slots = threading.Semaphore(buffer_size)
+        self._cond = threading.Condition()
+        # seq -> (text, expire_at, audio, error)
+        self._results = {}
+        # stop 时加一, 合成线程据此丢弃上一次运行中还没完成的结果
+        self._generation = 0
+        self._next_seq = 0
+        self._play_seq = 0
+        self._playing: Union[AudioStream, None] = None
+        self._executor: Union[ThreadPoolExecutor, None] = None
+        self._threads: list[threading.Thread] = []
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._slots = threading.Semaphore(self.buffer_size)
+        self._results.clear()
+        self._next_seq = self._play_seq = 0
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='tts-synth')
+        self._threads = [
+            threading.Thread(target=self._dispatch_loop, name='tts-dispatch', daemon=True),
+            threading.Thread(target=self._play_loop, name='tts-play', daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._running = False
+        self.queue.interrupt()
+        self._slots.release()
+        with self._cond:
+            self._generation += 1
+            # 打断正在合成和播放的流
+            for _, _, audio, _ in self._results.values():
+                if isinstance(audio, AudioStream):
+                    audio.abort()
+            if self._playing is not None:
+                self._playing.abort()
+            self._cond.notify_all()
+        current = threading.current_thread()
+        for thread in self._threads:
+            if thread is not current:
+                thread.join()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _dispatch_loop(self):
+        while self._running:
+            # 缓冲区满时不从队列取内容, 让新内容继续在队列中按优先级和过期时间排队
+            self._slots.acquire()
+            if not self._running:
+                return
+            entry = None
+            while self._running and entry is None:
+                entry = self.queue.get_entry(timeout=1)
+            if entry is None:
+                return
+            seq = self._next_seq
+            self._next_seq += 1
+            self._executor.submit(self._synthesize, self._generation, seq, *entry)
+
+    def _synthesize(self, generation: int, seq: int, text: str, expire_at: float):
+        if self.stream:
+            self._synthesize_stream(generation, seq, text, expire_at)
+            return
+        audio, error = None, None
+        try:
+            audio = self.synthesize(text)
+            self.counters.incr('synthesized')
+        except Exception as e:
+            error = e
+        with self._cond:
+            # 上一次运行的结果, stop 后重新 start 时序号从 0 开始, 不能放进新的结果中;
+            # 占用的缓冲区名额属于上一次运行的 _slots, 不需要归还
+            if generation != self._generation:
+                self.counters.incr('stale')
+                return
+            self._results[seq] = (text, expire_at, audio, error)
+            self._cond.notify_all()
+
+    def _synthesize_stream(self, generation: int, seq: int, text: str, expire_at: float):
+        # 开始合成就交给播放阶段, 合成失败时由读取方抛出
+        stream = AudioStream()
+        with self._cond:
+            if generation != self._generation:
+                self.counters.incr('stale')
+                return
+            self._results[seq] = (text, expire_at, stream, None)
+            self._cond.notify_all()
+        try:
+            for chunk in self.synthesize(text):
+                if stream.aborted:
+                    return
+                stream.write(chunk)
+        except Exception as e:
+            stream.finish(e)
+            return
+        stream.finish()
+        self.counters.incr('synthesized')
+
+    def _play_loop(self):
+        while self._running:
+            with self._cond:
+                while self._running and self._play_seq not in self._results:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                text, expire_at, audio, error = self._results.pop(self._play_seq)
+                self._play_seq += 1
+                # stop 时需要打断
+                self._playing = audio if isinstance(audio, AudioStream) else None
+            self._slots.release()
+            if error is not None:
+                self.counters.incr('errors')
+                logger.error('tts error {}'.format(error), exc_info=error)
+                if self.on_error:
+                    self.on_error(error)
+                continue
+            if time.time() > expire_at:
+                self.counters.incr('expired')
+                logger.info('[过期丢弃] {}'.format(text))
+                if isinstance(audio, AudioStream):
+                    audio.abort()
+                continue
+            logger.info('[播放] {}'.format(text))
+            try:
+                self.play(audio)
+                self.counters.incr('played')
+            except Exception as e:
+                self.counters.incr('errors')
+                logger.error('play error {}'.format(e), exc_info=True)
+                if self.on_error:
+                    self.on_error(e)
+            finally:
+                with self._cond:
+                    self._playing = None
+
+    def stats(self) -> dict:
+        with self._cond:
+            buffered = len(self._results)
+        return {'buffered': buffered, **self.counters.to_dict()}